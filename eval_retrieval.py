@@ -0,0 +1,156 @@
+"""Evaluate knowledge retrieval against the full-prompt baseline
+
+Checks that the per-turn retrieved knowledge still covers the facts the
+bot needs for common lead questions.
+
+Offline (default): for every eval question, checks which expected facts
+appear in the retrieved prompt vs. the full prompt, and compares prompt size.
+
+Live (--live): also generates an answer with each prompt through Claude and
+checks which expected facts the answers contain, plus tokens and latency.
+
+Usage:
+    python eval_retrieval.py
+    python eval_retrieval.py --top-k 3 --live
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+
+from selfinputd.knowledge_base import SKIBA_ARTS_KNOWLEDGE, SALES_METHODOLOGY
+from selfinputd.persona import full_system_prompt, retrieval_system_prompt
+from src.utils.knowledge_index import KnowledgeRetriever
+
+
+# Same retrieval settings as run_bot.py
+PINNED = ("CRITICAL RULES", "Important Notes for the Bot")
+FIRST_CONTACT = ("OPENING MESSAGE",)
+
+# (lead question, facts a correct answer relies on - matched case-insensitively)
+EVAL_CASES = [
+    ("כמה זה עולה?", ["2,640", "flights"]),
+    ("מתי הטיול הבא?", ["March", "June", "November"]),
+    ("כמה ימים הטיול?", ["10 days", "13 days"]),
+    ("איפה המלון?", ["Rawai", "Patong"]),
+    ("מה כלול בחבילה?", ["Airport transfers", "Hotel accommodation"]),
+    ("אין לי שום ניסיון, זה מתאים לי?", ["70%", "zero experience"]),
+    ("אני בא לבד, זה בסדר?", ["80%", "come alone"]),
+    ("כמה אנשים בקבוצה?", ["16"]),
+    ("הטיסות כלולות?", ["Flights NOT included"]),
+    ("מה צריך להביא?", ["passport"]),
+    ("יש פעילויות חוץ מאימונים?", ["fight nights", "Beach"]),
+    ("זה יקר לי", ["installments", "friend discount"]),
+    ("I'm 45, am I too old?", ["Age objections"]),
+    ("מי זה עדן?", ["since 2014"]),
+]
+
+
+def coverage(text, facts):
+    """Facts found in text (case-insensitive)"""
+    lowered = text.lower()
+    return [fact for fact in facts if fact.lower() in lowered]
+
+
+def generate(client, model, system, question):
+    """One answer for the question. Returns (text, input_tokens, seconds)."""
+    start = time.time()
+    response = client.messages.create(
+        model=model,
+        max_tokens=400,
+        temperature=0,
+        system=system,
+        messages=[{"role": "user", "content": question}],
+    )
+    return response.content[0].text, response.usage.input_tokens, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval vs. full-prompt coverage eval")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="Also generate answers through Claude")
+    args = parser.parse_args()
+
+    retriever = KnowledgeRetriever(
+        {"knowledge": SKIBA_ARTS_KNOWLEDGE, "methodology": SALES_METHODOLOGY},
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        pinned=PINNED,
+        first_contact=FIRST_CONTACT,
+    )
+    full_prompt = full_system_prompt()
+
+    client = model = None
+    if args.live:
+        load_dotenv()
+        from anthropic import Anthropic
+        from src.config import get_settings
+        settings = get_settings()
+        client = Anthropic(api_key=settings.anthropic_api_key, base_url=settings.anthropic_base_url)
+        model = settings.model_name
+
+    totals = {"facts": 0, "full_ctx": 0, "rag_ctx": 0, "full_ans": 0, "rag_ans": 0,
+              "full_tokens": 0, "rag_tokens": 0, "full_time": 0.0, "rag_time": 0.0}
+    rag_chars = 0
+
+    print("\n" + "=" * 70)
+    print(f"RETRIEVAL EVAL - top {args.top_k}, {len(retriever.chunks)} sections indexed")
+    print("=" * 70)
+
+    for question, facts in EVAL_CASES:
+        rag_prompt = retrieval_system_prompt(retriever.render(question, args.top_k))
+        rag_chars += len(rag_prompt)
+
+        full_found = coverage(full_prompt, facts)
+        rag_found = coverage(rag_prompt, facts)
+        totals["facts"] += len(facts)
+        totals["full_ctx"] += len(full_found)
+        totals["rag_ctx"] += len(rag_found)
+
+        missing = [fact for fact in full_found if fact not in rag_found]
+        mark = "OK  " if not missing else "MISS"
+        print(f"\n[{mark}] {question}")
+        print(f"       context: {len(rag_found)}/{len(facts)} facts (full prompt: {len(full_found)}/{len(facts)})")
+        if missing:
+            print(f"       missing from retrieval: {missing}")
+
+        if client:
+            full_answer, full_tokens, full_time = generate(client, model, full_prompt, question)
+            rag_answer, rag_tokens, rag_time = generate(client, model, rag_prompt, question)
+            full_ans = coverage(full_answer, facts)
+            rag_ans = coverage(rag_answer, facts)
+            totals["full_ans"] += len(full_ans)
+            totals["rag_ans"] += len(rag_ans)
+            totals["full_tokens"] += full_tokens
+            totals["rag_tokens"] += rag_tokens
+            totals["full_time"] += full_time
+            totals["rag_time"] += rag_time
+            print(f"       answer:  {len(rag_ans)}/{len(facts)} facts (full prompt answer: {len(full_ans)}/{len(facts)})")
+
+    cases = len(EVAL_CASES)
+    print("\n" + "=" * 70)
+    print("SUMMARY")
+    print("=" * 70)
+    print(f"Context coverage: {totals['rag_ctx']}/{totals['full_ctx']} "
+          f"({100 * totals['rag_ctx'] / max(totals['full_ctx'], 1):.0f}% of full-prompt baseline)")
+    print(f"Prompt size:      {rag_chars // cases:,} chars avg vs {len(full_prompt):,} full "
+          f"({100 * rag_chars / cases / len(full_prompt):.0f}%)")
+    if client:
+        print(f"Answer coverage:  {totals['rag_ans']}/{totals['full_ans']} "
+              f"({100 * totals['rag_ans'] / max(totals['full_ans'], 1):.0f}% of full-prompt baseline)")
+        print(f"Input tokens:     {totals['rag_tokens'] // cases:,} avg vs {totals['full_tokens'] // cases:,} full")
+        print(f"Latency:          {totals['rag_time'] / cases:.2f}s avg vs {totals['full_time'] / cases:.2f}s full")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Bulk re-analysis of all leads through the Anthropic Message Batches API
+
+Use after changing ANALYSIS_PROMPT or the scoring rubric, to refresh
+match_score/status/summary for every lead without waiting for them to
+message again.
+
+Steps:
+1. Stream leads from Google Sheets, fetch each WhatsApp history from Green API
+2. Submit one analysis request per lead as Message Batches (50% cheaper)
+3. Poll until the batches end
+4. Write the results back to Sheets with a single batchUpdate (or print a diff with --dry-run)
+
+Progress is saved to a state file after every submitted batch and every
+step, so an interrupted run can continue with --resume without paying for
+a batch twice (batch results stay available for 29 days).
+
+Usage:
+    python reanalyze_leads.py --dry-run
+    python reanalyze_leads.py --resume
+    python reanalyze_leads.py --status בשיחה --limit 50
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from src.utils.history_loader import parse_chat_history
+from src.utils.lead_analysis import (
+    ANALYSIS_PROMPT,
+    analysis_to_sheet_updates,
+    format_transcript,
+    parse_json_reply,
+)
+
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+DEFAULT_STATE_FILE = project_root / "data" / "reanalysis_state.json"
+HISTORY_COUNT = 100          # Messages fetched per lead from Green API
+MAX_REQUESTS_PER_BATCH = 10_000
+POLL_INTERVAL = 30           # Seconds between batch status checks
+DIFF_FIELDS = ["match_score", "status", "meeting", "experience", "age", "location"]
+
+
+# ============================================================
+# STATE - resume after interruption
+# ============================================================
+def load_state(path):
+    """Load saved progress (None if there is none)"""
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """Save progress atomically"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# STEP 1 - stream leads and their conversations
+# ============================================================
+def custom_id_for(phone):
+    """Batch custom_id for a lead (API allows only [a-zA-Z0-9_-])"""
+    return "lead_" + re.sub(r"[^a-zA-Z0-9_-]", "", phone)
+
+
+def iter_conversations(lead_manager, green_api, status=None, limit=None):
+    """Yield (lead, transcript) for every lead that has something to analyze"""
+    count = 0
+    for lead in lead_manager.get_all_leads(status=status):
+        phone = lead.get("phone", "")
+        if not phone:
+            continue
+
+        chat_id = lead.get("whatsapp_id") or f"{phone.lstrip('+')}@c.us"
+        history = []
+        try:
+            result = green_api.journals.getChatHistory(chat_id, HISTORY_COUNT)
+            if result.data and isinstance(result.data, list):
+                history = parse_chat_history(result.data, chat_id)
+        except Exception as e:
+            logger.warning(f"[REANALYZE] getChatHistory failed for {phone}: {e}")
+
+        summary = lead.get("conversation_summary", "")
+        if len(history) < 2 and not summary:
+            continue
+
+        transcript = format_transcript(history)
+        if summary and (len(history) >= HISTORY_COUNT or not history):
+            # Older messages (or all of them) are only available as the stored summary
+            transcript = f"[Stored CRM summary of earlier conversation]\n{summary}\n[Messages]\n{transcript}"
+
+        yield lead, transcript
+        count += 1
+        if limit and count >= limit:
+            return
+
+
+def submit_batches(client, model, conversations, batches=None, save=None):
+    """
+    Submit analysis requests in batches
+
+    Args:
+        client: Anthropic client
+        model: Model the requests use
+        conversations: (lead, transcript) pairs as from iter_conversations
+        batches: Batches already submitted (extended in place; their leads are skipped)
+        save: Called after every submitted batch, so a paid-for batch is never lost
+
+    Returns:
+        The batch list for the state file
+    """
+    batches = [] if batches is None else batches
+    queued = {custom_id for entry in batches for custom_id in entry["leads"]}
+    pending = []
+    phones = {}
+
+    def flush():
+        if not pending:
+            return
+        batch = client.messages.batches.create(requests=list(pending))
+        batches.append({"id": batch.id, "leads": dict(phones)})
+        logger.info(f"[REANALYZE] Submitted batch {batch.id} ({len(pending)} leads)")
+        pending.clear()
+        phones.clear()
+        if save:
+            save()
+
+    for lead, transcript in conversations:
+        custom_id = custom_id_for(lead["phone"])
+        if custom_id in queued:
+            continue  # Same phone in two rows, or already submitted before an interruption
+        queued.add(custom_id)
+        phones[custom_id] = lead["phone"]
+        pending.append({
+            "custom_id": custom_id,
+            "params": {
+                "model": model,
+                "max_tokens": 500,
+                "temperature": 0.2,
+                "system": ANALYSIS_PROMPT,
+                "messages": [{"role": "user", "content": transcript}],
+            },
+        })
+        if len(pending) >= MAX_REQUESTS_PER_BATCH:
+            flush()
+    flush()
+
+    return batches
+
+
+# ============================================================
+# STEP 2 - poll and collect
+# ============================================================
+def wait_for_batches(client, batches, poll_interval):
+    """Block until every batch has ended"""
+    while True:
+        running = 0
+        for entry in batches:
+            batch = client.messages.batches.retrieve(entry["id"])
+            counts = batch.request_counts
+            logger.info(
+                f"[REANALYZE] {entry['id']}: {batch.processing_status} "
+                f"(processing={counts.processing}, succeeded={counts.succeeded}, errored={counts.errored})"
+            )
+            if batch.processing_status != "ended":
+                running += 1
+        if not running:
+            return
+        time.sleep(poll_interval)
+
+
+def collect_results(client, batches):
+    """Return {phone: analysis} for every request that succeeded"""
+    analyses = {}
+    failed = 0
+    for entry in batches:
+        for item in client.messages.batches.results(entry["id"]):
+            phone = entry["leads"].get(item.custom_id)
+            if not phone:
+                continue
+            if item.result.type != "succeeded":
+                failed += 1
+                logger.warning(f"[REANALYZE] {phone}: request {item.result.type}")
+                continue
+            try:
+                data = parse_json_reply(item.result.message.content[0].text)
+            except (json.JSONDecodeError, IndexError, AttributeError) as e:
+                data = None
+                logger.warning(f"[REANALYZE] {phone}: unreadable result ({e})")
+            if data:
+                analyses[phone] = data
+            else:
+                failed += 1
+
+    logger.info(f"[REANALYZE] Collected {len(analyses)} analyses ({failed} failed)")
+    return analyses
+
+
+# ============================================================
+# STEP 3 - diff report / write back
+# ============================================================
+def build_diff(leads_by_phone, analyses):
+    """Per-lead changes of the tracked fields: {phone: {field: (old, new)}}"""
+    diff = {}
+    for phone, analysis in analyses.items():
+        old = leads_by_phone.get(phone, {})
+        new = analysis_to_sheet_updates(analysis)
+        changes = {
+            field: (str(old.get(field, "")), str(new[field]))
+            for field in DIFF_FIELDS
+            if field in new and str(new[field]) != str(old.get(field, ""))
+        }
+        if changes:
+            diff[phone] = changes
+    return diff
+
+
+def print_diff(diff, total):
+    """Print a human-readable diff report"""
+    print("\n" + "=" * 60)
+    print(f"RE-ANALYSIS DIFF - {len(diff)} of {total} leads would change")
+    print("=" * 60)
+    for phone, changes in diff.items():
+        print(f"\n{phone}")
+        for field, (old, new) in changes.items():
+            print(f"  {field}: {old or '-'} -> {new}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-analyze all leads via the Message Batches API")
+    parser.add_argument("--dry-run", action="store_true", help="Print a diff report, don't write to Sheets")
+    parser.add_argument("--resume", action="store_true", help="Continue the run saved in the state file")
+    parser.add_argument("--state-file", type=Path, default=DEFAULT_STATE_FILE)
+    parser.add_argument("--report", type=Path, help="Also save the diff report as JSON")
+    parser.add_argument("--status", help="Only leads with this status")
+    parser.add_argument("--limit", type=int, help="Max leads to analyze")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--base-url", help="Anthropic API base URL (e.g. a local fake batch endpoint)")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    from anthropic import Anthropic
+    from whatsapp_api_client_python import API
+    from src.config import get_settings
+    from src.utils.google_sheets_manager_simple import GoogleSheetsManager
+
+    settings = get_settings()
+    google_sheet_id = os.getenv("GOOGLE_SHEET_ID")
+    if not google_sheet_id:
+        print("\n[ERROR] GOOGLE_SHEET_ID is required in .env")
+        sys.exit(1)
+
+    client = Anthropic(
+        api_key=settings.anthropic_api_key,
+        base_url=args.base_url or settings.anthropic_base_url,
+    )
+    lead_manager = GoogleSheetsManager(google_sheet_id)
+
+    state = load_state(args.state_file) if args.resume else None
+    if state and state.get("written"):
+        print(f"Run from {state['created_at']} was already written to Sheets. Start a new run without --resume.")
+        return
+
+    if state and state.get("submitted", True):
+        logger.info(f"[REANALYZE] Resuming run from {state['created_at']} ({len(state['batches'])} batches)")
+    else:
+        if state:
+            logger.info(
+                f"[REANALYZE] Resuming submission of run from {state['created_at']} "
+                f"({len(state['batches'])} batches already submitted)"
+            )
+        else:
+            state = {
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "model": settings.model_name,
+                "batches": [],
+                "submitted": False,
+                "written": False,
+            }
+            save_state(args.state_file, state)
+
+        green_api = API.GreenAPI(os.getenv("GREEN_API_INSTANCE_ID"), os.getenv("GREEN_API_TOKEN"))
+        conversations = iter_conversations(lead_manager, green_api, status=args.status, limit=args.limit)
+        submit_batches(
+            client, state["model"], conversations,
+            batches=state["batches"], save=lambda: save_state(args.state_file, state),
+        )
+        state["submitted"] = True
+        save_state(args.state_file, state)
+
+    if not state["batches"]:
+        print("No leads to analyze.")
+        return
+
+    wait_for_batches(client, state["batches"], args.poll_interval)
+    analyses = collect_results(client, state["batches"])
+
+    leads_by_phone = {lead.get("phone"): lead for lead in lead_manager.get_all_leads()}
+    diff = build_diff(leads_by_phone, analyses)
+    print_diff(diff, len(analyses))
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(diff, f, ensure_ascii=False, indent=2)
+
+    if args.dry_run:
+        print("Dry run - nothing written. Run again with --resume to write these results.")
+        return
+
+    updates = {phone: analysis_to_sheet_updates(analysis) for phone, analysis in analyses.items()}
+    written = lead_manager.batch_update_leads(updates)
+    state["written"] = True
+    save_state(args.state_file, state)
+    print(f"Updated {written} leads in Google Sheets.")
+
+
+if __name__ == "__main__":
+    main()
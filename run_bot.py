@@ -3,39 +3,144 @@
 Features:
 - Message batching: rapid messages combined into one response
 - Per-lead conversation history (isolated per customer)
+- New leads get the methodology's opening message from a template (no model call)
+- Rolling memory summary for long conversations (compacted in background)
 - Human-like typing delay before sending
+- Persistent outbox: retries with backoff, deduplicated Eden notifications
 - AI-powered Google Sheets analysis (summary, experience, score, etc.)
+  in a debounced background queue, off the reply threads
 - Auto-notification to Eden when meeting is scheduled
+- Staged processing: Sheets bookkeeping off the reply path, bounded context loading
 - Sweep thread catches any missed messages
+- Concurrent startup: receiving starts once Green API is ready, Sheets joins in the background
+- Startup warm-up prefetches recently active chats' context
+- Degraded mode: replies deferred (not error texts) while the AI is unavailable
+- Daily spend budget: analysis, history and model degrade in stages, then Eden takes over
+- Per-chat rate limits and quarantine of flooding numbers (Eden can override)
+- Bounded reply workers serve scheduling / engaged leads first, with aging
+- Prometheus-style /metrics: queue depths, batch sizes, stage latencies, tokens, errors
+- Per-batch traces (buffer -> process -> send -> analysis) to JSONL or an OTLP collector
 """
 
 import sys
 import os
 import json
+import hashlib
+import re
 import threading
 import time
 from pathlib import Path
 from collections import OrderedDict
-from datetime import datetime
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from datetime import datetime, timedelta
 
 # Add project root to path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+import anthropic
 from dotenv import load_dotenv
 from loguru import logger
 from whatsapp_chatbot_python import GreenAPIBot, Notification
 
+from src.agents.history_store import InMemoryHistoryStore
+from src.agents.resilience import CircuitOpenError, DeadlineExceededError
+from src.utils.conversation_memory import ConversationMemory, COMPACTION_PROMPT
+from src.utils.analysis_queue import AnalysisQueue
+from src.utils.knowledge_index import KnowledgeRetriever, build_query
+from src.utils.lead_tools import lead_profile_tool, trip_dates_tool
+from src.utils.response_cache import ResponseCache, knowledge_version
+from src.utils.opening_message import OpeningTemplates
+from src.utils.status_server import StatusServer
+from src.utils.usage_ledger import UsageLedger
+from src.utils.ingestion_limiter import ADMITTED, OVERLOADED, IngestionLimiter, TokenBucket
+from src.utils.reply_scheduler import ReplyScheduler
+from src.utils.outbox import PRIORITY_NOTIFICATION, Outbox, reply_key
+from src.utils.history_loader import HistoryLoader, extract_text
+from src.utils.startup import StartupOrchestrator
+from src.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from src.utils.tracing import JsonlExporter, OtlpExporter, Tracer
+from selfinputd.knowledge_base import SKIBA_ARTS_KNOWLEDGE, SALES_METHODOLOGY
+from src.utils.lead_analysis import (
+    ANALYSIS_PROMPT,
+    INCREMENTAL_ANALYSIS_PROMPT,
+    LEAD_ANALYSIS_TOOL,
+    STATUS_ORDER,
+    analysis_to_sheet_updates,
+    format_transcript,
+    parse_json_reply,
+)
+
 
 # ============================================================
 # CONFIGURATION
 # ============================================================
 BATCH_WAIT_SECONDS = 4       # Wait for more messages before processing
 SWEEP_INTERVAL = 30          # Seconds between sweep checks
+REPLY_WORKERS = 8            # Chats processed at once (the rest wait, most urgent first)
+MESSAGE_DEADLINE = 90        # Seconds a batch may take end to end (bounds every wait in the pipeline)
+CONTEXT_LOAD_TIMEOUT = 4     # Seconds the reply waits for past context of an unknown chat
+PIPELINE_WORKERS = 8         # Threads for context loads and Sheets bookkeeping
+HISTORY_TOKEN_BUDGET = 3000  # Approx. tokens of past chat loaded for a chat the bot has no memory of
+HISTORY_PAGE_SIZE = 30       # First getChatHistory page (doubled until the budget is covered)
+HISTORY_MAX_FETCH = 240      # Max chat records fetched per chat
+HISTORY_CACHE_MINUTES = 60   # Loaded (and evicted) conversations reused without a fetch
+WARMUP = True                # Prefetch recently active chats' context at startup (in parallel with answering)
+WARMUP_HOURS = 48            # "Recently active" = wrote or got a message within this window
+WARMUP_MAX_CHATS = 200       # Most recent chats warmed
+WARMUP_WORKERS = 4           # Concurrent history fetches during warm-up
+WARMUP_RATE = 5              # Max history fetches per second during warm-up
+WARMUP_SHEETS_WAIT = 30      # Seconds the warm-up waits for Sheets to join before going without profiles
+PRIORITY_AGING = 20          # Seconds of waiting that promote a chat by one priority class
+HOT_LEAD_SCORE = 70          # match_score that puts a lead in the "engaged" class
+LIVE_CONVERSATION_MINUTES = 10  # A lead who wrote this recently is mid-conversation ("engaged")
 SWEEP_WINDOW = 5             # Check messages from last N minutes
 MAX_TRACKED = 500            # Max tracked message IDs
+DEFERRED_RETRY_INTERVAL = 20  # Seconds between retries of replies deferred while the AI is down
+DEFERRED_MAX_ATTEMPTS = 15   # Retries before handing the lead to Eden
 MAX_HISTORY_PER_LEAD = 40    # Max conversation messages per lead
+MAX_ACTIVE_LEADS = 1000      # Leads kept in memory (least recently active evicted, reloaded on next message)
+COMPACTION_CHUNK = 10        # Old messages folded into the lead's memory summary at once
+MEMORY_MAX_LEADS = 5000      # Leads whose memory summary is kept (outlives eviction from MAX_ACTIVE_LEADS)
 ANALYSIS_EVERY_N = 2         # Run AI analysis every N bot responses
+COMBINED_ANALYSIS = True     # Analysis turns get lead fields from the reply call itself (tool use)
+ANALYSIS_FULL_EVERY_K = 5    # Full re-analysis after K incremental (delta) analyses
+ANALYSIS_DRIFT_SCORE = 30    # Score jump in a delta analysis that triggers a full re-analysis
+ANALYSIS_WORKERS = 2         # Background analysis worker threads
+ANALYSIS_DEBOUNCE = 45       # Seconds of quiet before a lead is analyzed
+ANALYSIS_PRIORITY_DEBOUNCE = 5  # Same, for leads who are scheduling a call
+KNOWLEDGE_RETRIEVAL = True   # Only relevant knowledge-base sections in the prompt (False = inline all)
+KNOWLEDGE_TOP_K = 4          # Retrieved knowledge sections per turn
+KNOWLEDGE_PINNED = ("CRITICAL RULES", "Important Notes for the Bot")  # Always in the prompt
+KNOWLEDGE_FIRST_CONTACT = ("OPENING MESSAGE",)                          # Added on the first reply
+OPENING_TEMPLATE = True      # New leads get the methodology's opening message without a model call
+BUDGET_SHORT_HISTORY = 10    # Messages replies see once the budget reaches the short-history stage
+REPLY_TOOLS = True           # Replies may look up the lead's CRM profile / trip dates on demand
+RESPONSE_CACHE = True        # Reuse replies to identical opening messages (needs ENABLE_CACHING, TTL = CACHE_TTL)
+                             # Only runs with OPENING_TEMPLATE = False - with the template on (the default) first messages never reach the model
+RESPONSE_CACHE_SIZE = 500    # Cached opening states
+RESPONSE_CACHE_VARIANTS = 3  # Different replies collected per state before serving from cache
+RESPONSE_CACHE_MAX_MESSAGES = 1  # Only conversations this short are cached (1 = first message)
+KNOWLEDGE_BASE_FILE = project_root / "selfinputd" / "knowledge_base.py"  # Watched for cache invalidation
+TRIP_SCHEDULE_FILE = project_root / "data" / "trip_dates.json"  # Upcoming departures, kept by Eden
+OUTBOX_DB = project_root / "data" / "outbox.db"  # Outbound messages waiting to be sent
+OUTBOX_SENDS_PER_SECOND = 2  # Max messages sent to Green API per second (sustained)
+OUTBOX_BURST = 5             # Messages that may go out at once after a quiet period
+RECIPIENT_MIN_INTERVAL = 2   # Min seconds between two messages to the same chat
+OUTBOX_MAX_ATTEMPTS = 8      # Send attempts (exponential backoff) before a message is given up
+REPLY_TTL_MINUTES = 60       # Unsent replies older than this are dropped instead of sent late
+INGEST_RATE_PER_MIN = 12     # Messages a minute one chat may sustain
+INGEST_BURST = 8             # Messages one chat may send at once
+INGEST_GLOBAL_PER_MIN = 120  # Messages a minute over all chats (excess is picked up later by the sweep)
+INGEST_GLOBAL_BURST = 40     # Messages over all chats at once
+QUARANTINE_STRIKES = 20      # Throttled messages within QUARANTINE_WINDOW that quarantine a chat
+QUARANTINE_WINDOW = 600      # Seconds
+QUARANTINE_HOURS = 24        # Length of an automatic quarantine
+INGESTION_OVERRIDES_FILE = project_root / "data" / "ingestion_overrides.json"  # Allow list / quarantines
+TRACING = True               # One trace per batch: buffer -> process -> send -> analysis (see trace_report.py)
+TRACE_SAMPLE_RATE = 1.0      # Fraction of batches traced
+TRACE_FILE = project_root / "data" / "traces.jsonl"  # Trace spans, one JSON object per line
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', '')  # OTLP/HTTP collector (e.g. http://localhost:4318/v1/traces) instead of the file
 EDEN_PHONE = os.getenv('EDEN_PHONE', '')
 EDEN_CHAT_ID = f"{EDEN_PHONE}@c.us" if EDEN_PHONE else ""
 EXCLUDED_NUMBERS = {EDEN_PHONE} if EDEN_PHONE else set()
@@ -61,153 +166,238 @@ print(f"\nInstance ID: {instance_id}")
 
 
 # ============================================================
-# GOOGLE SHEETS
+# METRICS - Prometheus-style exposition at /metrics
+# ============================================================
+# Sheets latency and model latency/tokens are recorded by
+# GoogleSheetsManager and ClaudeAgent into the same registry.
+STAGE_LATENCY = registry.histogram("bot_stage_seconds", "Message pipeline stage durations", labels=("stage",))
+BATCH_SIZE = registry.histogram("bot_batch_size", "Messages combined into one batch", buckets=(1, 2, 3, 4, 6, 8, 12, 20))
+TYPING_DELAY = registry.histogram("bot_typing_delay_seconds", "Typing delay before a reply is sent", buckets=(2, 3, 5, 7, 9))
+INCOMING = registry.counter("bot_incoming_messages", "Messages buffered for a reply", labels=("source",))
+DUPLICATES = registry.counter("bot_duplicate_messages", "Messages skipped as already processed", labels=("source",))
+SWEEP_CATCHES = registry.counter("bot_sweep_catches", "Messages the handler missed and the sweep caught")
+ERRORS = registry.counter("bot_errors", "Errors by subsystem", labels=("subsystem",))
+INGEST_DROPPED = registry.counter("bot_ingestion_dropped", "Incoming messages dropped by the ingestion limiter", labels=("reason",))
+INGEST_QUARANTINES = registry.counter("bot_ingestion_quarantines", "Chats quarantined automatically for flooding")
+CACHE_LOOKUPS = registry.counter("bot_response_cache_lookups", "Response cache lookups by result", labels=("result",))
+registry.gauge("bot_buffered_chats", "Chats waiting in the batch buffer", function=lambda: len(message_buffers))
+registry.gauge(
+    "bot_buffered_messages", "Messages waiting in the batch buffer",
+    function=lambda: sum(len(buffer["messages"]) for buffer in list(message_buffers.values())),
+)
+registry.gauge("bot_reply_queue_depth", "Batches waiting for a reply worker", function=lambda: reply_scheduler.depth())
+registry.gauge("bot_analysis_queue_depth", "Leads waiting for analysis", function=lambda: analysis_queue.depth())
+registry.gauge("bot_outbox_pending", "Outbound messages not yet sent", function=lambda: outbox.pending())
+registry.gauge(
+    "bot_spend_governor_level", "Global spend governor level (0 = normal ... 4 = Eden only)",
+    function=lambda: spend_governor.level() if spend_governor else 0,
+)
+registry.gauge("bot_response_cache_entries", "Opening states in the response cache", function=lambda: len(response_cache) if response_cache else 0)
+
+
+# ============================================================
+# TRACING - where a slow reply's time went
 # ============================================================
+# A trace starts when a chat's first message enters the batch buffer and
+# ends when the reply is sent. Spans: receive (per message), batch_wait,
+# queue_wait, context, generate, enqueue, bookkeeping (with its Sheets
+# calls), bookkeeping_wait, outbox (typing delay + pacing), green_api.send
+# and, later, analysis. The trace ID is in the [BATCH] and [PIPELINE] logs.
+trace_exporter = None
+if TRACING:
+    trace_exporter = OtlpExporter(TRACE_OTLP_ENDPOINT) if TRACE_OTLP_ENDPOINT else JsonlExporter(TRACE_FILE)
+tracer = Tracer(trace_exporter, sample_rate=TRACE_SAMPLE_RATE)
+
+pending_sends = OrderedDict()  # {outbox key: (root span, enqueued at)} - traces that end when their reply is sent
+pending_sends_lock = threading.Lock()
+
+
+def trace_until_sent(key, trace):
+    """Keep a trace open until the outbox sends its reply"""
+    with pending_sends_lock:
+        pending_sends[key] = (trace, time.time())
+        while len(pending_sends) > MAX_ACTIVE_LEADS:
+            _, (stale, _) = pending_sends.popitem(last=False)
+            stale.end(status="unsent")  # Expired, or still waiting long after its TTL
+
+
+def end_sent_trace(message):
+    """Outbox sent a message - close the trace of its reply"""
+    with pending_sends_lock:
+        trace, enqueued = pending_sends.pop(message["key"], (None, None))
+    if trace:
+        sent = message["sent_at"]
+        tracer.record("outbox", trace, enqueued, sent, attempts=message["attempts"])
+        tracer.record("green_api.send", trace, sent - message["send_seconds"], sent)
+        trace.end(end=sent)
+
+
+# ============================================================
+# STARTUP - independent subsystems initialize concurrently
+# ============================================================
+# Green API and Google Sheets connect on background threads while the AI
+# agent is set up here. The bot starts receiving once Green API is ready;
+# Sheets joins whenever it is (see sheets_ready) - until then leads are
+# answered without Sheets bookkeeping.
+startup = StartupOrchestrator()
+startup.background("green_api", lambda: GreenAPIBot(instance_id, api_token))
+
 lead_manager = None
+
+
+def init_sheets():
+    """Connect to the leads sheet (the Google client libraries are imported here, off the main thread)"""
+    from src.utils.google_sheets_manager_simple import GoogleSheetsManager
+    return GoogleSheetsManager(google_sheet_id)
+
+
+def sheets_ready(manager):
+    """Sheets joined - enable bookkeeping, profile lookups and the lead profile tool"""
+    global lead_manager
+    lead_manager = manager
+    history_loader.get_lead = manager.get_lead
+    if ai_agent and REPLY_TOOLS:
+        ai_agent.add_tool(lead_profile_tool(manager))
+    logger.info("[STARTUP] Google Sheets joined - lead bookkeeping enabled")
+
+
 if google_sheet_id:
-    try:
-        from src.utils.google_sheets_manager_simple import GoogleSheetsManager
-        lead_manager = GoogleSheetsManager(google_sheet_id)
-        print("Storage: Google Sheets [OK]")
-    except Exception as e:
-        print(f"Storage: Google Sheets [ERROR] {e}")
+    startup.background("sheets", init_sheets)
+    print("Storage: Google Sheets (connecting in background)")
 else:
     print("Storage: None configured (will only respond to messages)")
 
 
+# ============================================================
+# PER-LEAD CONVERSATION HISTORIES - one session per lead, shared with the AI agent
+# ============================================================
+def compact_dropped_turns(phone, dropped):
+    """Hand messages trimmed from a lead's history to the conversation memory"""
+    if conversation_memory:
+        conversation_memory.compact_async(phone, dropped)
+
+
+def forget_lead(phone, messages):
+    """Drop per-lead state of a lead evicted from the history store.
+
+    The evicted conversation is kept in the history loader's cache - if
+    the lead writes again soon, it comes back from there without a fetch.
+    The conversation memory keeps the lead's summary of older, compacted
+    turns (it has its own bound), so a reloaded lead still has it.
+    """
+    history_loader.remember(phone, messages)
+    loaded_context.discard(phone)
+    lead_response_count.pop(phone, None)
+    with analysis_state_lock:
+        lead_analysis_state.pop(phone, None)
+    with lead_profiles_lock:
+        lead_profiles.pop(phone, None)
+
+
+# When a history grows past MAX_HISTORY_PER_LEAD, the oldest COMPACTION_CHUNK
+# messages are handed to the conversation memory instead of being dropped
+lead_store = InMemoryHistoryStore(
+    max_messages=MAX_HISTORY_PER_LEAD,
+    keep_after_trim=MAX_HISTORY_PER_LEAD - COMPACTION_CHUNK,
+    max_sessions=MAX_ACTIVE_LEADS,
+    on_trim=compact_dropped_turns,
+    on_evict=forget_lead,
+)
+
+
+def get_lead_history(phone):
+    """Get a copy of lead's conversation history"""
+    return lead_store.get(phone)
+
+
+def get_message_seq(phone):
+    """Total number of messages ever added to the lead's history"""
+    return lead_store.seq(phone)
+
+
+def add_to_history(phone, role, content):
+    """Add a message to lead's conversation history"""
+    lead_store.append(phone, role, content)
+
+
+# ============================================================
+# OPENING MESSAGE - template fast path for new leads
+# ============================================================
+opening_templates = None
+if OPENING_TEMPLATE:
+    try:
+        opening_templates = OpeningTemplates(SALES_METHODOLOGY)
+        print("Opening message: template for new leads [OK]")
+    except ValueError as e:
+        print(f"Opening message: [ERROR] {e} - new leads get a model reply")
+
+
 # ============================================================
 # AI AGENT
 # ============================================================
 ai_agent = None
+usage_ledger = None
+spend_governor = None
 system_prompt = ""
+knowledge_retriever = None
+response_cache = None
 try:
-    from src.agents.claude_agent import ClaudeAgent
-    from selfinputd.knowledge_base import SKIBA_ARTS_KNOWLEDGE, SALES_METHODOLOGY
-
-    system_prompt = f"""You are רוקי-סאן (Rocky-San), the WhatsApp chatbot for Skiba Arts - organized Muay Thai boxing vacations in Phuket, Thailand.
-
-**YOUR #1 GOAL:**
-Get to know leads naturally, answer their questions, and schedule fitting calls with Eden (the founder).
-You do NOT close sales. You bring well-matched, informed leads to Eden's call.
-
-**YOUR APPROACH:**
-- Natural but CONTROLLED conversation in Stage 1 - get the 4 fitting questions done efficiently
-- Be friendly and real - like a friend who trains and knows Thailand
-- **CRITICAL**: If the conversation history is empty or this is clearly the first interaction, use the FULL opening message introducing רוקי-סאן (see OPENING MESSAGE in SALES_METHODOLOGY below)
-- If continuing an existing conversation, respond naturally to what they said
-- **CONFIDENCE, NOT APOLOGY** - Israelis respect confidence. If you made a mistake or the convo went sideways, slide past it with wit, flip it positive. NEVER grovel or over-apologize.
-
-**GETTING TO KNOW THE LEAD - TAKE CONTROL:**
-Stage 1 questions you MUST cover (in natural order):
-1. Experience level in martial arts (ALWAYS FIRST - already asked in opening message)
-2. Age: "בן כמה אתה אחי?"
-3. City: "מאיפה אתה בארץ?"
-4. Readiness to travel abroad: "יצא לך לנסוע לחו"ל לפני כן?"
-
-**HOW TO TAKE CONTROL:**
-- Frame it: "כמה שאלות קצרות יזרזו לנו את התהליך ויבטיחו שאנחנו מדברים על הדבר הנכון בשבילך"
-- Be DECISIVE - if they drift, bring them back: "אוקיי, וחוזר לשאלה שלי - [השאלה]"
-- If they ask a question mid-flow - answer briefly, then return to yours
-- Don't let the conversation drift before all 4 questions are answered
-
-**NEVER REPEAT YOURSELF:**
-- If you already said something, don't say it again in different words
-- Repeating = you didn't understand them or weren't clear enough
-- Israelis hate filler. If you said it once and they ignored it, either rephrase differently or move on
-
-**⚠️ WHATSAPP RULES - MOST CRITICAL (FOLLOW STRICTLY!):**
-- ⚠️ **MAXIMUM 2-3 SHORT sentences per response** - THIS IS THE #1 RULE!
-- WhatsApp = SHORT messages, not long email paragraphs!
-- Ask ONE question at a time - never overwhelm
-- **VARY your question endings** - Don't repeat "מה אתה אומר?" every time. Mix it up:
-  - "איך נשמע לך?"
-  - "נראה לך שזה משהו שיכול לעבוד עבורך?"
-  - "מקווה שאנחנו על אותו קו, אתה חושב כמוני?"
-  - Or just end naturally without asking
-- Let THEM lead sometimes - if they ask something, answer it naturally
-- Friendly and real - like a friend who trains, not a scripted bot
-- Emoji: maximum 1 per message, and not in every message
-- Use Hebrew when user writes in Hebrew, English for English
-- **If your draft response is longer than 3 sentences, DELETE content and make it shorter!**
-
-**AUTHENTICITY RULES (CRITICAL):**
-- You're a chatbot, but talk like a real person who trains and knows Thailand
-- BAD (cheap psychology): "אני מרגיש שאתה מחפש חיבור פנימי עם הכוח שלך"
-- GOOD (real talk): "נשמע שאתה צריך לפרוק את הראש ולהרגיש חי"
-- BAD (corporate sales): "החוויה הזו תשנה לך את החיים ברמה עמוקה"
-- GOOD (concrete): "אחרי 10 ימים של אימונים בחום של תאילנד, אתה חוזר בן אדם אחר"
-- Don't psycho-analyze the customer. Talk about the EXPERIENCE and what actually happens on the trip
-- Be direct and honest - Israelis smell bullshit immediately
-
-**LANGUAGE & SLANG:**
-- Say "מכון" or "מכון לחימה" - NEVER say "ג'ים" for a fighting gym
-- "חדר כושר" or "מכון כושר" = weights/fitness gym
-- "מכון" alone - depends on context: for fighters it means fighting gym, for gym-goers it means fitness gym
-- Good expressions: "יאללה", "אחלה", "מעולה", "סאבאי סאבאי", "לעלות לזירה", "בין החבלים", "על הקאנבס", "פדים", "ספארינג"
-- Say "לספוג מכה" or "לדעת לספוג" - NEVER say "לקחת מכות" (say "לקבל מכות" or better "לספוג")
-- Rocky quote: "זה לא כמה חזק אתה יודע להרביץ, זה כמה אתה יכול לספוג, ולהמשיך להילחם"
-- Be direct - Israelis value ישירות. Wrapping = weak/untrustworthy.
-
-**CONVERSATION FLOW:**
-1. OPENING (first message only): Use the full רוקי-סאן introduction - offer two paths (dry details link OR personal matching)
-2. GETTING TO KNOW: Collect the 4 key questions naturally (experience, age, city, travel readiness)
-3. UNDERSTANDING: Once you know the basics, understand what they're looking for in the trip
-4. ANSWERING: Answer their questions naturally, share relevant info, don't overwhelm
-5. OBJECTION HANDLING: Acknowledge ("אני מבין"), never defensive, use real examples
-6. CALL INVITATION: After you've gotten to know them (10-15 messages), invite to a simple call
-7. HOT LEAD HANDLING - when they say they're ready to pay or move forward:
-   - **Completed fitting process** → Make it EASY: "מעולה! בוא נסדר שיחה עם עדן לסגירת הפרטים"
-   - **NOT completed fitting yet** → Gently redirect: "שמח לשמוע שאתה רוצה להתקדם! כדי לוודא שהטיול באמת בשבילך, נקבע שיחה עם עדן שיסיים את בדיקת ההתאמה וייסגר איתך על הכל"
-   - **Eager to pay, barely answered questions** → Be direct: "אני מעריך, אבל בלי בדיקת התאמה אנחנו לא לוקחים ממך כסף. לא כולם מתאימים לטיולים שלנו - ולכן אנחנו בודקים. ממשיכים?"
-
-**SCHEDULING THE CALL:**
-When the lead agrees to a call:
-1. Ask preference: phone / Zoom / WhatsApp video
-2. Ask time slot: morning (9-12) / afternoon (12-16) / evening (18-21)
-3. Ask which day
-4. Confirm with SPECIFIC details: "מעולה! עדן יצור איתך קשר ביום [X] ב-[שעה]"
-5. Ask for full name (if not known)
-
-**OBJECTION HANDLING PRINCIPLES:**
-- "יקר מדי": Break down value (10 nights + training + guide + activities = value for starting price $2,640). Mention installments, friend discount.
-- "אין ניסיון/לא בכושר": 70% arrive with zero experience. Training adapted to every level.
-- "בא לבד": 80% come alone. "באתי לבד, יצאתי עם משפחה" - real quote.
-- After 2-3 objections: stop trying to solve in text, invite to call.
-- If lead truly doesn't fit: say so honestly and respectfully.
-
-**ISRAELI CULTURAL TONE:**
-- Be direct but friendly - straight talk, not interrogation
-- Drop real examples naturally: "היו לנו אנשים שבאו בלי שום ניסיון והם התאהבו בזה"
-- If they came from a friend - ask who, that's huge trust
-- Don't oversell - Israelis smell bullshit immediately
-- Good expressions: "אחי", "יאללה", "אחלה", "מעולה", "תותח"
-
-**WHAT WE SELL:** Real experience in Thailand, training that's adapted to you, authentic Muay Thai, group adventure
-**WHAT WE DON'T SELL:** Cheap trip, pro boxing course, luxury 5-star vacation, guaranteed life transformation
-
-**RED FLAGS (politely decline):**
-- Under 18, only cares about price, expects luxury, doesn't want group experience, looking to become a pro fighter
-
-**CRITICAL RULES:**
-- ONLY share information from the knowledge base below
-- NEVER invent dates, prices, or details
-- Starting price: $2,640 (varies by duration, season, booking time)
-- Upcoming trip dates: tell them to ask for the latest schedule
-- ALL levels welcome, no experience needed, age 18+
-
-**KNOWLEDGE BASE:**
-{SKIBA_ARTS_KNOWLEDGE}
-
-**DETAILED SALES METHODOLOGY:**
-{SALES_METHODOLOGY}
-
-Remember: Be real, be warm, be authentic. Talk like someone who trains, not like a marketing bot."""
-
-    ai_agent = ClaudeAgent(
-        name="Muay Thai Lead Assistant",
-        system_prompt=system_prompt
-    )
-    print("AI Agent: Claude Sonnet [OK]")
+    with startup.step("ai_agent"):
+        from src.agents.claude_agent import ClaudeAgent
+        from src.agents.spend_governor import SpendGovernor
+        from src.config import get_settings
+        from selfinputd.persona import full_system_prompt, retrieval_system_prompt
+
+        system_prompt = full_system_prompt()
+
+        settings = get_settings()
+        usage_ledger = UsageLedger(settings.usage_db)
+
+        # Spend already recorded today counts against today's budget after a restart
+        today = datetime.now().strftime("%Y-%m-%d")
+        spend_governor = SpendGovernor(settings.daily_budget_usd, settings.lead_daily_budget_usd)
+        spend_governor.seed(
+            usage_ledger.totals(since=today)["cost"],
+            {row["lead"]: row["cost"] for row in usage_ledger.rollup("lead", since=today) if row["lead"] != "-"},
+        )
+
+        ai_agent = ClaudeAgent(
+            name="Muay Thai Lead Assistant",
+            system_prompt=system_prompt,
+            history_store=lead_store,
+            ledger=usage_ledger,
+            governor=spend_governor,
+        )
+        print("AI Agent: Claude Sonnet [OK]")
+        print(f"Usage ledger: {usage_ledger.path} [OK]")
+        print(f"Daily budget: ${settings.daily_budget_usd:.2f} (per lead ${settings.lead_daily_budget_usd:.2f}) [OK]")
+
+        if KNOWLEDGE_RETRIEVAL:
+            knowledge_retriever = KnowledgeRetriever(
+                {"knowledge": SKIBA_ARTS_KNOWLEDGE, "methodology": SALES_METHODOLOGY},
+                chunk_size=ai_agent.settings.chunk_size,
+                chunk_overlap=ai_agent.settings.chunk_overlap,
+                pinned=KNOWLEDGE_PINNED,
+                first_contact=KNOWLEDGE_FIRST_CONTACT,
+            )
+            print(f"Knowledge retrieval: {len(knowledge_retriever.chunks)} sections, top {KNOWLEDGE_TOP_K} per turn [OK]")
+
+        if REPLY_TOOLS:
+            ai_agent.add_tool(trip_dates_tool(TRIP_SCHEDULE_FILE))
+            print(f"Reply tools: {', '.join(tool.name for tool in ai_agent.tools)} [OK]")
+
+        if RESPONSE_CACHE and opening_templates:
+            # New leads are answered from the template, so first messages never reach the model
+            print("Response cache: off (new leads get the opening template)")
+        elif RESPONSE_CACHE and ai_agent.settings.enable_caching:
+            response_cache = ResponseCache(
+                ttl=ai_agent.settings.cache_ttl,
+                max_entries=RESPONSE_CACHE_SIZE,
+                max_messages=RESPONSE_CACHE_MAX_MESSAGES,
+                variants=RESPONSE_CACHE_VARIANTS,
+                version=knowledge_version(KNOWLEDGE_BASE_FILE.read_text(encoding="utf-8"), system_prompt),
+            )
+            print(f"Response cache: opening messages, TTL {ai_agent.settings.cache_ttl}s [OK]")
 except Exception as e:
     print(f"AI Agent: [ERROR] {e}")
 
@@ -215,12 +405,63 @@ except Exception as e:
 # ============================================================
 # BOT INSTANCE
 # ============================================================
-bot = GreenAPIBot(instance_id, api_token)
+bot = startup.wait("green_api")
+if not bot:
+    print(f"\n[ERROR] Green API: {startup.report()['subsystems']['green_api'].get('error')}")
+    sys.exit(1)
 
 print("\n[OK] Bot initialized!")
 print("="*60)
 
 
+# ============================================================
+# OUTBOX - every outbound message is persisted, then sent by a worker
+# ============================================================
+def green_api_send(chat_id, text):
+    """Send one WhatsApp message (raises if Green API didn't accept it)"""
+    with STAGE_LATENCY.time(stage="send"):
+        response = bot.api.sending.sendMessage(chat_id, text)
+    if response.code != 200:
+        ERRORS.inc(subsystem="green_api")
+        raise RuntimeError(f"Green API returned {response.code}: {response.error}")
+
+
+def outbox_gave_up(message):
+    """A message could not be sent - make sure a lead's reply isn't lost silently"""
+    ERRORS.inc(subsystem="outbox")
+    with pending_sends_lock:
+        trace, _ = pending_sends.pop(message["key"], (None, None))
+    if trace:
+        trace.end(status="error", error="outbox gave up")
+    if message["kind"] != "reply" or not EDEN_CHAT_ID:
+        return
+    outbox.enqueue(
+        EDEN_CHAT_ID,
+        f"*תשובה ללקוח לא נשלחה*\n\n*טלפון:* +{message['chat_id'].split('@')[0]}\n*תשובה:* {message['text']}",
+        key=f"undelivered:{message['key']}",
+        kind="eden",
+        priority=PRIORITY_NOTIFICATION,
+    )
+
+
+outbox = Outbox(
+    OUTBOX_DB,
+    green_api_send,
+    rate=OUTBOX_SENDS_PER_SECOND,
+    burst=OUTBOX_BURST,
+    recipient_interval=RECIPIENT_MIN_INTERVAL,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    on_give_up=outbox_gave_up,
+    on_sent=end_sent_trace,
+)
+
+
+def notify_eden_text(text, key=None):
+    """Queue a WhatsApp message to Eden (no-op without EDEN_PHONE)"""
+    if EDEN_CHAT_ID:
+        outbox.enqueue(EDEN_CHAT_ID, text, key=key, kind="eden", priority=PRIORITY_NOTIFICATION)
+
+
 # ============================================================
 # MESSAGE TRACKING - prevents duplicate processing
 # ============================================================
@@ -239,161 +480,363 @@ def mark_processed(msg_id):
         return False
 
 
+def unmark_processed(msg_id):
+    """Forget a message ID so the sweep picks the message up again"""
+    with processed_lock:
+        processed_messages.pop(msg_id, None)
+
+
 # ============================================================
-# PER-LEAD CONVERSATION HISTORIES
+# INGESTION LIMITS - flood protection in front of the batch buffer
 # ============================================================
-lead_histories = {}  # {phone: [{"role": "user/assistant", "content": "..."}]}
-history_lock = threading.Lock()
+# One chat pasting dozens of messages, or two bots talking to each other,
+# would otherwise trigger a Claude call and Sheets writes per batch.
+def notify_quarantine(chat_id, reason):
+    """Tell Eden a number was quarantined automatically"""
+    INGEST_QUARANTINES.inc()
+    number = chat_id.split('@')[0]
+    notify_eden_text(
+        f"*מספר הושהה אוטומטית* ({reason})\n\n*טלפון:* +{number}\n\n"
+        f"לביטול: /release {number}"
+    )
 
 
-def get_lead_history(phone):
-    """Get a copy of lead's conversation history"""
-    with history_lock:
-        return lead_histories.get(phone, []).copy()
+ingestion_limiter = IngestionLimiter(
+    rate=INGEST_RATE_PER_MIN / 60,
+    burst=INGEST_BURST,
+    global_rate=INGEST_GLOBAL_PER_MIN / 60,
+    global_burst=INGEST_GLOBAL_BURST,
+    quarantine_strikes=QUARANTINE_STRIKES,
+    strike_window=QUARANTINE_WINDOW,
+    quarantine_seconds=QUARANTINE_HOURS * 3600,
+    overrides_path=INGESTION_OVERRIDES_FILE,
+    on_quarantine=notify_quarantine,
+)
 
 
-def add_to_history(phone, role, content):
-    """Add a message to lead's conversation history"""
-    with history_lock:
-        if phone not in lead_histories:
-            lead_histories[phone] = []
-        lead_histories[phone].append({"role": role, "content": content})
-        if len(lead_histories[phone]) > MAX_HISTORY_PER_LEAD:
-            lead_histories[phone] = lead_histories[phone][-MAX_HISTORY_PER_LEAD:]
+def admit_message(chat_id, msg_id):
+    """Rate-limit check for a new message. Returns True if it may be buffered.
+
+    Messages over the global limit are un-marked so the sweep retries them
+    once load drops; throttled or quarantined messages are dropped.
+    """
+    verdict = ingestion_limiter.admit(chat_id)
+    if verdict == ADMITTED:
+        return True
+    if verdict == OVERLOADED:
+        if msg_id:
+            unmark_processed(msg_id)
+        logger.warning(f"[INGEST] Global limit reached - leaving message from {chat_id} for the sweep")
+    else:
+        INGEST_DROPPED.inc(reason=verdict)
+        logger.warning(f"[INGEST] Dropped message from {chat_id} ({verdict})")
+    return False
+
+
+EDEN_COMMANDS = """פקודות:
+/release <מספר> - ביטול השהיה
+/allow <מספר> - ללא הגבלת קצב
+/disallow <מספר> - החזרת הגבלת קצב
+/block <מספר> - השהיה עד ביטול
+/quarantined - רשימת מספרים מושהים"""
+
+
+def handle_eden_command(text):
+    """Eden's overrides for the ingestion limits. Returns True if the text was a command."""
+    parts = text.strip().split()
+    if not parts or not parts[0].startswith("/"):
+        return False
+
+    command = parts[0].lower()
+    number = parts[1].lstrip("+") if len(parts) > 1 else ""
+    chat_id = f"{number}@c.us"
+
+    if command == "/quarantined":
+        quarantined = ingestion_limiter.quarantined()
+        reply = "\n".join(
+            f"+{chat.split('@')[0]}" + (f" (עד {datetime.fromtimestamp(until):%d/%m %H:%M})" if until else "")
+            for chat, until in quarantined.items()
+        ) or "אין מספרים מושהים"
+    elif command in ("/release", "/allow", "/disallow", "/block") and number.isdigit():
+        if command == "/release":
+            reply = f"+{number} שוחרר" if ingestion_limiter.release(chat_id) else f"+{number} לא היה מושהה"
+        elif command == "/allow":
+            ingestion_limiter.allow(chat_id)
+            reply = f"+{number} ללא הגבלת קצב"
+        elif command == "/disallow":
+            ingestion_limiter.disallow(chat_id)
+            reply = f"+{number} חזר להגבלת קצב"
+        else:
+            ingestion_limiter.quarantine(chat_id)
+            reply = f"+{number} מושהה עד ביטול"
+    else:
+        reply = EDEN_COMMANDS
+
+    logger.info(f"[INGEST] Eden command: {text.strip()}")
+    notify_eden_text(reply)
+    return True
+
+
+# ============================================================
+# CONVERSATION MEMORY - rolling summary of turns that left the window
+# ============================================================
+def summarize_old_turns(phone, current_memory, turns):
+    """Fold turns that left the history window into the lead's memory (runs in background)"""
+    prompt = (
+        f"CURRENT MEMORY:\n{json.dumps(current_memory, ensure_ascii=False)}\n\n"
+        f"OLDER TURNS:\n{format_transcript(turns)}"
+    )
+
+    if budget_level(phone) >= SpendGovernor.SKIP_ANALYSIS:
+        logger.info(f"[BUDGET] Skipping memory compaction for {phone} ({spend_governor.level_name(phone)})")
+        return None
+
+    try:
+        response = ai_agent.create_message(
+            task="compaction",
+            lead=phone,
+            max_tokens=600,
+            temperature=0.2,
+            system=COMPACTION_PROMPT,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return parse_json_reply(response.content[0].text)
+
+    except Exception as e:
+        ERRORS.inc(subsystem="memory")
+        logger.error(f"[MEMORY] Summarization error: {e}")
+        return None
+
+
+conversation_memory = ConversationMemory(summarize_old_turns, max_leads=MEMORY_MAX_LEADS) if ai_agent else None
+
+
+def build_system_prompt(phone, history=None):
+    """System prompt for a lead's turn.
+
+    With knowledge retrieval on, the persona gets only the knowledge-base
+    sections relevant to the recent messages instead of the whole base.
+    The lead's rolling memory is appended in both modes.
+    """
+    prompt = system_prompt
+    if knowledge_retriever and history:
+        first_turn = not any(msg["role"] == "assistant" for msg in history)
+        knowledge = knowledge_retriever.render(build_query(history), KNOWLEDGE_TOP_K, first_turn=first_turn)
+        prompt = retrieval_system_prompt(knowledge)
+
+    memory_text = conversation_memory.render(phone) if conversation_memory else ""
+    if not memory_text:
+        return prompt
+    return (
+        f"{prompt}\n\n"
+        f"**EARLIER IN THIS CONVERSATION (already discussed - don't re-ask):**\n"
+        f"{memory_text}"
+    )
 
 
 # ============================================================
 # CONVERSATION HISTORY SCANNING - load past context on restart
 # ============================================================
 loaded_context = set()  # phones we already tried loading context for
+context_loads = {}  # {phone: future} - context fetches in flight (live or warm-up)
+context_lock = threading.RLock()  # Re-entrant: cancelling a future runs its done-callback in place
+pipeline_pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+
+def start_context_load(chat_id, phone, pool=None, **kwargs):
+    """Fetch a chat's past context in the background - joins a fetch already in flight.
+
+    A live load (pool=None) takes over a warm-up fetch that is still
+    queued, so the lead doesn't wait behind the whole warm-up.
+    """
+    with context_lock:
+        future = context_loads.get(phone)
+        if future is not None and pool is None and future.cancel():
+            future = None
+        if future is None:
+            future = (pool or pipeline_pool).submit(fetch_conversation_context, chat_id, phone, **kwargs)
+            context_loads[phone] = future
+            future.add_done_callback(lambda done: finish_context_load(phone, done))
+    return future
+
+
+def finish_context_load(phone, future):
+    with context_lock:
+        if context_loads.get(phone) is future:
+            del context_loads[phone]
 
 
-def load_conversation_context(chat_id, phone):
+def load_conversation_context(chat_id, phone, timeout=None):
     """Load past conversation context when we have no in-memory history.
 
-    Priority:
-    1. Green API getChatHistory - actual WhatsApp messages
-    2. Google Sheets fallback - stored lead profile data
+    The load runs on the pipeline pool (or joins the startup warm-up's
+    fetch); the caller waits at most timeout seconds for it.
+
+    Returns (found, pending): found is True if past context was loaded,
+    False for a new lead and None if the load didn't finish in time -
+    pending is then its future, for merge_late_context.
     """
-    if phone in loaded_context:
-        return
-    loaded_context.add(phone)
+    with context_lock:
+        if phone in loaded_context:
+            return bool(get_lead_history(phone)), None
+        loaded_context.add(phone)
 
-    # --- Try Green API chat history ---
+    future = start_context_load(chat_id, phone)
     try:
-        result = bot.api.journals.getChatHistory(chat_id, 30)
-        messages = result.data if result.data else []
-
-        if messages and isinstance(messages, list):
-            history = []
-            for msg in reversed(messages):  # API returns newest first
-                msg_type = msg.get("typeMessage", "")
-                # Only process text messages
-                if msg_type not in ("outgoing", "incoming", "textMessage", "extendedTextMessage"):
-                    # Check by 'type' field instead
-                    pass
-
-                text = ""
-                # Try different text field locations
-                text = msg.get("textMessage", "")
-                if not text:
-                    text_data = msg.get("textMessageData", {})
-                    if isinstance(text_data, dict):
-                        text = text_data.get("textMessage", "")
-                if not text:
-                    ext_data = msg.get("extendedTextMessageData", {})
-                    if isinstance(ext_data, dict):
-                        text = ext_data.get("text", "")
-
-                if not text:
-                    continue
+        history = future.result(timeout=timeout)
+    except FuturesTimeout:
+        logger.warning(f"[HISTORY] No context for {phone} within {timeout:.1f}s - replying without it")
+        return None, future
 
-                # Determine role: outgoing = assistant, incoming = user
-                msg_type_raw = msg.get("type", "")
-                if msg_type_raw == "outgoing":
-                    history.append({"role": "assistant", "content": text})
-                elif msg_type_raw == "incoming":
-                    history.append({"role": "user", "content": text})
-                else:
-                    # Fallback: check chatId vs senderId
-                    sender = msg.get("senderId", "")
-                    if sender and sender == chat_id:
-                        history.append({"role": "user", "content": text})
-                    else:
-                        history.append({"role": "assistant", "content": text})
-
-            if history:
-                with history_lock:
-                    lead_histories[phone] = history[-MAX_HISTORY_PER_LEAD:]
-                logger.info(f"[HISTORY] Loaded {len(history)} messages from Green API for {phone}")
-                return
+    if not history:
+        return False, None
+    lead_store.replace(phone, history)
+    return True, None
 
-    except Exception as e:
-        logger.warning(f"[HISTORY] getChatHistory failed for {phone}: {e}")
 
-    # --- Fallback: Google Sheets lead data ---
-    if lead_manager:
-        try:
-            lead = lead_manager.get_lead(phone)
-            if lead and int(lead.get("message_count", 0) or 0) > 0:
-                # Build context summary from stored data
-                parts = ["[המשך שיחה קודמת - נתונים מגוגל שיטס]"]
-
-                name = lead.get("name", "")
-                if name:
-                    parts.append(f"שם: {name}")
-
-                age = lead.get("age", "")
-                if age:
-                    parts.append(f"גיל: {age}")
-
-                location = lead.get("location", "")
-                if location:
-                    parts.append(f"מיקום: {location}")
-
-                experience = lead.get("experience", "")
-                if experience:
-                    parts.append(f"ניסיון: {experience}")
-
-                score = lead.get("match_score", "")
-                if score:
-                    parts.append(f"ציון התאמה: {score}")
-
-                status = lead.get("status", "")
-                if status:
-                    parts.append(f"סטטוס: {status}")
-
-                msg_count = lead.get("message_count", "")
-                if msg_count:
-                    parts.append(f"הודעות קודמות: {msg_count}")
-
-                summary = lead.get("conversation_summary", "")
-                if summary:
-                    parts.append(f"סיכום שיחה קודמת: {summary}")
-
-                rejects = lead.get("rejects", "")
-                if rejects:
-                    parts.append(f"התנגדויות: {rejects}")
-
-                meeting = lead.get("meeting", "")
-                if meeting:
-                    parts.append(f"פגישה שנקבעה: {meeting}")
-
-                context_text = "\n".join(parts)
-
-                # Inject as a system-like context at the start of history
-                with history_lock:
-                    lead_histories[phone] = [
-                        {"role": "user", "content": "היי"},
-                        {"role": "assistant", "content": context_text},
-                    ]
-                logger.info(f"[HISTORY] Loaded lead profile from Google Sheets for {phone} (msg_count={msg_count})")
-                return
+def merge_late_context(phone, pending, timeout):
+    """Put context that finished loading after the reply in front of the new turns"""
+    try:
+        history = pending.result(timeout=timeout)
+    except FuturesTimeout:
+        logger.warning(f"[HISTORY] Context load for {phone} still running - giving up on it")
+        return
+    if history:
+        lead_store.prepend(phone, history)
+        logger.info(f"[HISTORY] Merged {len(history)} late context messages for {phone}")
+
+
+def green_api_chat_history(chat_id, count):
+    """Last count records of a chat, newest first (raises if Green API failed)"""
+    result = bot.api.journals.getChatHistory(chat_id, count)
+    if result.code != 200:
+        raise RuntimeError(f"Green API returned {result.code}: {result.error}")
+    return result.data if isinstance(result.data, list) else []
+
+
+history_loader = HistoryLoader(
+    green_api_chat_history,
+    get_lead=None,  # Set when Sheets joins (sheets_ready)
+    token_budget=HISTORY_TOKEN_BUDGET,
+    page_size=HISTORY_PAGE_SIZE,
+    max_messages=HISTORY_MAX_FETCH,
+    cache_ttl=HISTORY_CACHE_MINUTES * 60,
+    cache_size=MAX_ACTIVE_LEADS,
+)
+
 
+def fetch_conversation_context(chat_id, phone, sheet_leads=None):
+    """Past conversation of a chat as history messages (None if there is none).
+
+    Green API chat history up to HISTORY_TOKEN_BUDGET, with the stored
+    Sheets profile in front when the history doesn't reach the start
+    (looked up in sheet_leads {phone: lead} if given, instead of a sheet read).
+    """
+    return history_loader.load(chat_id, phone, leads=sheet_leads)
+
+
+# ============================================================
+# WARM-UP - prefetch recently active chats after a restart
+# ============================================================
+# Without it every lead's first message after a deploy waits for
+# getChatHistory (and a Sheets scan) before the reply can be generated.
+warmup_report = {"state": "pending" if WARMUP else "off"}
+
+
+def recent_chats():
+    """Chats active within WARMUP_HOURS, most recent first: [(chat_id, phone)]"""
+    last_seen = {}
+    minutes = WARMUP_HOURS * 60
+    for journal in (bot.api.journals.lastIncomingMessages, bot.api.journals.lastOutgoingMessages):
+        try:
+            result = journal(minutes=minutes)
+            for msg in result.data or []:
+                chat_id = msg.get("chatId", "")
+                if chat_id and not chat_id.endswith("@g.us"):
+                    last_seen[chat_id] = max(last_seen.get(chat_id, 0), msg.get("timestamp", 0))
         except Exception as e:
-            logger.warning(f"[HISTORY] Google Sheets fallback failed for {phone}: {e}")
+            logger.warning(f"[WARMUP] {journal.__name__} failed: {e}")
+
+    chats = [
+        chat_id for chat_id in sorted(last_seen, key=last_seen.get, reverse=True)
+        if chat_id.split('@')[0] not in EXCLUDED_NUMBERS
+    ]
+    return [(chat_id, f"+{chat_id.split('@')[0]}") for chat_id in chats[:WARMUP_MAX_CHATS]]
+
+
+def recent_sheet_chats(sheet_leads):
+    """Fallback when the journals are unavailable - leads by last_message_time"""
+    cutoff = (datetime.now() - timedelta(hours=WARMUP_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+    leads = sorted(
+        (lead for lead in sheet_leads.values() if (lead.get("last_message_time") or "") >= cutoff),
+        key=lambda lead: lead["last_message_time"],
+        reverse=True,
+    )
+    return [
+        (lead.get("whatsapp_id") or f"{lead['phone'].lstrip('+')}@c.us", lead["phone"])
+        for lead in leads[:WARMUP_MAX_CHATS]
+    ]
+
+
+def install_warm_context(phone, history):
+    """Put prefetched context into the history store. Returns True if history was loaded."""
+    with context_lock:
+        if phone in loaded_context:
+            return False  # A live message got there first and consumed the fetch
+        loaded_context.add(phone)
+        if history:
+            lead_store.replace(phone, history)
+    return bool(history)
+
+
+def warm_up():
+    """Startup warm-up - fill the history store for recently active chats.
+
+    Fetches run on warmup_pool (WARMUP_WORKERS at a time, started at most
+    WARMUP_RATE per second). A live message for a chat still being warmed
+    joins its fetch instead of starting another.
+    """
+    start = time.monotonic()
+    warmup_report.update(state="running")
+    try:
+        sheet_leads = {}
+        sheets = startup.wait("sheets", timeout=WARMUP_SHEETS_WAIT) if google_sheet_id else None
+        if sheets:
+            sheet_leads = {lead["phone"]: lead for lead in sheets.get_all_leads() if lead.get("phone")}
+        chats = recent_chats() or recent_sheet_chats(sheet_leads)
+
+        bucket = TokenBucket(WARMUP_RATE, WARMUP_WORKERS)
+        fetches = []
+        for chat_id, phone in chats:
+            while not bucket.take():
+                time.sleep(1.0 / WARMUP_RATE)
+            fetches.append((phone, start_context_load(chat_id, phone, pool=warmup_pool, sheet_leads=sheet_leads)))
+
+        warmed = failed = 0
+        for phone, future in fetches:
+            try:
+                warmed += install_warm_context(phone, future.result())
+            except CancelledError:
+                pass  # A live message took the chat over
+            except Exception as e:
+                failed += 1
+                logger.warning(f"[WARMUP] Prefetch for {phone} failed: {e}")
 
-    logger.info(f"[HISTORY] No past context found for {phone} - treating as new lead")
+        warmup_report.update(
+            state="done", chats=len(chats), warmed=warmed, failed=failed,
+            seconds=round(time.monotonic() - start, 2),
+        )
+        logger.info(
+            f"[WARMUP] Warmed {warmed} of {len(chats)} recent chats in {warmup_report['seconds']}s"
+            + (f" ({failed} failed)" if failed else "")
+        )
+    except Exception as e:
+        warmup_report.update(state="failed", error=str(e), seconds=round(time.monotonic() - start, 2))
+        ERRORS.inc(subsystem="warmup")
+        logger.error(f"[WARMUP] Warm-up failed: {e}")
+
+
+warmup_pool = ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup")
 
 
 # ============================================================
@@ -403,18 +846,27 @@ message_buffers = {}  # {chat_id: {"messages": [], "timer": Timer, ...}}
 buffer_lock = threading.Lock()
 
 
-def add_to_buffer(chat_id, sender_name, message_text, phone):
-    """Add a message to the buffer. Timer resets on each new message."""
+def add_to_buffer(chat_id, sender_name, message_text, phone, source="handler", msg_id=""):
+    """Add a message to the buffer. Timer resets on each new message.
+
+    A chat's first buffered message starts the batch's trace.
+    """
     with buffer_lock:
         if chat_id not in message_buffers:
             message_buffers[chat_id] = {
                 "messages": [],
                 "sender_name": sender_name,
                 "phone": phone,
-                "timer": None
+                "timer": None,
+                "msg_id": "",
+                "trace": tracer.start_trace("reply", chat_id=chat_id, phone=phone, source=source),
             }
 
         message_buffers[chat_id]["messages"].append(message_text)
+        if msg_id:
+            message_buffers[chat_id]["msg_id"] = msg_id  # Last message of the batch keys its reply
+        trace = message_buffers[chat_id]["trace"]
+        tracer.record("receive", trace, time.time(), source=source, msg_id=msg_id)
 
         # Cancel existing timer
         if message_buffers[chat_id]["timer"]:
@@ -427,7 +879,7 @@ def add_to_buffer(chat_id, sender_name, message_text, phone):
         timer.start()
 
         msg_count = len(message_buffers[chat_id]["messages"])
-        logger.info(f"[BATCH] Buffered message for {chat_id} ({msg_count} in queue)")
+        logger.info(f"[BATCH] Buffered message for {chat_id} ({msg_count} in queue) trace={trace.short_id}")
 
 
 def flush_buffer(chat_id):
@@ -438,20 +890,66 @@ def flush_buffer(chat_id):
             return
         buffer = message_buffers.pop(chat_id)
 
+    BATCH_SIZE.observe(len(buffer["messages"]))
     if len(buffer["messages"]) > 1:
         combined = "\n".join(buffer["messages"])
         logger.info(f"[BATCH] Combined {len(buffer['messages'])} messages for {chat_id}")
     else:
         combined = buffer["messages"][0]
 
-    logger.info(f"[BATCH] 🚀 Launching process_message thread for {chat_id}")
-    # Process in background thread
-    thread = threading.Thread(
-        target=process_message,
-        args=(chat_id, buffer["sender_name"], combined, buffer["phone"]),
-        daemon=True
+    trace = buffer["trace"]
+    tracer.record("batch_wait", trace, trace.start, messages=len(buffer["messages"]))
+
+    # Queue for a reply worker - most urgent chats first
+    priority = reply_priority(buffer["phone"], combined)
+    trace.set(priority=REPLY_CLASSES[priority])
+    reply_scheduler.submit(
+        chat_id, priority, chat_id, buffer["sender_name"], combined, buffer["phone"], trace, time.time(), buffer["msg_id"]
     )
-    thread.start()
+    logger.info(f"[BATCH] 🚀 Queued {chat_id} for processing ({REPLY_CLASSES[priority]})")
+
+
+# ============================================================
+# REPLY PRIORITY - revenue-critical chats first when workers are busy
+# ============================================================
+REPLY_CLASSES = ("scheduling", "engaged", "active", "new")
+
+# Lead fields the priority needs, kept from Sheets reads/writes so
+# ranking a chat never waits on Sheets
+lead_profiles = {}  # {phone: {"status", "match_score", "meeting", "last_seen"}}
+lead_profiles_lock = threading.Lock()
+
+
+def remember_lead_profile(phone, fields):
+    """Merge Sheets fields of a lead into the profile cache"""
+    with lead_profiles_lock:
+        profile = lead_profiles.setdefault(phone, {})
+        for key in ("status", "match_score", "meeting"):
+            if key in fields:
+                profile[key] = fields[key]
+
+
+def reply_priority(phone, message_text):
+    """Priority class (index into REPLY_CLASSES) for a chat's next batch"""
+    now = time.time()
+    with lead_profiles_lock:
+        profile = lead_profiles.setdefault(phone, {})
+        last_seen = profile.get("last_seen")
+        profile["last_seen"] = now
+
+    if profile.get("status") == "נקבעה שיחה" or profile.get("meeting") or mentions_scheduling(message_text):
+        return 0
+    try:
+        score = int(profile.get("match_score") or 0)
+    except (TypeError, ValueError):
+        score = 0
+    if profile.get("status") != "נסגר" and (
+        score >= HOT_LEAD_SCORE or (last_seen and now - last_seen < LIVE_CONVERSATION_MINUTES * 60)
+    ):
+        return 1
+    if last_seen or profile.get("status") or get_lead_history(phone):
+        return 2
+    return 3
 
 
 # ============================================================
@@ -475,70 +973,122 @@ def calculate_typing_delay(text):
 # ============================================================
 # AI ANALYSIS - extract structured data from conversation
 # ============================================================
-ANALYSIS_PROMPT = """You are analyzing a WhatsApp sales conversation for Skiba Arts (Muay Thai vacations in Thailand).
-Extract data from the conversation. Return ONLY valid JSON, nothing else.
+COMBINED_ANALYSIS_INSTRUCTION = """
+
+**CRM UPDATE (this turn only):**
+First write your normal WhatsApp reply to the customer as text.
+Then call the record_lead_analysis tool with what you know about the lead so far."""
+
 
-Required JSON format:
-{
-    "summary": "Concise analytical Hebrew summary (2-3 sentences). What the lead wants, readiness, concerns.",
-    "experience": "one of: מתחיל/בינוני/מתקדם, or null if unknown",
-    "age": "number or age range like '25-30'. null if unknown",
-    "location": "City/area in Israel in Hebrew. null if unknown",
-    "travel_readiness": "Hebrew short answer. Have they traveled abroad before? null if unknown",
-    "goals": "Hebrew. What they want from the trip (fitness/boxing skills/healing/extreme experience). null if unknown",
-    "match_score": "number 0-100. Criteria: engagement level (+25), expressed interest in trip (+25), good fit for product (+25), close to booking/call (+25)",
-    "rejects": "Hebrew. Objections the customer raised + suspected hidden objections. null if none detected",
-    "meeting": "If call/meeting was scheduled with specific details: 'יום [day], [date], שעה [time]'. null if not scheduled yet",
-    "status": "one of: חדש/בשיחה/נקבעה שיחה/נסגר/לא מתאים"
-}
+lead_analysis_state = {}  # {phone: {"profile": {...}, "cursor": seq, "increments": n}}
+analysis_state_lock = threading.Lock()
 
-IMPORTANT: Return ONLY the JSON object. No markdown, no explanation."""
+
+def record_analysis(phone, data, cursor, full):
+    """Store the latest analysis and move the lead's analysis cursor"""
+    with analysis_state_lock:
+        state = lead_analysis_state.get(phone, {})
+        lead_analysis_state[phone] = {
+            "profile": data,
+            "cursor": cursor,
+            "increments": 0 if full else state.get("increments", 0) + 1,
+        }
+
+
+def analysis_drifted(previous, updated):
+    """Sanity check for a delta analysis - True if it should be redone in full"""
+    for key in ("summary", "match_score", "status"):
+        if updated.get(key) is None:
+            return True
+
+    try:
+        if abs(int(updated["match_score"]) - int(previous.get("match_score") or 0)) > ANALYSIS_DRIFT_SCORE:
+            return True
+    except (ValueError, TypeError):
+        return True
+
+    old_rank = STATUS_ORDER.get(previous.get("status"))
+    new_rank = STATUS_ORDER.get(updated.get("status"))
+    if old_rank is not None and new_rank is not None and new_rank < old_rank:
+        return True
+
+    # A meeting doesn't disappear in a delta update
+    if previous.get("meeting") and not updated.get("meeting"):
+        return True
+
+    return False
+
+
+def request_analysis(phone, system, content):
+    """Run one analysis call and parse the JSON it returns"""
+    response = ai_agent.create_message(
+        task="analysis",
+        lead=phone,
+        max_tokens=500,
+        temperature=0.2,
+        system=system,
+        messages=[{"role": "user", "content": content}],
+    )
+    data = parse_json_reply(response.content[0].text)
+    if data is None:
+        logger.error(f"[ANALYSIS] No JSON found in response for {phone}")
+    return data
 
 
 def analyze_conversation(phone):
-    """Use AI to analyze the conversation and extract structured data"""
+    """Use AI to analyze the conversation and extract structured data.
+
+    Incremental: after the first full analysis, only the messages since
+    the lead's analysis cursor are sent along with the previous result.
+    A full re-analysis runs every ANALYSIS_FULL_EVERY_K increments, when
+    the new messages no longer fit in the history window, or when the
+    delta result fails the drift check.
+    """
     history = get_lead_history(phone)
     if not history or len(history) < 2:
         return None
 
-    convo_lines = []
-    for msg in history:
-        role = "Customer" if msg["role"] == "user" else "Bot"
-        convo_lines.append(f"{role}: {msg['content']}")
-    convo_text = "\n".join(convo_lines)
+    cursor = get_message_seq(phone)
+    with analysis_state_lock:
+        state = lead_analysis_state.get(phone)
 
     try:
-        response = ai_agent.client.messages.create(
-            model=ai_agent.settings.model_name,
-            max_tokens=500,
-            temperature=0.2,
-            system=ANALYSIS_PROMPT,
-            messages=[{"role": "user", "content": convo_text}],
-        )
-
-        result_text = response.content[0].text.strip()
-        # Clean if wrapped in code block
-        if result_text.startswith("```"):
-            result_text = result_text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        if result_text.startswith("{") and result_text.endswith("}"):
-            data = json.loads(result_text)
-        else:
-            # Try to find JSON in the response
-            start = result_text.find("{")
-            end = result_text.rfind("}") + 1
-            if start >= 0 and end > start:
-                data = json.loads(result_text[start:end])
-            else:
-                logger.error(f"[ANALYSIS] No JSON found in response for {phone}")
-                return None
-
-        logger.info(f"[ANALYSIS] {phone}: score={data.get('match_score')}, status={data.get('status')}, meeting={data.get('meeting')}")
+        if state:
+            new_count = cursor - state["cursor"]
+            if new_count <= 0:
+                return state["profile"]
+
+            if new_count <= len(history) and state["increments"] < ANALYSIS_FULL_EVERY_K:
+                content = (
+                    f"PREVIOUS ANALYSIS:\n{json.dumps(state['profile'], ensure_ascii=False)}\n\n"
+                    f"NEW MESSAGES:\n{format_transcript(history[-new_count:])}"
+                )
+                data = request_analysis(phone, INCREMENTAL_ANALYSIS_PROMPT, content)
+                if data and not analysis_drifted(state["profile"], data):
+                    record_analysis(phone, data, cursor, full=False)
+                    logger.info(f"[ANALYSIS] {phone} (delta, {new_count} msgs): score={data.get('match_score')}, status={data.get('status')}, meeting={data.get('meeting')}")
+                    return data
+                logger.warning(f"[ANALYSIS] {phone}: delta analysis failed drift check - running full analysis")
+
+        convo_text = format_transcript(history)
+        memory_text = conversation_memory.render(phone) if conversation_memory else ""
+        if memory_text:
+            convo_text = f"[Earlier conversation memory]\n{memory_text}\n[Recent messages]\n{convo_text}"
+
+        data = request_analysis(phone, ANALYSIS_PROMPT, convo_text)
+        if data is None:
+            return None
+
+        record_analysis(phone, data, cursor, full=True)
+        logger.info(f"[ANALYSIS] {phone} (full): score={data.get('match_score')}, status={data.get('status')}, meeting={data.get('meeting')}")
         return data
 
     except json.JSONDecodeError as e:
+        ERRORS.inc(subsystem="analysis")
         logger.error(f"[ANALYSIS] JSON parse error for {phone}: {e}")
         return None
     except Exception as e:
+        ERRORS.inc(subsystem="analysis")
         logger.error(f"[ANALYSIS] Error for {phone}: {e}")
         return None
 
@@ -546,8 +1096,14 @@ def analyze_conversation(phone):
 # ============================================================
 # EDEN NOTIFICATION - alert when meeting is scheduled
 # ============================================================
+def meeting_key(phone, meeting_details):
+    """Idempotency key of a meeting notification (lead + meeting text)"""
+    digest = hashlib.sha1(" ".join(meeting_details.lower().split()).encode("utf-8")).hexdigest()[:12]
+    return f"meeting:{phone}:{digest}"
+
+
 def notify_eden(customer_name, customer_phone, meeting_details, summary, row_number=None):
-    """Send WhatsApp notification to Eden about a scheduled meeting"""
+    """Queue a WhatsApp notification to Eden about a scheduled meeting (once per lead + meeting)"""
     sheet_link = ""
     if row_number and google_sheet_id:
         sheet_link = f"\n\nhttps://docs.google.com/spreadsheets/d/{google_sheet_id}/edit#gid=0&range=A{row_number}"
@@ -561,11 +1117,100 @@ def notify_eden(customer_name, customer_phone, meeting_details, summary, row_num
         f"{sheet_link}"
     )
 
-    try:
-        bot.api.sending.sendMessage(EDEN_CHAT_ID, message)
-        logger.info(f"[NOTIFY] Sent meeting notification to Eden for {customer_name}")
-    except Exception as e:
-        logger.error(f"[NOTIFY] Failed to notify Eden: {e}")
+    if EDEN_CHAT_ID and outbox.enqueue(
+        EDEN_CHAT_ID, message, key=meeting_key(customer_phone, meeting_details),
+        kind="eden", priority=PRIORITY_NOTIFICATION,
+    ):
+        logger.info(f"[NOTIFY] Queued meeting notification to Eden for {customer_name}")
+
+
+# ============================================================
+# DEGRADED MODE - reply later instead of sending error texts
+# ============================================================
+deferred_replies = OrderedDict()  # {chat_id: {"sender_name", "phone", "message_text", "attempts", "reason", "deferred_at", "msg_id"}}
+deferred_lock = threading.Lock()
+# Errors meaning the API itself is unreachable - retrying other leads this round is pointless
+API_DOWN_ERRORS = (CircuitOpenError, DeadlineExceededError, anthropic.APITimeoutError, anthropic.APIConnectionError)
+
+
+def defer_reply(chat_id, sender_name, phone, message_text, reason=None, msg_id=""):
+    """Queue a lead whose reply failed - the retry thread answers when the AI is back"""
+    with deferred_lock:
+        item = deferred_replies.setdefault(chat_id, {"attempts": 0, "since": time.time()})
+        item.update({
+            "sender_name": sender_name, "phone": phone, "message_text": message_text,
+            "reason": reason, "deferred_at": time.time(), "msg_id": msg_id,
+        })
+    logger.warning(f"[DEGRADED] Reply to {phone} deferred ({reason.__class__.__name__ if reason else 'AI unavailable'})")
+
+
+def deferred_reply_loop():
+    """Background thread - retries deferred replies once the AI answers again"""
+    logger.info("[DEGRADED] Deferred reply thread started")
+    while True:
+        time.sleep(DEFERRED_RETRY_INTERVAL)
+        with deferred_lock:
+            pending = list(deferred_replies.items())
+
+        for chat_id, item in pending:
+            with buffer_lock:
+                if chat_id in message_buffers:
+                    continue  # New messages coming - the regular flow will answer
+
+            with deferred_lock:
+                if chat_id not in deferred_replies:
+                    continue
+                item["attempts"] += 1
+                attempts = item["attempts"]
+
+            if attempts > DEFERRED_MAX_ATTEMPTS:
+                with deferred_lock:
+                    deferred_replies.pop(chat_id, None)
+                logger.error(f"[DEGRADED] Giving up on reply to {item['phone']} after {attempts - 1} attempts")
+                notify_eden_text(
+                    f"*ליד מחכה לתשובה* (הבוט לא הצליח לענות)\n\n"
+                    f"*שם:* {item['sender_name']}\n*טלפון:* {item['phone']}\n"
+                    f"*הודעה אחרונה:* {item['message_text']}",
+                    key=f"deferred:{item['phone']}:{item['msg_id'] or item['since']}",
+                )
+                continue
+
+            logger.info(f"[DEGRADED] Retrying deferred reply to {item['phone']} (attempt {attempts})")
+            retried_at = time.time()
+            try:
+                if reply_to_lead(chat_id, item["sender_name"], item["phone"], item["message_text"], msg_id=item["msg_id"]):
+                    continue
+            except Exception as e:
+                logger.error(f"[DEGRADED] Deferred reply error for {item['phone']}: {e}")
+                continue
+
+            with deferred_lock:
+                entry = deferred_replies.get(chat_id)
+                if entry and entry["deferred_at"] < retried_at:
+                    # Not deferred again - handed to Eden (budget) or already answered (outbox duplicate)
+                    deferred_replies.pop(chat_id, None)
+                    entry = None
+            if entry and isinstance(entry["reason"], API_DOWN_ERRORS):
+                break  # API still down - wait for the next round
+
+
+# ============================================================
+# SPEND GOVERNOR - staged degradation under the daily budget
+# ============================================================
+def budget_level(phone):
+    """Spend governor level for a lead (NORMAL without a governor)"""
+    return spend_governor.level(phone) if spend_governor else 0
+
+
+def hand_off_to_eden(phone, sender_name, message_text):
+    """Budget used up - leave the lead for Eden (notified once per lead per day)"""
+    day = datetime.now().strftime("%Y-%m-%d")
+    logger.warning(f"[BUDGET] No AI reply for {phone} - budget used up ({spend_governor.level_name(phone)})")
+    notify_eden_text(
+        f"*ליד מחכה לתשובה ידנית* (תקציב ה-AI היומי נוצל)\n\n"
+        f"*שם:* {sender_name}\n*טלפון:* {phone}\n*הודעה:* {message_text}",
+        key=f"budget:{phone}:{day}",
+    )
 
 
 # ============================================================
@@ -573,144 +1218,386 @@ def notify_eden(customer_name, customer_phone, meeting_details, summary, row_num
 # ============================================================
 lead_response_count = {}  # {phone: count} - tracks responses for analysis frequency
 
+# Scheduling talk - day names, times of day, call/zoom/meeting words
+SCHEDULING_PATTERN = re.compile(
+    r"(שיחה|פגישה|זום|zoom|וידאו|להתקשר|תתקשר|מתי|שעה|בוקר|צהריים|ערב|מחר|"
+    r"ראשון|שני|שלישי|רביעי|חמישי|שישי|\d{1,2}[:.]\d{2}|call|meeting|tomorrow)",
+    re.IGNORECASE,
+)
 
-def process_message(chat_id, sender_name, message_text, phone):
-    """Process a message: sheets -> AI -> typing delay -> reply -> analysis -> notify"""
-    logger.info(f"[PROCESS] ⚡ Starting to process message for {phone} ({chat_id})")
+
+def generate_reply(phone, shared_tools_only=False):
+    """Plain reply generation for a lead (short acks may be routed to the fast model).
+
+    With REPLY_TOOLS the model can look up the lead profile / trip dates
+    mid-reply - shared_tools_only leaves out lead-specific tools (for
+    replies that go into the response cache). Once the spend governor
+    reaches SHORT_HISTORY only the last BUDGET_SHORT_HISTORY messages are
+    sent. The reply is added to the history only after it was sent.
+    """
+    short_history = budget_level(phone) >= SpendGovernor.SHORT_HISTORY
+    reply = ai_agent.run_with_tools(
+        max_history=BUDGET_SHORT_HISTORY if short_history else None,
+        tools=[tool for tool in ai_agent.tools if not (shared_tools_only and tool.per_session)],
+        session_id=phone,
+        system=lambda history: build_system_prompt(phone, history),
+        task="reply",
+        record_reply=False,
+    )
+    logger.info(f"AI response ({phone}): {reply[:80]}...")
+    return reply
+
+
+def generate_reply_with_analysis(phone, history):
+    """Reply + lead analysis in a single model call.
+
+    The model writes its reply as text and fills LEAD_ANALYSIS_TOOL in the
+    same response. Returns (reply, analysis) - analysis is None if the
+    model didn't call the tool, so the caller can fall back to
+    analyze_conversation.
+    """
+    response = ai_agent.create_message(
+        task="reply_analysis",
+        lead=phone,
+        max_tokens=ai_agent.settings.max_tokens,
+        temperature=ai_agent.settings.temperature,
+        system=build_system_prompt(phone, history) + COMBINED_ANALYSIS_INSTRUCTION,
+        messages=history,
+        tools=[LEAD_ANALYSIS_TOOL],
+        tool_choice={"type": "auto"},
+    )
+
+    reply_parts = []
+    analysis = None
+    for block in response.content:
+        if block.type == "text":
+            reply_parts.append(block.text)
+        elif block.type == "tool_use" and block.name == LEAD_ANALYSIS_TOOL["name"]:
+            analysis = dict(block.input)
+    reply = "\n".join(part.strip() for part in reply_parts if part.strip())
+    logger.info(f"AI response ({phone}): {reply[:80]}...")
+
+    if analysis:
+        # The reply call saw the whole conversation - counts as a full analysis
+        record_analysis(phone, analysis, get_message_seq(phone), full=True)
+        logger.info(f"[ANALYSIS] {phone} (combined): score={analysis.get('match_score')}, status={analysis.get('status')}, meeting={analysis.get('meeting')}")
+    else:
+        logger.warning(f"[ANALYSIS] {phone}: model skipped {LEAD_ANALYSIS_TOOL['name']} - will run separate analysis")
+
+    if not reply:
+        # Model went straight to the tool - get the customer reply without it
+        logger.warning(f"[ANALYSIS] {phone}: combined call returned no reply text - regenerating")
+        reply = generate_reply(phone)
+
+    return reply, analysis
+
+
+def cached_or_generated_reply(phone):
+    """Reply from the response cache for common opening messages, generated otherwise"""
+    history = get_lead_history(phone)
+    cacheable = bool(response_cache) and response_cache.cacheable(history)
+    if cacheable:
+        reply = response_cache.get(history, phone)
+        CACHE_LOOKUPS.inc(result="hit" if reply else "miss")
+        if reply:
+            logger.info(f"[CACHE] Hit for {phone} (hit rate {response_cache.hit_rate():.0%}, {len(response_cache)} entries)")
+            return reply
+
+    reply = generate_reply(phone, shared_tools_only=cacheable)
+    if cacheable:
+        response_cache.put(history, reply)
+    return reply
+
+
+def check_knowledge_changed():
+    """Drop cached replies if knowledge_base.py changed on disk.
+
+    The running bot keeps the knowledge it was started with, so caching
+    stays off until the restart that loads the new version.
+    """
+    if not response_cache or not response_cache.enabled:
+        return
     try:
-        # 1. Get/create lead in Google Sheets
-        if lead_manager:
-            try:
-                lead = lead_manager.get_lead(phone)
-
-                if not lead:
-                    lead = {
-                        'phone': phone,
-                        'whatsapp_id': chat_id,
-                        'name': sender_name,
-                        'source': 'WhatsApp',
-                        'message_count': 0,
-                        'conversation_summary': '',
-                    }
-                    lead_manager.add_lead(lead)
-                    logger.info(f"New lead created: {phone}")
-
-                message_count = int(lead.get('message_count', 0) or 0) + 1
-                updates = {
-                    'message_count': message_count,
-                    'last_message_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                }
-                # Auto-update status from "new" to "in conversation"
-                current_status = lead.get('status', '')
-                if current_status in ('', 'חדש') and message_count > 1:
-                    updates['status'] = 'בשיחה'
-                lead_manager.update_lead(phone, updates)
+        version = knowledge_version(KNOWLEDGE_BASE_FILE.read_text(encoding="utf-8"), system_prompt)
+    except OSError:
+        return
+    if version != response_cache.version:
+        response_cache.invalidate(version)
+        response_cache.enabled = False
+        logger.warning("[CACHE] knowledge_base.py changed - response cache off until the bot is restarted")
+
+
+def apply_analysis(phone, sender_name, analysis):
+    """Write analysis fields to Google Sheets and notify Eden about new meetings"""
+    sheet_updates = analysis_to_sheet_updates(analysis)
+
+    # Check if meeting was just scheduled
+    meeting = analysis.get("meeting")
+    if meeting:
+        # Check if NEW meeting (not already saved) - the outbox key dedupes
+        # notifications racing with a slow Sheets write
+        with lead_profiles_lock:
+            existing_meeting = lead_profiles.get(phone, {}).get("meeting", "")
+        if not existing_meeting:
+            row_num = lead_manager.get_lead_row_number(phone)
+            notify_eden(
+                customer_name=sender_name,
+                customer_phone=phone,
+                meeting_details=meeting,
+                summary=analysis.get("summary", ""),
+                row_number=row_num
+            )
+
+    if sheet_updates:
+        lead_manager.update_lead(phone, sheet_updates)
+        remember_lead_profile(phone, sheet_updates)
+        logger.info(f"[ANALYSIS] Updated sheets for {phone}: {list(sheet_updates.keys())}")
+
+
+def mentions_scheduling(text):
+    """True if the lead's message looks like they're arranging a call/meeting"""
+    return bool(SCHEDULING_PATTERN.search(text))
+
+
+def run_analysis_job(phone, payload):
+    """Analysis queue handler - analyze (unless the reply call already did) and update Sheets"""
+    analysis = payload.get("analysis")
+    with tracer.span("analysis", payload.get("trace"), combined=analysis is not None):
+        if analysis is None:
+            # Scheduling leads are analyzed until the budget is gone, routine analysis stops earlier
+            level = budget_level(phone)
+            if level >= (SpendGovernor.EDEN_ONLY if payload.get("scheduling") else SpendGovernor.SKIP_ANALYSIS):
+                logger.info(f"[BUDGET] Skipping analysis for {phone} ({SpendGovernor.LEVEL_NAMES[level]})")
+                return
+            # Combined mode off, or the model skipped the tool - separate call
+            analysis = analyze_conversation(phone)
+        if analysis:
+            apply_analysis(phone, payload["sender_name"], analysis)
+
+
+analysis_queue = AnalysisQueue(
+    run_analysis_job,
+    workers=ANALYSIS_WORKERS,
+    debounce_seconds=ANALYSIS_DEBOUNCE,
+    priority_debounce_seconds=ANALYSIS_PRIORITY_DEBOUNCE,
+)
+
+
+def reply_to_lead(chat_id, sender_name, phone, message_text, first_contact=False, timings=None, trace=None, msg_id=""):
+    """Reply to the lead's current history: AI -> typing delay -> send -> analysis.
+
+    New leads (first_contact) get the opening template without a model
+    call. If the AI is unavailable (circuit open, deadline or retries
+    exhausted, or an empty reply) the reply is deferred instead of
+    sending an error text.
+    Once the budget is used up the lead is handed to Eden instead.
+    The reply goes to the outbox with the typing delay as its send time.
+    Stage durations are added to timings (and spans to trace) if given.
+    Returns True if a reply was queued.
+    """
+    timings = timings if timings is not None else {}
+
+    # 3. Get AI response with per-lead context
+    stage = time.monotonic()
+    started = time.time()
+    analysis = None
+    analysis_turn = False
+    level = budget_level(phone)
+    if lead_manager and ai_agent and level < SpendGovernor.SKIP_ANALYSIS:
+        analysis_turn = (lead_response_count.get(phone, 0) + 1) % ANALYSIS_EVERY_N == 0
+
+    if first_contact and opening_templates:
+        reply = opening_templates.render(sender_name)
+        path = "template"
+        logger.info(f"[OPENING] Template opening for new lead {phone}")
+    elif ai_agent and level >= SpendGovernor.EDEN_ONLY:
+        hand_off_to_eden(phone, sender_name, message_text)
+        return False
+    elif ai_agent:
+        try:
+            if analysis_turn and COMBINED_ANALYSIS:
+                reply, analysis = generate_reply_with_analysis(phone, get_lead_history(phone))
+            else:
+                reply = cached_or_generated_reply(phone)
+            if not reply or not reply.strip():
+                raise ValueError("Model returned an empty reply")
+            path = "model"
 
-            except Exception as e:
-                logger.error(f"Error with Google Sheets: {e}")
+        except Exception as e:
+            tracer.record("generate", trace, started, status="error", error=str(e)[:200])
+            logger.error(f"AI error: {e}")
+            defer_reply(chat_id, sender_name, phone, message_text, reason=e, msg_id=msg_id)
+            return False
+    else:
+        reply = "ברוך הבא! מעוניין לשמוע על אימוני מואי טאי בתאילנד?"
+        path = "fallback"
+
+    if lead_manager and ai_agent:
+        lead_response_count[phone] = lead_response_count.get(phone, 0) + 1
+    timings["generate"] = time.monotonic() - stage
+    tracer.record("generate", trace, started, path=path, with_analysis=analysis is not None)
+
+    # 4-5. Queue the reply - the outbox sends it after the typing delay.
+    #      Keyed by the batch's last message ID: a deferred retry racing
+    #      the regular flow can't answer the same messages twice.
+    stage = time.monotonic()
+    started = time.time()
+    delay = calculate_typing_delay(reply)
+    TYPING_DELAY.observe(delay)
+    key = reply_key(phone, msg_id)
+    queued = outbox.enqueue(chat_id, reply, key=key, delay=delay, ttl=REPLY_TTL_MINUTES * 60)
+    timings["enqueue"] = time.monotonic() - stage
+    tracer.record("enqueue", trace, started, typing_delay=delay, duplicate=not queued)
+    if not queued:
+        return False
+    if trace:
+        trace_until_sent(key, trace)
+    logger.info(f"[SEND] 📤 Queued reply to {chat_id} (typing delay {delay}s): {reply[:80]}...")
+
+    with deferred_lock:
+        deferred_replies.pop(chat_id, None)
+
+    # 6. Add bot response to per-lead history
+    add_to_history(phone, "assistant", reply)
+
+    # 7. Queue AI Analysis + Google Sheets update (every N responses, or
+    #    right away when the lead is scheduling - debounced either way)
+    scheduling = lead_manager and ai_agent and mentions_scheduling(message_text)
+    if analysis_turn or scheduling:
+        analysis_queue.submit(
+            phone,
+            {"sender_name": sender_name, "analysis": analysis, "trace": trace, "scheduling": bool(scheduling)},
+            priority=bool(scheduling),
+        )
+    return True
 
-        # 1.5. Load past conversation context if we have no in-memory history
-        if not get_lead_history(phone):
-            load_conversation_context(chat_id, phone)
 
-        # 2. Add user message to per-lead history
-        add_to_history(phone, "user", message_text)
+def record_lead_message(chat_id, sender_name, phone, trace=None):
+    """Bookkeeping stage: get/create the lead in Google Sheets and count the message"""
+    span = tracer.start_span("bookkeeping", trace)
+    try:
+        with tracer.span("sheets.get_lead", span):
+            lead = lead_manager.get_lead(phone)
 
-        # 3. Get AI response with per-lead context
-        if ai_agent:
-            try:
-                history = get_lead_history(phone)
-                response = ai_agent.client.messages.create(
-                    model=ai_agent.settings.model_name,
-                    max_tokens=ai_agent.settings.max_tokens,
-                    temperature=ai_agent.settings.temperature,
-                    system=system_prompt,
-                    messages=history,
-                )
-                reply = response.content[0].text
+        if not lead:
+            lead = {
+                'phone': phone,
+                'whatsapp_id': chat_id,
+                'name': sender_name,
+                'source': 'WhatsApp',
+                'message_count': 0,
+                'conversation_summary': '',
+            }
+            with tracer.span("sheets.add_lead", span):
+                lead_manager.add_lead(lead)
+            logger.info(f"New lead created: {phone}")
+
+        message_count = int(lead.get('message_count', 0) or 0) + 1
+        updates = {
+            'message_count': message_count,
+            'last_message_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        # Auto-update status from "new" to "in conversation"
+        current_status = lead.get('status', '')
+        if current_status in ('', 'חדש') and message_count > 1:
+            updates['status'] = 'בשיחה'
+        with tracer.span("sheets.update_lead", span):
+            lead_manager.update_lead(phone, updates)
+        remember_lead_profile(phone, {**lead, **updates})
 
-                input_cost = (response.usage.input_tokens / 1_000_000) * 3.0
-                output_cost = (response.usage.output_tokens / 1_000_000) * 15.0
-                logger.info(f"AI response ({phone}): {reply[:80]}... | Cost: ${input_cost + output_cost:.4f}")
+    except Exception as e:
+        span.end(status="error", error=str(e)[:200])
+        logger.error(f"Error with Google Sheets: {e}")
+    finally:
+        span.end()
 
-            except Exception as e:
-                logger.error(f"AI error: {e}")
-                reply = "תודה על ההודעה! יש לי תקלה טכנית קטנה. נסה שוב בעוד רגע."
-        else:
-            reply = "ברוך הבא! מעוניין לשמוע על אימוני מואי טאי בתאילנד?"
 
-        # 4. Typing delay - simulate human typing
-        delay = calculate_typing_delay(reply)
-        logger.info(f"[TYPING] Waiting {delay}s before sending to {chat_id}")
-        time.sleep(delay)
+def process_message(chat_id, sender_name, message_text, phone, trace=None, queued_at=None, msg_id=""):
+    """Process a message in stages: context -> AI -> typing delay -> reply -> analysis.
+
+    Only the conversation context blocks the reply, and only for
+    CONTEXT_LOAD_TIMEOUT - Sheets bookkeeping runs alongside and is
+    awaited after sending, so one lead's Sheets writes stay in order.
+    Every wait is bounded by the batch's MESSAGE_DEADLINE. Stages are
+    recorded as spans of the batch's trace; it stays open until the
+    reply is sent.
+    """
+    logger.info(f"[PROCESS] ⚡ Starting to process message for {phone} ({chat_id})")
+    if queued_at:
+        tracer.record("queue_wait", trace, queued_at)
+    start = time.monotonic()
+    deadline = start + MESSAGE_DEADLINE
+    timings = {}
+    queued = False
+    try:
+        # 1. Bookkeeping: get/create lead in Google Sheets (off the critical path)
+        bookkeeping = (
+            pipeline_pool.submit(record_lead_message, chat_id, sender_name, phone, trace) if lead_manager else None
+        )
+
+        # 1.5. Load past conversation context if we have no in-memory history
+        first_contact = False
+        late_context = None
+        if not get_lead_history(phone):
+            stage = time.monotonic()
+            with tracer.span("context", trace) as span:
+                found, late_context = load_conversation_context(
+                    chat_id, phone, timeout=min(CONTEXT_LOAD_TIMEOUT, max(deadline - stage, 0))
+                )
+                span.set(found={True: "history", False: "none", None: "timeout"}[found])
+            first_contact = found is False  # Unknown (load timed out) is not treated as new
+            timings["context"] = time.monotonic() - stage
 
-        # 5. Send reply
-        logger.info(f"[SEND] 📤 Sending reply to {chat_id}: {reply[:80]}...")
-        bot.api.sending.sendMessage(chat_id, reply)
-        logger.info(f"[SEND] ✅ Reply successfully sent to {chat_id}")
+        # 2. Add user message to per-lead history
+        add_to_history(phone, "user", message_text)
 
-        # 6. Add bot response to per-lead history
-        add_to_history(phone, "assistant", reply)
+        # 3-7. Generate (or open with the template for new leads), send, and queue analysis
+        queued = reply_to_lead(
+            chat_id, sender_name, phone, message_text, first_contact=first_contact, timings=timings, trace=trace,
+            msg_id=msg_id,
+        )
 
-        # 7. AI Analysis + Google Sheets update (every N responses)
-        if lead_manager and ai_agent:
-            lead_response_count[phone] = lead_response_count.get(phone, 0) + 1
+        # 8. Context that arrived after the timeout goes in front of this turn
+        if late_context:
+            merge_late_context(phone, late_context, timeout=max(deadline - time.monotonic(), 0))
 
-            if lead_response_count[phone] % ANALYSIS_EVERY_N == 0:
+        # 9. Wait for the Sheets bookkeeping
+        if bookkeeping:
+            stage = time.monotonic()
+            with tracer.span("bookkeeping_wait", trace):
                 try:
-                    analysis = analyze_conversation(phone)
-                    if analysis:
-                        sheet_updates = {}
-
-                        if analysis.get("summary"):
-                            sheet_updates["conversation_summary"] = analysis["summary"]
-                        if analysis.get("experience"):
-                            sheet_updates["experience"] = analysis["experience"]
-                        if analysis.get("age"):
-                            sheet_updates["age"] = str(analysis["age"])
-                        if analysis.get("location"):
-                            sheet_updates["location"] = analysis["location"]
-                        if analysis.get("travel_readiness"):
-                            sheet_updates["travel_readiness"] = analysis["travel_readiness"]
-                        if analysis.get("goals"):
-                            sheet_updates["goals"] = analysis["goals"]
-                        if analysis.get("match_score") is not None:
-                            sheet_updates["match_score"] = analysis["match_score"]
-                        if analysis.get("rejects"):
-                            sheet_updates["rejects"] = analysis["rejects"]
-                        if analysis.get("status"):
-                            sheet_updates["status"] = analysis["status"]
-
-                        # Check if meeting was just scheduled
-                        meeting = analysis.get("meeting")
-                        if meeting:
-                            sheet_updates["meeting"] = meeting
-
-                            # Check if NEW meeting (not already saved)
-                            lead = lead_manager.get_lead(phone)
-                            existing_meeting = lead.get("meeting", "") if lead else ""
-                            if not existing_meeting:
-                                row_num = lead_manager.get_lead_row_number(phone)
-                                notify_eden(
-                                    customer_name=sender_name,
-                                    customer_phone=phone,
-                                    meeting_details=meeting,
-                                    summary=analysis.get("summary", ""),
-                                    row_number=row_num
-                                )
-
-                        if sheet_updates:
-                            lead_manager.update_lead(phone, sheet_updates)
-                            logger.info(f"[ANALYSIS] Updated sheets for {phone}: {list(sheet_updates.keys())}")
-
-                except Exception as e:
-                    logger.error(f"[ANALYSIS] Error updating sheets: {e}")
+                    bookkeeping.result(timeout=max(deadline - stage, 0))
+                except FuturesTimeout:
+                    logger.warning(f"[PIPELINE] Sheets bookkeeping for {phone} still running at the deadline")
+            timings["bookkeeping_wait"] = time.monotonic() - stage
 
     except Exception as e:
+        if trace:
+            trace.end(status="error", error=str(e)[:200])
+        ERRORS.inc(subsystem="process")
         logger.error(f"Error processing message: {e}")
         import traceback
         traceback.print_exc()
 
+    finally:
+        total = time.monotonic() - start
+        for name, seconds in timings.items():
+            STAGE_LATENCY.observe(seconds, stage=name)
+        STAGE_LATENCY.observe(total, stage="total")
+        stages = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        log = logger.warning if total > MESSAGE_DEADLINE else logger.info
+        log(f"[PIPELINE] {phone}: {stages} | total {total:.2f}s | trace={trace.short_id if trace else '-'}")
+        if trace and not queued:
+            trace.end(status="no_reply")  # Deferred, handed to Eden or a duplicate - nothing to wait for
+
+
+reply_scheduler = ReplyScheduler(
+    process_message,
+    workers=REPLY_WORKERS,
+    aging_seconds=PRIORITY_AGING,
+    class_names=REPLY_CLASSES,
+)
+
 
 # ============================================================
 # BOT HANDLERS
@@ -718,9 +1605,10 @@ def process_message(chat_id, sender_name, message_text, phone):
 @bot.router.message(text_message=["stop", "סטופ", "עצור"])
 def stop_handler(notification: Notification) -> None:
     """Handle stop command"""
-    notification.answer(
+    outbox.enqueue(
+        notification.event.get("senderData", {}).get("chatId", ""),
         "Thank you for your interest! If you want to chat again, just send a message anytime.\n\n"
-        "Muay Thai awaits! See you in Thailand!"
+        "Muay Thai awaits! See you in Thailand!",
     )
 
 
@@ -736,29 +1624,22 @@ def message_handler(notification: Notification) -> None:
         if chat_id.endswith("@g.us"):
             return
 
-        # Ignore excluded numbers (Eden, etc.)
         number = chat_id.split('@')[0] if '@' in chat_id else chat_id
-        if number in EXCLUDED_NUMBERS:
-            logger.info(f"Skipping message from excluded number: {number}")
+        message_data = notification.event.get("messageData", {})
+
+        # Media-only messages are not answered - they show up as placeholders
+        # ("[image]") only when a past conversation is loaded
+        message_text = extract_text(message_data)
+        if not message_text:
             return
 
-        message_data = notification.event.get("messageData", {})
-        type_message = message_data.get("typeMessage", "")
-
-        # Extract text from various message types
-        message_text = ""
-        if type_message == "textMessage":
-            message_text = message_data.get("textMessageData", {}).get("textMessage", "")
-        elif type_message == "extendedTextMessage":
-            message_text = message_data.get("extendedTextMessageData", {}).get("text", "")
-        elif type_message == "quotedMessage":
-            message_text = message_data.get("extendedTextMessageData", {}).get("text", "")
-            if not message_text:
-                message_text = message_data.get("textMessageData", {}).get("textMessage", "")
-        else:
+        # Eden's override commands (/release, /allow, ...)
+        if number == EDEN_PHONE and handle_eden_command(message_text):
             return
 
-        if not message_text:
+        # Ignore excluded numbers (Eden, etc.)
+        if number in EXCLUDED_NUMBERS:
+            logger.info(f"Skipping message from excluded number: {number}")
             return
 
         # Track message ID to avoid duplicate processing
@@ -766,18 +1647,24 @@ def message_handler(notification: Notification) -> None:
         logger.info(f"[HANDLER] Message from {sender_name} ({chat_id}) | msg_id={msg_id} | text: {message_text[:80]}")
 
         if msg_id and mark_processed(msg_id):
+            DUPLICATES.inc(source="handler")
             logger.warning(f"[HANDLER] Message {msg_id} ALREADY PROCESSED - SKIPPING")
             return
 
         if not msg_id:
             logger.warning(f"[HANDLER] No msg_id for message from {chat_id} - CANNOT TRACK DUPLICATES")
 
+        if not admit_message(chat_id, msg_id):
+            return
+
         phone = f"+{chat_id.split('@')[0]}" if '@' in chat_id else chat_id
 
         # Add to batch buffer (instead of processing immediately)
-        add_to_buffer(chat_id, sender_name, message_text, phone)
+        INCOMING.inc(source="handler")
+        add_to_buffer(chat_id, sender_name, message_text, phone, source="handler", msg_id=msg_id)
 
     except Exception as e:
+        ERRORS.inc(subsystem="handler")
         logger.error(f"Error handling message: {e}")
         import traceback
         traceback.print_exc()
@@ -792,6 +1679,7 @@ def message_sweep():
     while True:
         try:
             time.sleep(SWEEP_INTERVAL)
+            check_knowledge_changed()
             result = bot.api.journals.lastIncomingMessages(minutes=SWEEP_WINDOW)
             messages = result.data if result.data else []
 
@@ -809,44 +1697,121 @@ def message_sweep():
                     continue
 
                 # Skip already processed
-                if not msg_id or mark_processed(msg_id):
+                if not msg_id:
+                    continue
+                if mark_processed(msg_id):
+                    DUPLICATES.inc(source="sweep")
                     continue
 
-                # Extract text
-                type_message = msg.get("typeMessage", "")
-                message_text = ""
-                if type_message in ("textMessage", "extendedTextMessage"):
-                    message_text = msg.get("textMessage", "")
-                elif type_message == "quotedMessage":
-                    message_text = msg.get("textMessage", "")
-
+                message_text = extract_text(msg)
                 if not message_text:
                     continue
 
+                if not admit_message(chat_id, msg_id):
+                    continue
+
                 sender_name = msg.get("senderName", "Unknown")
                 phone = f"+{chat_id.split('@')[0]}" if '@' in chat_id else chat_id
 
                 logger.info(f"[SWEEP] Caught missed message from {sender_name}: {message_text[:80]}")
+                SWEEP_CATCHES.inc()
+                INCOMING.inc(source="sweep")
 
                 # Feed into batching system (not directly to process_message)
-                add_to_buffer(chat_id, sender_name, message_text, phone)
+                add_to_buffer(chat_id, sender_name, message_text, phone, source="sweep", msg_id=msg_id)
 
         except Exception as e:
+            ERRORS.inc(subsystem="sweep")
             logger.error(f"[SWEEP] Error: {e}")
 
 
+# ============================================================
+# STATUS ENDPOINTS - usage / cost rollups over HTTP
+# ============================================================
+def usage_endpoint(params):
+    """GET /usage?by=day|lead|task|model&days=7&lead=+972...&limit=20"""
+    days = int(params.get("days", 7))
+    since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    by = params.get("by", "day")
+    return {
+        "by": by,
+        "since": since,
+        "totals": usage_ledger.totals(since=since, lead=params.get("lead")),
+        "rows": usage_ledger.rollup(by, since=since, lead=params.get("lead"), limit=params.get("limit")),
+        "tiers": ai_agent.tier_stats,
+        "budget": spend_governor.snapshot(),
+    }
+
+
+# Queue, outbox and metrics endpoints are served without the AI agent too (degraded startup)
+status_port = ai_agent.settings.status_port if ai_agent else int(os.getenv('STATUS_PORT', '8080'))
+status_host = ai_agent.settings.status_host if ai_agent else os.getenv('STATUS_HOST', '127.0.0.1')
+status_server = None
+if status_port:
+    try:
+        status_server = StatusServer(status_port, status_host)
+        if ai_agent:
+            status_server.route("/usage", usage_endpoint)
+            status_server.route("/budget", lambda params: spend_governor.snapshot())
+        status_server.route("/ingestion", lambda params: ingestion_limiter.snapshot(int(params.get("top", 10))))
+        status_server.route("/scheduler", lambda params: reply_scheduler.snapshot())
+        status_server.route("/outbox", lambda params: outbox.snapshot())
+        status_server.route("/warmup", lambda params: warmup_report)
+        status_server.route("/startup", lambda params: startup.report())
+        status_server.route("/metrics", lambda params: (METRICS_CONTENT_TYPE, registry.exposition()))
+        status_server.route("/tracing", lambda params: {
+            "tracer": tracer.stats,
+            "exporter": trace_exporter.stats if trace_exporter else None,
+            "open_traces": len(pending_sends),
+        })
+        status_server.start()
+    except OSError as e:
+        print(f"Status server: [ERROR] {e}")
+        status_server = None
+
+
 # ============================================================
 # START
 # ============================================================
+startup.on_ready("sheets", sheets_ready)
+
 sweep_thread = threading.Thread(target=message_sweep, daemon=True)
 sweep_thread.start()
 
+deferred_thread = threading.Thread(target=deferred_reply_loop, daemon=True)
+deferred_thread.start()
+
+if WARMUP:
+    warmup_thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    warmup_thread.start()
+
 print("\nStarting bot...")
 print(f"  - Message batching: {BATCH_WAIT_SECONDS}s wait window")
-print(f"  - Typing simulation: enabled")
-print(f"  - AI analysis: every {ANALYSIS_EVERY_N} responses")
+print(f"  - Reply workers: {REPLY_WORKERS}, by priority ({' > '.join(REPLY_CLASSES)}), aging {PRIORITY_AGING}s")
+print(f"  - Typing simulation: enabled (outbox send delay)")
+print(f"  - Outbox: {OUTBOX_DB.name}, {OUTBOX_SENDS_PER_SECOND}/s (burst {OUTBOX_BURST}), "
+      f"{RECIPIENT_MIN_INTERVAL}s per recipient, {OUTBOX_MAX_ATTEMPTS} attempts with backoff")
+print(f"  - Knowledge: {'retrieval, top ' + str(KNOWLEDGE_TOP_K) + ' sections' if knowledge_retriever else 'full knowledge base inlined'}")
+print(f"  - AI analysis: every {ANALYSIS_EVERY_N} responses ({'combined with reply' if COMBINED_ANALYSIS else 'separate call'}), "
+      f"{ANALYSIS_DEBOUNCE}s debounce, {ANALYSIS_WORKERS} workers")
 print(f"  - Sweep thread: every {SWEEP_INTERVAL}s")
+print(f"  - Warm-up: {'chats active in the last ' + str(WARMUP_HOURS) + 'h (max ' + str(WARMUP_MAX_CHATS) + '), in background' if WARMUP else 'off'}")
+print(f"  - Rate limits: {INGEST_RATE_PER_MIN}/min per chat (burst {INGEST_BURST}), {INGEST_GLOBAL_PER_MIN}/min total, "
+      f"quarantine after {QUARANTINE_STRIKES} throttled in {QUARANTINE_WINDOW // 60} min")
+print(f"  - Tracing: {('OTLP ' + TRACE_OTLP_ENDPOINT if TRACE_OTLP_ENDPOINT else TRACE_FILE.name) + f', {TRACE_SAMPLE_RATE:.0%} of batches' if TRACING else 'off'}")
 print(f"  - Eden notifications: {EDEN_CHAT_ID}")
+if status_server:
+    if ai_agent:
+        print(f"  - Usage endpoint: http://localhost:{status_server.port}/usage")
+        print(f"  - Budget endpoint: http://localhost:{status_server.port}/budget")
+    print(f"  - Ingestion endpoint: http://localhost:{status_server.port}/ingestion")
+    print(f"  - Scheduler endpoint: http://localhost:{status_server.port}/scheduler")
+    print(f"  - Outbox endpoint: http://localhost:{status_server.port}/outbox")
+    print(f"  - Startup endpoint: http://localhost:{status_server.port}/startup")
+    print(f"  - Metrics endpoint: http://localhost:{status_server.port}/metrics")
+print(f"\nStartup ({time.monotonic() - startup.started:.2f}s to receiving):")
+for line in startup.summary().splitlines():
+    print(f"  - {line}")
 print("\nPress Ctrl+C to stop\n")
 
 bot.run_forever()
@@ -2,5 +2,21 @@
 
 from .base_agent import BaseAgent
 from .claude_agent import ClaudeAgent
+from .history_store import HistoryStore, InMemoryHistoryStore
+from .resilience import CircuitBreaker, CircuitOpenError, DeadlineExceededError, ResilientClient
+from .spend_governor import SpendGovernor
+from .tools import Tool, ToolRunner
 
-__all__ = ["BaseAgent", "ClaudeAgent"]
+__all__ = [
+    "BaseAgent",
+    "ClaudeAgent",
+    "HistoryStore",
+    "InMemoryHistoryStore",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "DeadlineExceededError",
+    "ResilientClient",
+    "SpendGovernor",
+    "Tool",
+    "ToolRunner",
+]
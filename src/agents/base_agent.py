@@ -4,22 +4,32 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 from loguru import logger
 
+from .history_store import HistoryStore, InMemoryHistoryStore
+
+DEFAULT_SESSION = "default"
+
 
 class BaseAgent(ABC):
     """Abstract base class for AI agents"""
 
-    def __init__(self, name: str, description: Optional[str] = None):
+    def __init__(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        history_store: Optional[HistoryStore] = None,
+    ):
         """
         Initialize the base agent
 
         Args:
             name: Agent name
             description: Agent description
+            history_store: Per-session conversation histories (bounded in-memory store if None)
         """
         self.name = name
         self.description = description or f"Agent: {name}"
         self.tools: List[Any] = []
-        self.conversation_history: List[Dict[str, str]] = []
+        self.history_store = history_store or InMemoryHistoryStore()
 
         logger.info(f"Initialized agent: {self.name}")
 
@@ -47,19 +57,32 @@ class BaseAgent(ABC):
         self.tools.append(tool)
         logger.info(f"Added tool to {self.name}: {tool}")
 
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
-        logger.info(f"Cleared conversation history for {self.name}")
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Messages of the default session (copy)"""
+        return self.history_store.get(DEFAULT_SESSION)
 
-    def get_history(self) -> List[Dict[str, str]]:
+    def clear_history(self, session_id: str = DEFAULT_SESSION):
+        """
+        Clear conversation history
+
+        Args:
+            session_id: Session to clear
+        """
+        self.history_store.delete(session_id)
+        logger.info(f"Cleared conversation history for {self.name} ({session_id})")
+
+    def get_history(self, session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
         """
         Get conversation history
 
+        Args:
+            session_id: Session to read
+
         Returns:
             List of conversation messages
         """
-        return self.conversation_history
+        return self.history_store.get(session_id)
 
     def count_tokens(self, text: str) -> int:
         """
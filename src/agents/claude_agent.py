@@ -1,11 +1,33 @@
 """Claude-based AI agent implementation"""
 
-from typing import Any, Dict, List, Optional
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 from anthropic import Anthropic
 from loguru import logger
 
-from .base_agent import BaseAgent
+from .base_agent import DEFAULT_SESSION, BaseAgent
+from .history_store import HistoryStore, InMemoryHistoryStore, trim_history
+from .pricing import PriceTable
+from .resilience import CircuitBreaker, ResilientClient
+from .spend_governor import SpendGovernor
+from .tools import Tool, ToolRunner
 from ..config import get_settings
+from ..utils.metrics import registry
+from ..utils.usage_ledger import UsageLedger
+
+
+# Short acknowledgments that don't need the main model ("תודה", "סבבה", "👍")
+ACK_PATTERN = re.compile(
+    r"^(תודה( רבה)?|תודה אחי|סבבה|אוקי+|אוקיי|בסדר|מעולה|אחלה|יופי|קיבלתי|הבנתי|"
+    r"ok(ay)?|thanks?|thank you|thx|cool|great|[👍🙏🙌💪👌❤️😊🔥]+)[\s!.,👍🙏🙌💪👌❤️😊🔥]*$",
+    re.IGNORECASE,
+)
+
+MODEL_LATENCY = registry.histogram("bot_model_call_seconds", "Claude API call latency (complete response)", labels=("task", "tier"))
+MODEL_TOKENS = registry.counter("bot_model_tokens", "Claude tokens by kind", labels=("tier", "kind"))
+ERRORS = registry.counter("bot_errors", "Errors by subsystem", labels=("subsystem",))
 
 
 class ClaudeAgent(BaseAgent):
@@ -16,6 +38,9 @@ class ClaudeAgent(BaseAgent):
         name: str = "Claude Agent",
         description: Optional[str] = None,
         system_prompt: Optional[str] = None,
+        history_store: Optional[HistoryStore] = None,
+        ledger: Optional[UsageLedger] = None,
+        governor: Optional[SpendGovernor] = None,
     ):
         """
         Initialize Claude agent
@@ -24,14 +49,49 @@ class ClaudeAgent(BaseAgent):
             name: Agent name
             description: Agent description
             system_prompt: System prompt for the agent
+            history_store: Per-session histories (bounded by Settings.max_history_messages /
+                max_sessions if None)
+            ledger: Usage ledger every model call is recorded to (not recorded if None)
+            governor: Daily spend governor - charged for every call, replies move to the
+                fast model once it reaches CHEAP_MODEL
         """
-        super().__init__(name, description)
-
         self.settings = get_settings()
-        self.client = Anthropic(api_key=self.settings.anthropic_api_key)
+        super().__init__(
+            name,
+            description,
+            history_store or InMemoryHistoryStore(
+                max_messages=self.settings.max_history_messages,
+                max_sessions=self.settings.max_sessions,
+            ),
+        )
+
+        self.client = Anthropic(
+            api_key=self.settings.anthropic_api_key,
+            base_url=self.settings.anthropic_base_url,
+        )
+        self.resilient = ResilientClient(
+            self.client,
+            deadline=self.settings.request_deadline,
+            max_retries=self.settings.request_max_retries,
+            hedge=self.settings.hedge_requests,
+            breaker=CircuitBreaker(
+                failure_threshold=self.settings.breaker_failure_threshold,
+                cooldown=self.settings.breaker_cooldown,
+            ),
+        )
         self.system_prompt = system_prompt or self._default_system_prompt()
+        self.tool_runner = ToolRunner(default_timeout=self.settings.tool_timeout)
+        self.prices = PriceTable(self.settings.price_table_file)
+        self.ledger = ledger
+        self.governor = governor
+
+        self.fast_tasks = {t.strip() for t in self.settings.fast_model_tasks.split(",") if t.strip()}
+        self.tier_stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
 
         logger.info(f"Claude agent initialized with model: {self.settings.model_name}")
+        if self.settings.model_routing:
+            logger.info(f"Model routing: {sorted(self.fast_tasks)} -> {self.settings.fast_model_name}")
 
     def _default_system_prompt(self) -> str:
         """Default system prompt"""
@@ -44,6 +104,7 @@ When you're uncertain, you acknowledge it rather than making up information."""
         query: str,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
+        session_id: str = DEFAULT_SESSION,
         **kwargs
     ) -> str:
         """
@@ -53,94 +114,355 @@ When you're uncertain, you acknowledge it rather than making up information."""
             query: User query
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            session_id: Conversation the query belongs to
             **kwargs: Additional parameters
 
         Returns:
             Agent response
         """
         try:
-            # Add query to history
-            self.conversation_history.append({"role": "user", "content": query})
-
             # Log token usage for cost tracking
             input_tokens = self.count_tokens(query + self.system_prompt)
             logger.info(f"Input tokens (estimated): {input_tokens}")
 
-            # Make API call
-            response = self.client.messages.create(
-                model=self.settings.model_name,
+            return self.chat(
+                session_id,
+                query,
                 max_tokens=max_tokens or self.settings.max_tokens,
                 temperature=temperature or self.settings.temperature,
-                system=self.system_prompt,
-                messages=self.conversation_history,
             )
 
-            # Extract response
-            assistant_message = response.content[0].text
+        except Exception as e:
+            logger.error(f"Error in Claude agent: {str(e)}")
+            raise
+
+    def chat(
+        self,
+        session_id: str,
+        message: Optional[str] = None,
+        system: Optional[Union[str, Callable[[List[Dict[str, str]]], str]]] = None,
+        task: str = "reply",
+        record_reply: bool = True,
+        max_history: Optional[int] = None,
+        **params
+    ) -> str:
+        """
+        Reply within one session's conversation
 
-            # Add response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+        Sessions are independent - each lead / chat gets its own history in
+        the history store, so concurrent conversations never mix.
 
-            # Log token usage
-            logger.info(
-                f"API call completed - "
-                f"Input tokens: {response.usage.input_tokens}, "
-                f"Output tokens: {response.usage.output_tokens}"
-            )
+        Args:
+            session_id: Conversation ID (e.g. the lead's phone number)
+            message: New user message (None = reply to the history as it stands)
+            system: System prompt, or Callable(history) building it per turn
+                (the agent's system prompt if None)
+            task: Call type used for routing and logging
+            record_reply: Add the reply to the session history
+            max_history: Send only the most recent messages (whole session if None)
+            **params: Extra messages.create parameters (max_tokens, temperature, ...)
 
-            # Calculate cost (approximate for Sonnet 4.5)
-            input_cost = (response.usage.input_tokens / 1_000_000) * 3.0
-            output_cost = (response.usage.output_tokens / 1_000_000) * 15.0
-            total_cost = input_cost + output_cost
-            logger.info(f"Estimated cost: ${total_cost:.6f}")
+        Returns:
+            Reply text
+        """
+        if message is not None:
+            self.history_store.append(session_id, "user", message)
+        history = self.history_store.get(session_id)
+        if max_history:
+            history, _ = trim_history(history, max_history)
 
-            return assistant_message
+        if callable(system):
+            system = system(history)
+        params.setdefault("max_tokens", self.settings.max_tokens)
+        params.setdefault("temperature", self.settings.temperature)
 
+        response = self.create_message(
+            task=task,
+            lead=session_id,
+            message=history[-1]["content"] if history else None,
+            system=system or self.system_prompt,
+            messages=history,
+            **params
+        )
+        reply = response.content[0].text
+
+        if record_reply:
+            self.history_store.append(session_id, "assistant", reply)
+        return reply
+
+    def is_trivial_ack(self, message: str, history: Optional[List[Dict]] = None) -> bool:
+        """
+        Check if a message is a short acknowledgment that a cheap model can answer
+
+        An ack that answers a question the bot just asked ("מתאים לך ביום שני?" -> "סבבה")
+        is real content and is not treated as trivial.
+
+        Args:
+            message: Latest user message
+            history: Conversation so far (including the message)
+
+        Returns:
+            True if the message is a trivial acknowledgment
+        """
+        text = message.strip()
+        if not text or len(text) > self.settings.fast_reply_max_chars or not ACK_PATTERN.match(text):
+            return False
+
+        previous = [m for m in (history or []) if m["role"] == "assistant"]
+        if not previous:
+            return False  # First contact always gets the main model
+        return "?" not in previous[-1]["content"]
+
+    def select_model(
+        self,
+        task: str,
+        message: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+    ) -> str:
+        """
+        Pick the model for a call
+
+        Args:
+            task: Call type - "reply", "analysis", "compaction", ...
+            message: Latest user message (reply calls)
+            history: Conversation history (reply calls)
+
+        Returns:
+            Model name
+        """
+        if not self.settings.model_routing:
+            return self.settings.model_name
+
+        if task in self.fast_tasks:
+            return self.settings.fast_model_name
+        if task == "reply" and "ack" in self.fast_tasks and message and self.is_trivial_ack(message, history):
+            return self.settings.fast_model_name
+        return self.settings.model_name
+
+    def create_message(
+        self,
+        task: str,
+        lead: Optional[str] = None,
+        message: Optional[str] = None,
+        deadline: Optional[float] = None,
+        **params
+    ):
+        """
+        Routed, measured, resilient messages.create call
+
+        Args:
+            task: Call type used for routing and logging
+            lead: Lead identifier for logging
+            message: Latest user message (lets short acks go to the fast model)
+            deadline: Total seconds for the call incl. retries (Settings.request_deadline if None)
+            **params: messages.create parameters (model is chosen here unless given)
+
+        Returns:
+            Anthropic Message
+
+        Raises:
+            CircuitOpenError: API circuit is open (degraded mode) - nothing was sent
+            DeadlineExceededError: No response within the deadline
+        """
+        if "model" not in params:
+            params["model"] = self.select_model(task, message, params.get("messages"))
+            if (
+                self.governor
+                and task in ("reply", "reply_analysis")
+                and self.governor.level(lead) >= SpendGovernor.CHEAP_MODEL
+            ):
+                params["model"] = self.settings.fast_model_name
+        tier = "fast" if params["model"] == self.settings.fast_model_name else "main"
+
+        def record_discarded(discarded):
+            # The losing side of a hedge is billed too
+            self._record_usage(task, lead, params["model"], tier, discarded.usage, latency=time.time() - start)
+
+        start = time.time()
+        try:
+            response = self.resilient.create(deadline=deadline, on_discarded=record_discarded, **params)
         except Exception as e:
-            logger.error(f"Error in Claude agent: {str(e)}")
+            ERRORS.inc(subsystem="claude")
+            if self.ledger:
+                self.ledger.record(task, params["model"], lead, latency=time.time() - start, status=e.__class__.__name__)
             raise
+        latency = time.time() - start
+        MODEL_LATENCY.observe(latency, task=task, tier=tier)
+
+        cost = self._record_usage(task, lead, params["model"], tier, response.usage, latency)
+        with self._stats_lock:
+            stats = self.tier_stats.setdefault(tier, {"calls": 0, "latency": 0.0, "cost": 0.0})
+            stats["calls"] += 1
+            stats["latency"] += latency
+
+        logger.info(
+            f"[ROUTING] task={task} tier={tier} model={params['model']} lead={lead or '-'} | "
+            f"latency={latency:.2f}s in={response.usage.input_tokens} out={response.usage.output_tokens} "
+            f"cost=${cost:.4f}"
+        )
+        return response
+
+    def _record_usage(
+        self,
+        task: str,
+        lead: Optional[str],
+        model: str,
+        tier: str,
+        usage: Any,
+        latency: float,
+    ) -> float:
+        """Charge one billed response to the governor, token metrics, tier stats and ledger; returns its cost"""
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cost = self.estimate_cost(
+            usage.input_tokens, usage.output_tokens, model, cache_write, cache_read
+        )["total_cost"]
+        if self.governor:
+            self.governor.charge(lead, cost)
+        for kind, tokens in (
+            ("input", usage.input_tokens), ("output", usage.output_tokens),
+            ("cache_write", cache_write), ("cache_read", cache_read),
+        ):
+            MODEL_TOKENS.inc(tokens, tier=tier, kind=kind)
+        with self._stats_lock:
+            stats = self.tier_stats.setdefault(tier, {"calls": 0, "latency": 0.0, "cost": 0.0})
+            stats["cost"] += cost
+        if self.ledger:
+            self.ledger.record(
+                task, model, lead,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                cache_write_tokens=cache_write,
+                cache_read_tokens=cache_read,
+                latency=latency,
+                cost=cost,
+            )
+        return cost
 
-    def run_with_tools(self, query: str, tools: Optional[List[Dict]] = None) -> str:
+    def run_with_tools(
+        self,
+        query: Optional[str] = None,
+        tools: Optional[List[Tool]] = None,
+        session_id: str = DEFAULT_SESSION,
+        system: Optional[Union[str, Callable[[List[Dict[str, str]]], str]]] = None,
+        task: str = "reply",
+        max_steps: Optional[int] = None,
+        record_reply: bool = True,
+        max_history: Optional[int] = None,
+        **params
+    ) -> str:
         """
         Run agent with tool use capabilities
 
+        Every tool_use block of a turn is executed in parallel (per-tool
+        timeouts, cached results) and answered with tool_result blocks
+        until the model replies with text. The last step within the
+        budget is made with tool use disabled; if it still has no text the
+        session is answered by a plain chat() call instead. Only the final
+        text is kept in the session history.
+
         Args:
-            query: User query
-            tools: List of tool definitions
+            query: New user message (None = reply to the session as it stands)
+            tools: Tools for this run (the agent's tools if None)
+            session_id: Conversation ID
+            system: System prompt, or Callable(history) building it
+            task: Call type used for routing and logging
+            max_steps: Max model calls (Settings.tool_max_steps if None)
+            record_reply: Add the final reply to the session history
+            max_history: Send only the most recent messages (whole session if None)
+            **params: Extra messages.create parameters
 
         Returns:
             Agent response
         """
-        # This is a placeholder for tool use implementation
-        # Will be expanded based on specific tool requirements
-        logger.info("Tool use requested - to be implemented")
-        return self.run(query)
+        tools = self.tools if tools is None else tools
+        if not tools:
+            return self.chat(
+                session_id, query, system=system, task=task,
+                record_reply=record_reply, max_history=max_history, **params
+            )
+
+        if query is not None:
+            self.history_store.append(session_id, "user", query)
+        history = self.history_store.get(session_id)
+        if max_history:
+            history, _ = trim_history(history, max_history)
+        if callable(system):
+            system = system(history)
+        params.setdefault("max_tokens", self.settings.max_tokens)
+        params.setdefault("temperature", self.settings.temperature)
+
+        messages: List[Dict[str, Any]] = list(history)
+        definitions = [tool.definition() for tool in tools]
+        max_steps = max_steps or self.settings.tool_max_steps
+
+        for step in range(1, max_steps + 1):
+            last_step = step == max_steps
+            response = self.create_message(
+                task=task,
+                lead=session_id,
+                message=history[-1]["content"] if history and step == 1 else None,
+                system=system or self.system_prompt,
+                messages=messages,
+                tools=definitions,
+                tool_choice={"type": "none"} if last_step else {"type": "auto"},
+                **params
+            )
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            if last_step or not tool_uses:
+                break
 
-    def estimate_cost(self, input_tokens: int, output_tokens: int) -> Dict[str, float]:
+            logger.info(f"[TOOLS] Step {step}: {', '.join(block.name for block in tool_uses)} ({session_id})")
+            messages.append({
+                "role": "assistant",
+                "content": [block.model_dump(exclude_none=True) for block in response.content],
+            })
+            messages.append({
+                "role": "user",
+                "content": self.tool_runner.run(tool_uses, tools, session_id),
+            })
+
+        reply = "\n".join(block.text.strip() for block in response.content if block.type == "text" and block.text.strip())
+        if not reply:
+            logger.warning(f"[TOOLS] No text in the final step, replying without tools ({session_id})")
+            return self.chat(
+                session_id, system=system, task=task,
+                record_reply=record_reply, max_history=max_history, **params
+            )
+        if record_reply:
+            self.history_store.append(session_id, "assistant", reply)
+        return reply
+
+    def estimate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        model: Optional[str] = None,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0,
+    ) -> Dict[str, float]:
         """
         Estimate API call cost
 
         Args:
             input_tokens: Number of input tokens
             output_tokens: Number of output tokens
+            model: Model used (defaults to the main model)
+            cache_write_tokens: Prompt-cache write tokens
+            cache_read_tokens: Prompt-cache read tokens
 
         Returns:
             Cost breakdown
         """
-        # Claude Sonnet 4.5 pricing (as of 2025)
-        input_cost_per_million = 3.0
-        output_cost_per_million = 15.0
-
-        input_cost = (input_tokens / 1_000_000) * input_cost_per_million
-        output_cost = (output_tokens / 1_000_000) * output_cost_per_million
-
+        cost = self.prices.cost(
+            model or self.settings.model_name,
+            input_tokens,
+            output_tokens,
+            cache_write_tokens,
+            cache_read_tokens,
+        )
         return {
-            "input_cost": input_cost,
-            "output_cost": output_cost,
-            "total_cost": input_cost + output_cost,
+            **cost,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
         }
@@ -0,0 +1,200 @@
+"""Per-session conversation history stores for agents"""
+
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+def trim_history(history: List[Dict[str, str]], keep: int) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Split history into (recent window, dropped older messages)
+
+    The recent window always starts with a user message, as the
+    Anthropic API requires.
+
+    Args:
+        history: Conversation messages, oldest first
+        keep: Max messages in the recent window
+
+    Returns:
+        (recent, dropped)
+    """
+    if len(history) <= keep:
+        return history, []
+    cut = len(history) - keep
+    while cut < len(history) and history[cut]["role"] != "user":
+        cut += 1
+    return history[cut:], history[:cut]
+
+
+class HistoryStore(ABC):
+    """Conversation histories keyed by session ID (one per lead / chat)"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """Copy of the session's messages (empty list for unknown sessions)"""
+        pass
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, content: str):
+        """Add one message to the session"""
+        pass
+
+    @abstractmethod
+    def replace(self, session_id: str, messages: List[Dict[str, str]]):
+        """Set the session's messages (e.g. loaded from an external source)"""
+        pass
+
+    @abstractmethod
+    def prepend(self, session_id: str, messages: List[Dict[str, str]]):
+        """Put older messages in front of the session's messages (e.g. context that loaded late)"""
+        pass
+
+    @abstractmethod
+    def seq(self, session_id: str) -> int:
+        """Total number of messages ever added to the session (survives trimming)"""
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget a session"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of sessions held"""
+        pass
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """Bounded in-process history store.
+
+    Each session keeps at most ``max_messages`` messages - past that it is
+    trimmed to ``keep_after_trim`` and the dropped messages are passed to
+    ``on_trim`` (e.g. to fold them into a summary). At most
+    ``max_sessions`` sessions are held; the least recently used one is
+    evicted and reported to ``on_evict``. All operations are O(1) in the
+    number of sessions.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 40,
+        keep_after_trim: Optional[int] = None,
+        max_sessions: int = 1000,
+        on_trim: Optional[Callable[[str, List[Dict[str, str]]], None]] = None,
+        on_evict: Optional[Callable[[str, List[Dict[str, str]]], None]] = None,
+    ):
+        """
+        Initialize the store
+
+        Args:
+            max_messages: Max messages per session
+            keep_after_trim: Messages kept when a session is trimmed (defaults to max_messages)
+            max_sessions: Max sessions held before the least recently used is evicted
+            on_trim: Callable(session_id, dropped_messages), called outside the lock
+            on_evict: Callable(session_id, messages), called outside the lock
+        """
+        self.max_messages = max_messages
+        self.keep_after_trim = keep_after_trim or max_messages
+        self.max_sessions = max_sessions
+        self.on_trim = on_trim
+        self.on_evict = on_evict
+
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()  # {session_id: {"messages": [], "seq": n}}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """Copy of the session's messages (empty list for unknown sessions)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if not session:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(session["messages"])
+
+    def append(self, session_id: str, role: str, content: str):
+        """Add one message, trimming the session if it grew past max_messages"""
+        with self._lock:
+            session, evicted = self._touch(session_id)
+            session["messages"].append({"role": role, "content": content})
+            session["seq"] += 1
+            dropped = []
+            if len(session["messages"]) > self.max_messages:
+                session["messages"], dropped = trim_history(session["messages"], self.keep_after_trim)
+
+        self._notify(session_id, dropped, evicted)
+
+    def replace(self, session_id: str, messages: List[Dict[str, str]]):
+        """Set the session's messages - all of them count as added, overflow is trimmed"""
+        with self._lock:
+            session, evicted = self._touch(session_id)
+            recent, dropped = trim_history(list(messages), self.max_messages)
+            session["messages"] = recent
+            session["seq"] += len(messages)
+
+        self._notify(session_id, dropped, evicted)
+
+    def prepend(self, session_id: str, messages: List[Dict[str, str]]):
+        """Put older messages in front of the session's messages - only they count as added"""
+        if not messages:
+            return
+        with self._lock:
+            session, evicted = self._touch(session_id)
+            recent, dropped = trim_history(list(messages) + session["messages"], self.max_messages)
+            session["messages"] = recent
+            session["seq"] += len(messages)
+
+        self._notify(session_id, dropped, evicted)
+
+    def seq(self, session_id: str) -> int:
+        """Total number of messages ever added to the session"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session["seq"] if session else 0
+
+    def delete(self, session_id: str):
+        """Forget a session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        """Number of sessions held"""
+        with self._lock:
+            return len(self._sessions)
+
+    def _touch(self, session_id: str) -> Tuple[Dict, List[Tuple[str, List[Dict[str, str]]]]]:
+        """Get or create a session and mark it most recently used (caller holds the lock)"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {"messages": [], "seq": 0}
+        self._sessions.move_to_end(session_id)
+
+        evicted = []
+        while len(self._sessions) > self.max_sessions:
+            old_id, old_session = self._sessions.popitem(last=False)
+            evicted.append((old_id, old_session["messages"]))
+        return session, evicted
+
+    def _notify(
+        self,
+        session_id: str,
+        dropped: List[Dict[str, str]],
+        evicted: List[Tuple[str, List[Dict[str, str]]]],
+    ):
+        """Run the trim/evict callbacks (outside the lock)"""
+        if dropped and self.on_trim:
+            try:
+                self.on_trim(session_id, dropped)
+            except Exception as e:
+                logger.error(f"[HISTORY] on_trim failed for {session_id}: {e}")
+
+        for old_id, messages in evicted:
+            logger.info(f"[HISTORY] Evicted least recently used session {old_id}")
+            if self.on_evict:
+                try:
+                    self.on_evict(old_id, messages)
+                except Exception as e:
+                    logger.error(f"[HISTORY] on_evict failed for {old_id}: {e}")
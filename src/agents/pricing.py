@@ -0,0 +1,82 @@
+"""Model price table - USD per million tokens, overridable from a JSON file"""
+
+import json
+from pathlib import Path
+from typing import Dict, Optional, Union
+from loguru import logger
+
+
+# Matched by model name prefix (longest prefix wins)
+DEFAULT_PRICES = {
+    "claude-opus-4": {"input": 15.0, "output": 75.0},
+    "claude-sonnet-4": {"input": 3.0, "output": 15.0},
+    "claude-haiku-4": {"input": 1.0, "output": 5.0},
+    "claude-3-5-haiku": {"input": 0.8, "output": 4.0},
+}
+DEFAULT_MODEL_PRICE = {"input": 3.0, "output": 15.0}
+
+# Prompt caching: writes cost 1.25x input, reads 0.1x input (unless a price sets them)
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+
+class PriceTable:
+    """Per-model token prices.
+
+    The JSON file maps a model name prefix to its prices, e.g.
+    {"claude-sonnet-4": {"input": 3, "output": 15, "cache_write": 3.75, "cache_read": 0.3}}
+    - entries are merged over DEFAULT_PRICES.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """
+        Load the price table
+
+        Args:
+            path: JSON price file (defaults only if None or missing)
+        """
+        self.prices: Dict[str, Dict[str, float]] = {model: dict(price) for model, price in DEFAULT_PRICES.items()}
+        if path and Path(path).exists():
+            with open(path, encoding="utf-8") as f:
+                overrides = json.load(f)
+            for model, price in overrides.items():
+                self.prices[model] = {k: float(v) for k, v in price.items()}
+            logger.info(f"Loaded {len(overrides)} model prices from {path}")
+        elif path:
+            logger.warning(f"Price table {path} not found - using default prices")
+
+    def price(self, model: str) -> Dict[str, float]:
+        """Prices for a model (input, output, cache_write, cache_read)"""
+        matches = [prefix for prefix in self.prices if model.startswith(prefix)]
+        price = dict(self.prices[max(matches, key=len)] if matches else DEFAULT_MODEL_PRICE)
+        price.setdefault("cache_write", price["input"] * CACHE_WRITE_MULTIPLIER)
+        price.setdefault("cache_read", price["input"] * CACHE_READ_MULTIPLIER)
+        return price
+
+    def cost(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0,
+    ) -> Dict[str, float]:
+        """
+        Cost of one call
+
+        Returns:
+            {"input_cost", "output_cost", "cache_cost", "total_cost"} in USD
+        """
+        price = self.price(model)
+        input_cost = input_tokens / 1_000_000 * price["input"]
+        output_cost = output_tokens / 1_000_000 * price["output"]
+        cache_cost = (
+            cache_write_tokens / 1_000_000 * price["cache_write"]
+            + cache_read_tokens / 1_000_000 * price["cache_read"]
+        )
+        return {
+            "input_cost": input_cost,
+            "output_cost": output_cost,
+            "cache_cost": cache_cost,
+            "total_cost": input_cost + output_cost + cache_cost,
+        }
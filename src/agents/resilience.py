@@ -0,0 +1,283 @@
+"""Resilience layer for Anthropic API calls - deadlines, retries, hedging, circuit breaker"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+import anthropic
+from loguru import logger
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and calls are not attempted"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a call (including retries) did not finish within its deadline"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, lets one probe through after a cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown: Seconds to stay open before allowing a probe call
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may be attempted now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """A call succeeded - close the circuit"""
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        """A call failed after all retries - maybe open the circuit"""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        """Change state and log it (caller holds the lock)"""
+        logger.warning(f"[RESILIENCE] Circuit breaker {self.state} -> {state}")
+        self.state = state
+
+
+class ResilientClient:
+    """Wraps ``client.messages.create`` with per-call deadlines, jittered
+    retries on overload/5xx/429/connection errors, optional hedged
+    requests when a call runs past the observed p95 latency, and a
+    circuit breaker shared by all calls.
+    """
+
+    def __init__(
+        self,
+        client: anthropic.Anthropic,
+        deadline: float = 30,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Initialize the resilient client
+
+        Args:
+            client: Anthropic client
+            deadline: Default total seconds per call, retries included
+            max_retries: Retries after the first attempt
+            backoff_base: First backoff in seconds (doubles per retry, full jitter)
+            backoff_max: Backoff cap in seconds
+            hedge: Send a second request when the first runs past p95 latency
+            hedge_min_samples: Latency samples needed before hedging starts
+            breaker: Circuit breaker (a default one is created if None)
+        """
+        self.client = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+
+        self._latencies: deque = deque(maxlen=200)
+        self._latency_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="anthropic") if hedge else None
+
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "rejected": 0}
+
+    def create(
+        self,
+        deadline: Optional[float] = None,
+        on_discarded: Optional[Callable[[Any], None]] = None,
+        **params
+    ) -> Any:
+        """
+        messages.create with deadline, retries, hedging and circuit breaker
+
+        Args:
+            deadline: Total seconds for this call (defaults to the client deadline)
+            on_discarded: Called (from a worker thread) with every response that
+                was billed but not returned - the losing side of a hedge
+            **params: messages.create parameters
+
+        Returns:
+            Anthropic Message
+
+        Raises:
+            CircuitOpenError: The circuit is open - nothing was sent
+            DeadlineExceededError: No response within the deadline
+            anthropic.APIError: Non-retryable error, or retries exhausted
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError("Anthropic API circuit is open")
+
+        self.stats["calls"] += 1
+        answered = False  # True once the API has answered (a response, or a non-retryable 4xx)
+        try:
+            response = self._call(params, deadline or self.deadline, on_discarded)
+            answered = True
+            return response
+        except anthropic.APIStatusError as e:
+            answered = not self._is_retryable(e)  # A 4xx is about our request, not the API's health
+            raise
+        finally:
+            # Every outcome settles the breaker - an unexpected error (TypeError, SDK
+            # validation, executor shutdown) must not leave a half-open probe hanging
+            if answered:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def _call(self, params: dict, deadline: float, on_discarded: Optional[Callable[[Any], None]] = None) -> Any:
+        """Attempts with jittered retries until one succeeds or the deadline runs out"""
+        end = time.monotonic() + deadline
+        attempt = 0
+
+        while True:
+            remaining = end - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"Deadline of {deadline}s exceeded")
+                start = time.monotonic()
+                response = self._attempt(params, remaining, on_discarded)
+                self._record_latency(time.monotonic() - start)
+                return response
+
+            except Exception as e:
+                if not self._is_retryable(e):
+                    raise
+
+                attempt += 1
+                backoff = self._backoff(attempt, e)
+                if attempt > self.max_retries or backoff >= end - time.monotonic():
+                    self.stats["failures"] += 1
+                    logger.error(f"[RESILIENCE] Giving up after {attempt} attempts: {e}")
+                    raise
+
+                self.stats["retries"] += 1
+                logger.warning(f"[RESILIENCE] Attempt {attempt} failed ({e.__class__.__name__}), retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+
+    def p95_latency(self) -> Optional[float]:
+        """Observed p95 latency in seconds (None until enough samples)"""
+        with self._latency_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def _attempt(self, params: dict, remaining: float, on_discarded: Optional[Callable[[Any], None]] = None) -> Any:
+        """One attempt - hedged if enabled and p95 is known.
+
+        Both sides of a hedge are billed; the one not returned is handed to
+        on_discarded when it completes, so its usage can still be recorded.
+        """
+        p95 = self.p95_latency() if self.hedge else None
+        if p95 is None or p95 >= remaining:
+            return self._send(params, remaining)
+
+        deadline = time.monotonic() + remaining
+        primary = self._executor.submit(self._send, params, remaining)
+        done, _ = wait([primary], timeout=p95)
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        logger.info(f"[RESILIENCE] Call exceeded p95 ({p95:.1f}s) - sending hedged request")
+        hedge = self._executor.submit(self._send, params, max(deadline - time.monotonic(), 0.1))
+
+        pending = {primary, hedge}
+        winner = None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        winner = future
+                        if future is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return future.result()
+                    error = future.exception()
+            if error:
+                raise error
+            raise DeadlineExceededError("Hedged requests did not finish within the deadline")
+        finally:
+            if on_discarded:
+                for future in (primary, hedge):
+                    if future is not winner:
+                        future.add_done_callback(
+                            lambda f: on_discarded(f.result()) if f.exception() is None else None
+                        )
+
+    def _send(self, params: dict, timeout: float) -> Any:
+        """Single HTTP request with the SDK's own retries disabled"""
+        return self.client.with_options(timeout=timeout, max_retries=0).messages.create(**params)
+
+    def _record_latency(self, seconds: float):
+        """Keep a latency sample for the p95 estimate"""
+        with self._latency_lock:
+            self._latencies.append(seconds)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Jittered exponential backoff, honoring retry-after when the API sends one"""
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after", ""))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Overloaded (529), 5xx, 429, 408/409 and connection/timeout errors are retried"""
+        if isinstance(error, (anthropic.APIConnectionError, DeadlineExceededError)):
+            return True
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in (408, 409, 429) or error.status_code >= 500
+        return False
@@ -0,0 +1,147 @@
+"""Daily spend governor - staged degradation as the API budget runs out"""
+
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from loguru import logger
+
+
+class SpendGovernor:
+    """Tracks today's API spend (total and per lead) against daily caps.
+
+    The degradation level rises in stages as either the daily budget or
+    the lead's own daily cap is used up:
+
+        0 NORMAL         everything on
+        1 SKIP_ANALYSIS  routine lead analysis and memory compaction are skipped
+        2 SHORT_HISTORY  replies see a shorter history
+        3 CHEAP_MODEL    replies go to the fast model
+        4 EDEN_ONLY      no model calls - leads are handed to Eden
+
+    Spend resets at midnight (local time).
+    """
+
+    NORMAL = 0
+    SKIP_ANALYSIS = 1
+    SHORT_HISTORY = 2
+    CHEAP_MODEL = 3
+    EDEN_ONLY = 4
+
+    LEVEL_NAMES = ["normal", "skip_analysis", "short_history", "cheap_model", "eden_only"]
+
+    # Share of a cap at which each level starts
+    THRESHOLDS = {SKIP_ANALYSIS: 0.5, SHORT_HISTORY: 0.7, CHEAP_MODEL: 0.85, EDEN_ONLY: 1.0}
+
+    def __init__(self, daily_budget: float, lead_daily_budget: float = 0):
+        """
+        Initialize the governor
+
+        Args:
+            daily_budget: USD per day for all calls (0 = no cap)
+            lead_daily_budget: USD per day for one lead (0 = no cap)
+        """
+        self.daily_budget = daily_budget
+        self.lead_daily_budget = lead_daily_budget
+
+        self._day = self._today()
+        self._spent = 0.0
+        self._lead_spent: Dict[str, float] = {}
+        self._lead_levels: Dict[str, int] = {}
+        self._level = self.NORMAL
+        self._lock = threading.Lock()
+
+        self.stats = {"mode_changes": 0, "lead_mode_changes": 0}
+
+    def seed(self, spent: float, lead_spent: Dict[str, float]):
+        """Start from spend already recorded today (e.g. from the usage ledger after a restart)"""
+        with self._lock:
+            self._spent = spent
+            self._lead_spent = dict(lead_spent)
+            self._update_levels(None)
+        logger.info(f"[BUDGET] Today's spend so far: ${spent:.2f} of ${self.daily_budget:.2f} ({self.level_name()})")
+
+    def charge(self, lead: Optional[str], cost: float):
+        """Add the cost of a call"""
+        with self._lock:
+            self._roll_day()
+            self._spent += cost
+            if lead:
+                self._lead_spent[lead] = self._lead_spent.get(lead, 0.0) + cost
+            self._update_levels(lead)
+
+    def level(self, lead: Optional[str] = None) -> int:
+        """Degradation level for a call (the stricter of the global and the lead's level)"""
+        with self._lock:
+            self._roll_day()
+            return max(self._level, self._lead_levels.get(lead, self.NORMAL) if lead else self.NORMAL)
+
+    def level_name(self, lead: Optional[str] = None) -> str:
+        """Name of the current level"""
+        return self.LEVEL_NAMES[self.level(lead)]
+
+    def snapshot(self) -> Dict:
+        """Current budget state for status endpoints"""
+        with self._lock:
+            self._roll_day()
+            return {
+                "day": self._day,
+                "spent": round(self._spent, 4),
+                "daily_budget": self.daily_budget,
+                "lead_daily_budget": self.lead_daily_budget,
+                "level": self.LEVEL_NAMES[self._level],
+                "leads_degraded": sum(1 for level in self._lead_levels.values() if level > self.NORMAL),
+                "leads_capped": sum(1 for level in self._lead_levels.values() if level == self.EDEN_ONLY),
+                **self.stats,
+            }
+
+    def _stage(self, spent: float, cap: float) -> int:
+        """Level for spend against one cap"""
+        if cap <= 0:
+            return self.NORMAL
+        share = spent / cap
+        level = self.NORMAL
+        for stage, threshold in self.THRESHOLDS.items():
+            if share >= threshold:
+                level = stage
+        return level
+
+    def _update_levels(self, lead: Optional[str]):
+        """Recompute levels and log changes (caller holds the lock)"""
+        level = self._stage(self._spent, self.daily_budget)
+        if level != self._level:
+            self.stats["mode_changes"] += 1
+            logger.warning(
+                f"[BUDGET] Mode {self.LEVEL_NAMES[self._level]} -> {self.LEVEL_NAMES[level]} "
+                f"(spent ${self._spent:.2f} of ${self.daily_budget:.2f} today)"
+            )
+            self._level = level
+
+        for phone in ([lead] if lead else list(self._lead_spent)):
+            lead_level = self._stage(self._lead_spent.get(phone, 0.0), self.lead_daily_budget)
+            if lead_level != self._lead_levels.get(phone, self.NORMAL):
+                self.stats["lead_mode_changes"] += 1
+                logger.warning(
+                    f"[BUDGET] Lead {phone}: mode {self.LEVEL_NAMES[self._lead_levels.get(phone, self.NORMAL)]} -> "
+                    f"{self.LEVEL_NAMES[lead_level]} (spent ${self._lead_spent.get(phone, 0.0):.2f} of "
+                    f"${self.lead_daily_budget:.2f} today)"
+                )
+                self._lead_levels[phone] = lead_level
+
+    def _roll_day(self):
+        """Reset spend at midnight (caller holds the lock)"""
+        today = self._today()
+        if today == self._day:
+            return
+        logger.info(f"[BUDGET] New day - resetting spend (${self._spent:.2f} spent on {self._day})")
+        self._day = today
+        self._spent = 0.0
+        self._lead_spent.clear()
+        self._lead_levels.clear()
+        if self._level != self.NORMAL:
+            self.stats["mode_changes"] += 1
+            logger.warning(f"[BUDGET] Mode {self.LEVEL_NAMES[self._level]} -> normal (new day)")
+        self._level = self.NORMAL
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now().strftime("%Y-%m-%d")
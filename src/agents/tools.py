@@ -0,0 +1,177 @@
+"""Tool definitions and parallel tool execution for agent tool-use loops"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+
+class Tool:
+    """A tool the model can call.
+
+    The handler gets the session ID (e.g. the lead's phone) and the tool
+    input from the model, and returns a string or anything JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        handler: Callable[[str, Dict[str, Any]], Any],
+        input_schema: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: float = 0,
+        per_session: bool = True,
+    ):
+        """
+        Initialize the tool
+
+        Args:
+            name: Tool name shown to the model
+            description: When and why the model should use the tool
+            handler: Callable(session_id, tool_input) returning the result
+            input_schema: JSON schema of the input (no input if None)
+            timeout: Seconds before the call is reported as failed (runner default if None)
+            cache_ttl: Seconds a result is reused for the same input (0 = no caching)
+            per_session: Result depends on the session - cache it per session
+        """
+        self.name = name
+        self.description = description
+        self.handler = handler
+        self.input_schema = input_schema or {"type": "object", "properties": {}}
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.per_session = per_session
+
+    def definition(self) -> Dict[str, Any]:
+        """Tool definition for messages.create"""
+        return {"name": self.name, "description": self.description, "input_schema": self.input_schema}
+
+    def __repr__(self) -> str:
+        return f"Tool({self.name})"
+
+
+class ToolRunner:
+    """Runs the tool_use blocks of one model turn in parallel.
+
+    Each call gets its own timeout; failures and timeouts come back as
+    ``is_error`` tool results so the model can carry on without them.
+    Results of tools with a cache_ttl are reused until they expire.
+    """
+
+    def __init__(self, max_workers: int = 8, default_timeout: float = 5, cache_size: int = 512):
+        """
+        Initialize the runner
+
+        Args:
+            max_workers: Threads shared by all tool calls
+            default_timeout: Seconds per tool call when the tool sets none
+            cache_size: Max cached results (least recently used evicted)
+        """
+        self.default_timeout = default_timeout
+        self.cache_size = cache_size
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # {key: (expires_at, content)}
+        self._cache_lock = threading.Lock()
+
+        self.stats = {"calls": 0, "cache_hits": 0, "errors": 0, "timeouts": 0}
+
+    def run(self, tool_uses: List[Any], tools: List[Tool], session_id: str) -> List[Dict[str, Any]]:
+        """
+        Execute tool_use blocks concurrently
+
+        Args:
+            tool_uses: tool_use content blocks from one assistant turn
+            tools: Tools available in this loop
+            session_id: Session the calls belong to
+
+        Returns:
+            tool_result blocks, in the order of tool_uses
+        """
+        by_name = {tool.name: tool for tool in tools}
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tool_uses)
+        futures = {}
+
+        for idx, block in enumerate(tool_uses):
+            self.stats["calls"] += 1
+            tool = by_name.get(block.name)
+            if tool is None:
+                results[idx] = self._result(block.id, f"Unknown tool: {block.name}", error=True)
+                continue
+
+            key = self._cache_key(tool, session_id, block.input)
+            cached = self._cache_get(key) if tool.cache_ttl else None
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                results[idx] = self._result(block.id, cached)
+                continue
+
+            futures[idx] = (tool, key, time.monotonic(), self._executor.submit(self._call, tool, session_id, block.input))
+
+        for idx, (tool, key, started, future) in futures.items():
+            block = tool_uses[idx]
+            timeout = tool.timeout or self.default_timeout
+            try:
+                content, seconds = future.result(timeout=max(timeout - (time.monotonic() - started), 0))
+                if tool.cache_ttl:
+                    self._cache_put(key, content, tool.cache_ttl)
+                results[idx] = self._result(block.id, content)
+                logger.info(f"[TOOLS] {tool.name} ({session_id}) in {seconds:.2f}s")
+
+            except FutureTimeout:
+                self.stats["timeouts"] += 1
+                logger.warning(f"[TOOLS] {tool.name} ({session_id}) timed out after {timeout}s")
+                results[idx] = self._result(block.id, f"{tool.name} timed out - answer without it", error=True)
+
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"[TOOLS] {tool.name} ({session_id}) failed: {e}")
+                results[idx] = self._result(block.id, f"{tool.name} failed - answer without it", error=True)
+
+        return results
+
+    @staticmethod
+    def _call(tool: Tool, session_id: str, tool_input: Any) -> tuple:
+        """Run one handler on the pool. Returns (content string, seconds)."""
+        start = time.monotonic()
+        value = tool.handler(session_id, dict(tool_input or {}))
+        content = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        return content, time.monotonic() - start
+
+    @staticmethod
+    def _result(tool_use_id: str, content: str, error: bool = False) -> Dict[str, Any]:
+        """Build a tool_result block"""
+        block = {"type": "tool_result", "tool_use_id": tool_use_id, "content": content}
+        if error:
+            block["is_error"] = True
+        return block
+
+    @staticmethod
+    def _cache_key(tool: Tool, session_id: str, tool_input: Any) -> str:
+        """Cache key from tool name, input and (for per-session tools) the session"""
+        scope = session_id if tool.per_session else ""
+        return f"{tool.name}|{scope}|{json.dumps(tool_input or {}, sort_keys=True, ensure_ascii=False)}"
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Cached content if present and not expired"""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if not entry:
+                return None
+            if entry[0] < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _cache_put(self, key: str, content: str, ttl: float):
+        """Store a result, evicting the least recently used past cache_size"""
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, content)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
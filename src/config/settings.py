@@ -16,10 +16,32 @@ class Settings(BaseSettings):
 
     # API Configuration
     anthropic_api_key: str = Field(..., env="ANTHROPIC_API_KEY")
+    anthropic_base_url: Optional[str] = Field(default=None, env="ANTHROPIC_BASE_URL")
     model_name: str = Field(default="claude-sonnet-4-5-20250929", env="MODEL_NAME")
     max_tokens: int = Field(default=4096, env="MAX_TOKENS")
     temperature: float = Field(default=0.7, env="TEMPERATURE")
 
+    # Model Routing
+    model_routing: bool = Field(default=True, env="MODEL_ROUTING")
+    fast_model_name: str = Field(default="claude-haiku-4-5-20251001", env="FAST_MODEL_NAME")
+    fast_model_tasks: str = Field(default="analysis,compaction,ack", env="FAST_MODEL_TASKS")
+    fast_reply_max_chars: int = Field(default=25, env="FAST_REPLY_MAX_CHARS")
+
+    # API Resilience
+    request_deadline: float = Field(default=30.0, env="REQUEST_DEADLINE")
+    request_max_retries: int = Field(default=3, env="REQUEST_MAX_RETRIES")
+    hedge_requests: bool = Field(default=False, env="HEDGE_REQUESTS")
+    breaker_failure_threshold: int = Field(default=5, env="BREAKER_FAILURE_THRESHOLD")
+    breaker_cooldown: float = Field(default=60.0, env="BREAKER_COOLDOWN")
+
+    # Conversation Sessions
+    max_history_messages: int = Field(default=40, env="MAX_HISTORY_MESSAGES")
+    max_sessions: int = Field(default=1000, env="MAX_SESSIONS")
+
+    # Tool Use
+    tool_max_steps: int = Field(default=4, env="TOOL_MAX_STEPS")
+    tool_timeout: float = Field(default=5.0, env="TOOL_TIMEOUT")
+
     # RAG Configuration
     chunk_size: int = Field(default=1000, env="CHUNK_SIZE")
     chunk_overlap: int = Field(default=200, env="CHUNK_OVERLAP")
@@ -29,6 +51,16 @@ class Settings(BaseSettings):
     enable_caching: bool = Field(default=True, env="ENABLE_CACHING")
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")
 
+    # Usage Tracking
+    usage_db: str = Field(default="data/usage.db", env="USAGE_DB")
+    price_table_file: Optional[str] = Field(default=None, env="PRICE_TABLE_FILE")
+    status_port: int = Field(default=8080, env="STATUS_PORT")
+    status_host: str = Field(default="127.0.0.1", env="STATUS_HOST")
+
+    # Spend Limits (USD, 0 = no cap)
+    daily_budget_usd: float = Field(default=20.0, env="DAILY_BUDGET_USD")
+    lead_daily_budget_usd: float = Field(default=5.0, env="LEAD_DAILY_BUDGET_USD")
+
     # Logging
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
     log_file: Optional[str] = Field(default="logs/agent.log", env="LOG_FILE")
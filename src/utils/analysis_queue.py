@@ -0,0 +1,143 @@
+"""Background lead-analysis queue with per-lead debouncing and priority"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+from loguru import logger
+
+
+class AnalysisQueue:
+    """Runs lead analysis off the reply threads.
+
+    Every ``submit`` for a lead pushes its due time forward, so a chatty
+    lead gets a single analysis once the conversation settles. Due jobs
+    are served by a fixed pool of worker threads; priority jobs (e.g. the
+    lead is scheduling a call) use a shorter debounce and are served
+    before normal ones. A lead is never analyzed by two workers at once.
+    """
+
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+
+    def __init__(
+        self,
+        handler: Callable[[str, Dict], Any],
+        workers: int = 2,
+        debounce_seconds: float = 45,
+        priority_debounce_seconds: float = 5,
+    ):
+        """
+        Initialize the analysis queue
+
+        Args:
+            handler: Callable(phone, payload) that runs the analysis
+            workers: Number of worker threads
+            debounce_seconds: Quiet period before a normal job runs
+            priority_debounce_seconds: Quiet period before a priority job runs
+        """
+        self.handler = handler
+        self.debounce_seconds = debounce_seconds
+        self.priority_debounce_seconds = priority_debounce_seconds
+
+        self._pending: Dict[str, Dict] = {}  # {phone: {"due": ts, "priority": int, "payload": {}}}
+        self._ready: List[Tuple[int, float, int, str]] = []  # heap of (priority, due, seq, phone)
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        self.stats = {"submitted": 0, "coalesced": 0, "processed": 0, "failed": 0}
+
+        threading.Thread(target=self._schedule_loop, daemon=True).start()
+        for i in range(workers):
+            threading.Thread(target=self._worker_loop, name=f"analysis-{i}", daemon=True).start()
+
+    def submit(self, phone: str, payload: Dict, priority: bool = False):
+        """Schedule (or re-schedule) analysis for a lead
+
+        Args:
+            phone: Lead phone number
+            payload: Handler arguments - the latest payload wins
+            priority: Lead is in a time-sensitive state (e.g. scheduling a call)
+        """
+        with self._cond:
+            existing = self._pending.get(phone)
+            level = self.PRIORITY_HIGH if priority else self.PRIORITY_NORMAL
+            if existing:
+                level = min(level, existing["priority"])
+                self.stats["coalesced"] += 1
+
+            delay = self.priority_debounce_seconds if level == self.PRIORITY_HIGH else self.debounce_seconds
+            self._pending[phone] = {
+                "due": time.monotonic() + delay,
+                "priority": level,
+                "payload": payload,
+            }
+            self.stats["submitted"] += 1
+            self._cond.notify_all()
+
+        logger.debug(f"[ANALYSIS-Q] Scheduled {phone} in {delay}s (priority={level == self.PRIORITY_HIGH})")
+
+    def depth(self) -> int:
+        """Number of leads waiting for analysis (debouncing or ready)"""
+        with self._cond:
+            return len(self._pending)
+
+    def _schedule_loop(self):
+        """Move leads whose debounce expired onto the ready heap"""
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [
+                    phone for phone, job in self._pending.items()
+                    if job["due"] <= now and not job.get("queued") and phone not in self._running
+                ]
+                for phone in due:
+                    job = self._pending[phone]
+                    heapq.heappush(self._ready, (job["priority"], job["due"], next(self._seq), phone))
+                    self._pending[phone] = dict(job, queued=True)
+                if due:
+                    self._cond.notify_all()
+
+                waiting = [
+                    job["due"] for phone, job in self._pending.items()
+                    if not job.get("queued") and phone not in self._running
+                ]
+                timeout = max(min(waiting) - now, 0.05) if waiting else None
+                self._cond.wait(timeout)
+
+    def _worker_loop(self):
+        """Take the most urgent ready lead and run the handler"""
+        while True:
+            with self._cond:
+                while True:
+                    phone = self._pop_ready()
+                    if phone:
+                        break
+                    self._cond.wait()
+
+                job = self._pending.pop(phone)
+                self._running.add(phone)
+
+            outcome = "processed"
+            try:
+                self.handler(phone, job["payload"])
+            except Exception as e:
+                outcome = "failed"
+                logger.error(f"[ANALYSIS-Q] Handler error for {phone}: {e}")
+            finally:
+                with self._cond:
+                    self.stats[outcome] += 1
+                    self._running.discard(phone)
+                    self._cond.notify_all()
+
+    def _pop_ready(self):
+        """Pop the next runnable lead from the ready heap (caller holds the lock)"""
+        while self._ready:
+            _, due, _, phone = heapq.heappop(self._ready)
+            job = self._pending.get(phone)
+            if not job or not job.get("queued") or job["due"] != due:
+                continue  # Stale entry - the lead was re-submitted and is debouncing again
+            return phone
+        return None
@@ -0,0 +1,214 @@
+"""Rolling per-lead conversation memory - folds old turns into a running summary"""
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+
+
+# Structured facts we keep about every lead (key -> Hebrew label for the prompt)
+MEMORY_FACTS = {
+    "age": "גיל",
+    "city": "עיר",
+    "experience": "ניסיון",
+    "objections": "התנגדויות",
+}
+
+COMPACTION_PROMPT = """You are maintaining the long-term memory of a WhatsApp sales conversation for Skiba Arts (Muay Thai vacations in Thailand).
+You get the CURRENT MEMORY (may be empty) and OLDER TURNS that are about to leave the bot's context window.
+Fold the older turns into the memory. Keep everything the bot must not forget or re-ask. Return ONLY valid JSON, nothing else.
+
+Required JSON format:
+{
+    "summary": "Hebrew running summary (max 5 sentences). How the conversation opened, what was already explained, what the lead answered and asked.",
+    "facts": {
+        "age": "number or range, null if unknown",
+        "city": "City/area in Israel in Hebrew, null if unknown",
+        "experience": "Hebrew short description of martial arts experience, null if unknown",
+        "objections": "Hebrew. Objections raised so far, null if none"
+    }
+}
+
+Never drop a fact from the current memory unless the older turns contradict it.
+IMPORTANT: Return ONLY the JSON object. No markdown, no explanation."""
+
+
+class ConversationMemory:
+    """Per-lead running summary + structured facts, compacted off the reply path.
+
+    Turns that fall out of the recent history window are handed to
+    ``compact_async``. A single background worker folds them into the
+    lead's memory using ``summarizer``, so replies never wait on it and
+    compactions for the same lead are applied in order. Until a batch is
+    folded in, its raw turns stay visible through ``render`` - at most
+    ``max_pending`` of them, so a failing summarizer can't grow the prompt
+    without bound. After a failure the lead's next compaction waits out an
+    exponential back-off. Memories outlive the lead's history in memory -
+    only the ``max_leads`` least recently used leads are forgotten.
+    """
+
+    def __init__(
+        self,
+        summarizer: Callable[[str, Dict, List[Dict]], Optional[Dict]],
+        max_pending: int = 20,
+        retry_delay: float = 60,
+        max_retry_delay: float = 900,
+        max_leads: int = 5000,
+    ):
+        """
+        Initialize conversation memory
+
+        Args:
+            summarizer: Callable(phone, current_memory, dropped_turns) -> new memory dict
+                        ({"summary": str, "facts": {...}}) or None on failure
+            max_pending: Raw turns kept per lead while waiting to be folded in (oldest dropped)
+            retry_delay: Seconds before retrying a lead after a failed compaction (doubles per failure)
+            max_retry_delay: Back-off cap in seconds
+            max_leads: Leads remembered (least recently used forgotten)
+        """
+        self.summarizer = summarizer
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_leads = max_leads
+        self._recent: "OrderedDict[str, None]" = OrderedDict()  # Leads by last use, oldest first
+        self._memories: Dict[str, Dict] = {}   # {phone: {"summary": str, "facts": {}}}
+        self._pending: Dict[str, List[Dict]] = {}  # {phone: [turns waiting to be folded in]}
+        self._failures: Dict[str, Dict] = {}  # {phone: {"count": n, "retry_at": monotonic}}
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[str]" = queue.Queue()
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def compact_async(self, phone: str, dropped: List[Dict]):
+        """Queue turns that left the history window for background compaction"""
+        if not dropped:
+            return
+        with self._lock:
+            self._touch(phone)
+            pending = self._pending.setdefault(phone, [])
+            pending.extend(dropped)
+            overflow = len(pending) - self.max_pending
+            if overflow > 0:
+                del pending[:overflow]
+        if overflow > 0:
+            logger.warning(f"[MEMORY] {phone}: {overflow} oldest uncompacted turns dropped (limit {self.max_pending})")
+        self._jobs.put(phone)
+        logger.info(f"[MEMORY] Queued {len(dropped)} old turns for compaction ({phone})")
+
+    def get(self, phone: str) -> Dict:
+        """Get a copy of the lead's memory"""
+        with self._lock:
+            if phone in self._recent:
+                self._recent.move_to_end(phone)
+            memory = self._memories.get(phone, {})
+            return {
+                "summary": memory.get("summary", ""),
+                "facts": dict(memory.get("facts", {})),
+            }
+
+    def render(self, phone: str) -> str:
+        """Render the lead's memory as a Hebrew context block ('' if nothing stored)"""
+        with self._lock:
+            if phone in self._recent:
+                self._recent.move_to_end(phone)
+            memory = self._memories.get(phone, {})
+            pending = list(self._pending.get(phone, []))
+
+        parts = []
+        summary = memory.get("summary", "")
+        if summary:
+            parts.append(f"סיכום: {summary}")
+
+        facts = memory.get("facts", {})
+        for key, label in MEMORY_FACTS.items():
+            value = facts.get(key)
+            if value:
+                parts.append(f"{label}: {value}")
+
+        if pending:
+            parts.append("הודעות מוקדמות שעוד לא סוכמו:")
+            for msg in pending:
+                role = "ליד" if msg["role"] == "user" else "בוט"
+                parts.append(f"{role}: {msg['content']}")
+
+        return "\n".join(parts)
+
+    def clear(self, phone: str):
+        """Forget everything stored for a lead"""
+        with self._lock:
+            self._forget(phone)
+
+    def _touch(self, phone: str):
+        """Mark a lead as just used, forgetting the least recently used beyond max_leads (lock held)"""
+        self._recent[phone] = None
+        self._recent.move_to_end(phone)
+        while len(self._recent) > self.max_leads:
+            oldest, _ = self._recent.popitem(last=False)
+            self._forget(oldest)
+
+    def _forget(self, phone: str):
+        """Drop everything stored for a lead (lock held)"""
+        self._recent.pop(phone, None)
+        self._memories.pop(phone, None)
+        self._pending.pop(phone, None)
+        self._failures.pop(phone, None)
+
+    def _run(self):
+        """Worker loop - compacts one lead at a time"""
+        while True:
+            phone = self._jobs.get()
+            try:
+                self._compact(phone)
+            except Exception as e:
+                logger.error(f"[MEMORY] Compaction error for {phone}: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def _compact(self, phone: str):
+        """Fold all pending turns of a lead into its memory"""
+        with self._lock:
+            dropped = list(self._pending.get(phone, []))
+            if not dropped:
+                return  # Already folded in by an earlier job
+            failure = self._failures.get(phone)
+            if failure and time.monotonic() < failure["retry_at"]:
+                return  # Backing off - the next trim after retry_at tries again
+            current = self._memories.get(phone, {"summary": "", "facts": {}})
+
+        updated = self.summarizer(phone, current, dropped)
+        if not updated:
+            with self._lock:
+                if phone not in self._recent:
+                    return  # Forgotten while the summarizer ran
+                count = self._failures.get(phone, {}).get("count", 0) + 1
+                delay = min(self.retry_delay * 2 ** (count - 1), self.max_retry_delay)
+                self._failures[phone] = {"count": count, "retry_at": time.monotonic() + delay}
+            logger.warning(
+                f"[MEMORY] Compaction failed for {phone} - keeping {len(dropped)} raw turns, retrying in {delay:.0f}s"
+            )
+            return
+
+        facts = dict(current.get("facts", {}))
+        for key, value in (updated.get("facts") or {}).items():
+            if key in MEMORY_FACTS and value:
+                facts[key] = value
+
+        with self._lock:
+            if phone not in self._recent:
+                return  # Forgotten while the summarizer ran
+            self._memories[phone] = {
+                "summary": updated.get("summary") or current.get("summary", ""),
+                "facts": facts,
+            }
+            # Keep turns that arrived while the summarizer was running
+            folded = {id(turn) for turn in dropped}
+            self._pending[phone] = [turn for turn in self._pending.get(phone, []) if id(turn) not in folded]
+            if not self._pending[phone]:
+                del self._pending[phone]
+            self._failures.pop(phone, None)
+
+        logger.info(f"[MEMORY] Compacted {len(dropped)} turns for {phone}")
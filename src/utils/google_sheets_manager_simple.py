@@ -7,12 +7,13 @@ from loguru import logger
 import pytz
 import os
 import pickle
+import hashlib
+import time
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from .metrics import registry
+
+# The Google client libraries are imported where they are used: they take
+# seconds to import, and the bot starts receiving before Sheets is ready.
 
 
 # Scopes required for Google Sheets
@@ -21,6 +22,12 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive.file'
 ]
 
+# Developer metadata key holding the Leads sheet's schema version
+SCHEMA_METADATA_KEY = "lead_sheet_schema_version"
+
+SHEETS_LATENCY = registry.histogram("bot_sheets_request_seconds", "Google Sheets API call latency", labels=("op",))
+ERRORS = registry.counter("bot_errors", "Errors by subsystem", labels=("subsystem",))
+
 
 class GoogleSheetsManager:
     """Manages lead data in Google Sheets"""
@@ -48,6 +55,9 @@ class GoogleSheetsManager:
     DEST_CHIANG_MAI = "צ'אנג מאי"
     DEST_OTHER = "אחר"
 
+    # Bump when the header formatting changes - header text changes are picked up automatically
+    SCHEMA_VERSION = 1
+
     def __init__(self, spreadsheet_id: str):
         """
         Initialize Google Sheets manager
@@ -109,6 +119,8 @@ class GoogleSheetsManager:
 
         # Set up Google Sheets API
         try:
+            from googleapiclient.discovery import build
+
             credentials = self._get_credentials()
             self.service = build('sheets', 'v4', credentials=credentials)
             self.sheets = self.service.spreadsheets()
@@ -124,6 +136,9 @@ class GoogleSheetsManager:
 
     def _get_credentials(self):
         """Get or refresh OAuth credentials"""
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         creds = None
         token_file = 'token.pickle'
         credentials_file = 'credentials.json'
@@ -174,159 +189,178 @@ class GoogleSheetsManager:
         return creds
 
     def _initialize_sheet(self):
-        """Initialize sheet with headers, formatting, and sorting"""
-        try:
-            # Try to read first row
-            result = self.sheets.values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=f'{self.sheet_name}!A1:{self._last_col}1'
-            ).execute()
-
-            values = result.get('values', [])
-            existing_headers = values[0] if values else []
+        """Bring the sheet to the current schema.
 
-            # Always sync headers to match current column definition
-            needs_header_update = (existing_headers != self.hebrew_headers)
-
-            if not values or needs_header_update:
-                if needs_header_update and existing_headers:
-                    logger.warning(f"[SHEETS] Headers mismatch! Updating headers to match current column definition.")
-                    logger.warning(f"[SHEETS] Old: {existing_headers}")
-                    logger.warning(f"[SHEETS] New: {self.hebrew_headers}")
-
-                # Write headers using self.hebrew_headers
-                self.sheets.values().update(
-                    spreadsheetId=self.spreadsheet_id,
-                    range=f'{self.sheet_name}!A1:{self._last_col}1',
-                    valueInputOption='RAW',
-                    body={'values': [self.hebrew_headers]}
-                ).execute()
-                logger.info(f"[SHEETS] Headers written: {self.hebrew_headers}")
-
-                # Get sheet ID for formatting
-                sheet_metadata = self.service.spreadsheets().get(
-                    spreadsheetId=self.spreadsheet_id
-                ).execute()
-
-                sheet_id = None
-                for sheet in sheet_metadata.get('sheets', []):
-                    if sheet['properties']['title'] == self.sheet_name:
-                        sheet_id = sheet['properties']['sheetId']
-                        break
-
-                if sheet_id is not None:
-                    # Apply formatting and features
-                    requests = [
-                        # Freeze first row
-                        {
-                            'updateSheetProperties': {
-                                'properties': {
-                                    'sheetId': sheet_id,
-                                    'gridProperties': {
-                                        'frozenRowCount': 1
-                                    }
-                                },
-                                'fields': 'gridProperties.frozenRowCount'
-                            }
-                        },
-                        # Format header row (bold, background color, centered)
-                        {
-                            'repeatCell': {
-                                'range': {
-                                    'sheetId': sheet_id,
-                                    'startRowIndex': 0,
-                                    'endRowIndex': 1
-                                },
-                                'cell': {
-                                    'userEnteredFormat': {
-                                        'backgroundColor': {'red': 0.2, 'green': 0.5, 'blue': 0.8},
-                                        'textFormat': {'bold': True, 'foregroundColor': {'red': 1, 'green': 1, 'blue': 1}},
-                                        'horizontalAlignment': 'CENTER'
-                                    }
-                                },
-                                'fields': 'userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)'
-                            }
-                        },
-                        # Add filter to header row
-                        {
-                            'setBasicFilter': {
-                                'filter': {
-                                    'range': {
-                                        'sheetId': sheet_id,
-                                        'startRowIndex': 0,
-                                        'startColumnIndex': 0
-                                    }
-                                }
-                            }
-                        },
-                        # Auto-resize columns
-                        {
-                            'autoResizeDimensions': {
-                                'dimensions': {
-                                    'sheetId': sheet_id,
-                                    'dimension': 'COLUMNS',
-                                    'startIndex': 0,
-                                    'endIndex': 20
-                                }
-                            }
-                        }
-                    ]
+        The schema version is kept in the Leads sheet's developer metadata.
+        When it matches, startup costs the sheet lookup and one metadata
+        search; otherwise the sheet is created if missing, headers are
+        written and formatting is applied, and the new version is stored.
+        """
+        from googleapiclient.errors import HttpError
 
-                    self.service.spreadsheets().batchUpdate(
-                        spreadsheetId=self.spreadsheet_id,
-                        body={'requests': requests}
-                    ).execute()
+        version = self._schema_version()
+        try:
+            sheet_id = self._sheet_id()
+            stored = self._stored_schema_version(sheet_id) if sheet_id is not None else None
+            if stored and stored["value"] == version:
+                logger.info(f"[SHEETS] Schema {version} up to date")
+                return
 
-                logger.info("Initialized Google Sheet with headers and formatting")
+            logger.info(f"[SHEETS] Schema {stored['value'] if stored else 'unversioned'} -> {version}, migrating")
+            self._migrate_sheet(version, stored, sheet_id)
 
         except HttpError as e:
             if e.resp.status == 404:
                 logger.error("Spreadsheet not found. Check the ID and sharing permissions.")
-                raise
-            elif e.resp.status == 400 and "Unable to parse range" in str(e):
-                # Sheet doesn't exist, create it
-                logger.info(f"Sheet '{self.sheet_name}' not found. Creating it...")
-                try:
-                    request_body = {
-                        'requests': [{
-                            'addSheet': {
-                                'properties': {
-                                    'title': self.sheet_name
-                                }
-                            }
-                        }]
-                    }
-                    self.service.spreadsheets().batchUpdate(
-                        spreadsheetId=self.spreadsheet_id,
-                        body=request_body
-                    ).execute()
-
-                    logger.info(f"Created sheet '{self.sheet_name}'")
-
-                    # Now add headers
-                    self.sheets.values().update(
-                        spreadsheetId=self.spreadsheet_id,
-                        range=f'{self.sheet_name}!A1:{self._last_col}1',
-                        valueInputOption='RAW',
-                        body={'values': [self.columns]}
-                    ).execute()
-
-                    logger.info("Added headers to new sheet")
-
-                except Exception as create_error:
-                    logger.error(f"Failed to create sheet: {str(create_error)}")
-                    raise
             else:
                 logger.error(f"Error initializing sheet: {str(e)}")
-                raise
+            raise
+
+    def _schema_version(self) -> str:
+        """Current schema version: SCHEMA_VERSION plus a fingerprint of the headers"""
+        fingerprint = hashlib.sha1("|".join(self.hebrew_headers).encode("utf-8")).hexdigest()[:8]
+        return f"{self.SCHEMA_VERSION}-{fingerprint}"
+
+    def _sheet_id(self) -> Optional[int]:
+        """sheetId of the Leads sheet (None if the spreadsheet has no such sheet)"""
+        sheet_metadata = self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            fields='sheets.properties(sheetId,title)'
+        ).execute()
+
+        for sheet in sheet_metadata.get('sheets', []):
+            if sheet['properties']['title'] == self.sheet_name:
+                return sheet['properties']['sheetId']
+        return None
+
+    def _stored_schema_version(self, sheet_id: int) -> Optional[Dict]:
+        """Schema version stored on the Leads sheet: {"id", "value"}, or None if it has none"""
+        result = self.service.spreadsheets().developerMetadata().search(
+            spreadsheetId=self.spreadsheet_id,
+            body={'dataFilters': [{'developerMetadataLookup': {
+                'metadataKey': SCHEMA_METADATA_KEY,
+                'metadataLocation': {'sheetId': sheet_id},
+            }}]}
+        ).execute()
+
+        for match in result.get('matchedDeveloperMetadata', []):
+            metadata = match.get('developerMetadata', {})
+            if metadata.get('location', {}).get('sheetId') == sheet_id:
+                return {"id": metadata['metadataId'], "value": metadata.get('metadataValue', '')}
+        return None
+
+    def _migrate_sheet(self, version: str, stored: Optional[Dict], sheet_id: Optional[int]):
+        """Create the sheet if missing, write headers and formatting, store the schema version"""
+        if sheet_id is None:
+            logger.info(f"Sheet '{self.sheet_name}' not found. Creating it...")
+            reply = self.service.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={'requests': [{'addSheet': {'properties': {'title': self.sheet_name}}}]}
+            ).execute()
+            sheet_id = reply['replies'][0]['addSheet']['properties']['sheetId']
+            logger.info(f"Created sheet '{self.sheet_name}'")
+
+        self.sheets.values().update(
+            spreadsheetId=self.spreadsheet_id,
+            range=f'{self.sheet_name}!A1:{self._last_col}1',
+            valueInputOption='RAW',
+            body={'values': [self.hebrew_headers]}
+        ).execute()
+        logger.info(f"[SHEETS] Headers written: {self.hebrew_headers}")
+
+        requests = [
+            # Freeze first row
+            {
+                'updateSheetProperties': {
+                    'properties': {
+                        'sheetId': sheet_id,
+                        'gridProperties': {
+                            'frozenRowCount': 1
+                        }
+                    },
+                    'fields': 'gridProperties.frozenRowCount'
+                }
+            },
+            # Format header row (bold, background color, centered)
+            {
+                'repeatCell': {
+                    'range': {
+                        'sheetId': sheet_id,
+                        'startRowIndex': 0,
+                        'endRowIndex': 1
+                    },
+                    'cell': {
+                        'userEnteredFormat': {
+                            'backgroundColor': {'red': 0.2, 'green': 0.5, 'blue': 0.8},
+                            'textFormat': {'bold': True, 'foregroundColor': {'red': 1, 'green': 1, 'blue': 1}},
+                            'horizontalAlignment': 'CENTER'
+                        }
+                    },
+                    'fields': 'userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)'
+                }
+            },
+            # Add filter to header row
+            {
+                'setBasicFilter': {
+                    'filter': {
+                        'range': {
+                            'sheetId': sheet_id,
+                            'startRowIndex': 0,
+                            'startColumnIndex': 0
+                        }
+                    }
+                }
+            },
+            # Auto-resize columns
+            {
+                'autoResizeDimensions': {
+                    'dimensions': {
+                        'sheetId': sheet_id,
+                        'dimension': 'COLUMNS',
+                        'startIndex': 0,
+                        'endIndex': len(self.columns)
+                    }
+                }
+            },
+        ]
+
+        # Record the schema version on the sheet (in the same batch as the formatting)
+        if stored:
+            requests.append({
+                'updateDeveloperMetadata': {
+                    'dataFilters': [{'developerMetadataLookup': {'metadataId': stored["id"]}}],
+                    'developerMetadata': {'metadataValue': version},
+                    'fields': 'metadataValue'
+                }
+            })
+        else:
+            requests.append({
+                'createDeveloperMetadata': {
+                    'developerMetadata': {
+                        'metadataKey': SCHEMA_METADATA_KEY,
+                        'metadataValue': version,
+                        'location': {'sheetId': sheet_id},
+                        'visibility': 'DOCUMENT'
+                    }
+                }
+            })
+
+        self.service.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'requests': requests}
+        ).execute()
+
+        logger.info(f"Initialized Google Sheet with headers and formatting (schema {version})")
 
     def _get_all_rows(self) -> List[List]:
         """Get all rows from sheet"""
+        from googleapiclient.errors import HttpError
+
         try:
-            result = self.sheets.values().get(
+            result = self._execute("read", self.sheets.values().get(
                 spreadsheetId=self.spreadsheet_id,
                 range=f'{self.sheet_name}!A2:{self._last_col}'  # Skip header row
-            ).execute()
+            ))
 
             rows = result.get('values', [])
             logger.debug(f"[SHEETS] Read {len(rows)} rows from sheet")
@@ -336,6 +370,17 @@ class GoogleSheetsManager:
             logger.error(f"Error reading sheet: {str(e)}")
             return []
 
+    def _execute(self, op: str, request):
+        """Execute an API request, recording its latency and failure"""
+        start = time.monotonic()
+        try:
+            return request.execute()
+        except Exception:
+            ERRORS.inc(subsystem="sheets")
+            raise
+        finally:
+            SHEETS_LATENCY.observe(time.monotonic() - start, op=op)
+
     def _row_to_dict(self, row: List) -> Dict:
         """Convert row list to dictionary"""
         # Pad row with empty strings if needed
@@ -363,13 +408,13 @@ class GoogleSheetsManager:
 
             new_row = self._dict_to_row(lead_data)
 
-            self.sheets.values().append(
+            self._execute("append", self.sheets.values().append(
                 spreadsheetId=self.spreadsheet_id,
                 range=f'{self.sheet_name}!A:{self._last_col}',
                 valueInputOption='RAW',
                 insertDataOption='INSERT_ROWS',
                 body={'values': [new_row]}
-            ).execute()
+            ))
 
             logger.info(f"Added new lead: {lead_data.get('name', 'Unknown')}")
             return True
@@ -406,12 +451,12 @@ class GoogleSheetsManager:
 
             updated_row = self._dict_to_row(current_data)
 
-            self.sheets.values().update(
+            self._execute("update", self.sheets.values().update(
                 spreadsheetId=self.spreadsheet_id,
                 range=f'{self.sheet_name}!A{row_num}:{self._last_col}{row_num}',
                 valueInputOption='RAW',
                 body={'values': [updated_row]}
-            ).execute()
+            ))
 
             saved_fields = {k: v for k, v in updates.items() if k in self.columns}
             logger.info(f"[SHEETS] Updated row {row_num} for {phone}: {list(saved_fields.keys())}")
@@ -421,6 +466,52 @@ class GoogleSheetsManager:
             logger.error(f"Error updating lead: {str(e)}")
             return False
 
+    def batch_update_leads(self, updates: Dict[str, Dict]) -> int:
+        """Update many leads in one batchUpdate call
+
+        Args:
+            updates: {phone: {column: value}}
+
+        Returns:
+            Number of rows written
+        """
+        try:
+            rows = self._get_all_rows()
+            phone_col_idx = self.columns.index('phone')
+
+            data = []
+            for idx, row in enumerate(rows):
+                if len(row) <= phone_col_idx or row[phone_col_idx] not in updates:
+                    continue
+
+                row_num = idx + 2
+                current_data = self._row_to_dict(row)
+                for key, value in updates[row[phone_col_idx]].items():
+                    if key in self.columns:
+                        current_data[key] = value
+
+                data.append({
+                    'range': f'{self.sheet_name}!A{row_num}:{self._last_col}{row_num}',
+                    'values': [self._dict_to_row(current_data)],
+                })
+
+            missing = len(updates) - len(data)
+            if missing > 0:
+                logger.warning(f"[SHEETS] {missing} leads not found for batch update")
+
+            if data:
+                self._execute("batch_update", self.sheets.values().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': data}
+                ))
+
+            logger.info(f"[SHEETS] Batch updated {len(data)} rows")
+            return len(data)
+
+        except Exception as e:
+            logger.error(f"Error batch updating leads: {str(e)}")
+            return 0
+
     def get_lead(self, phone: str) -> Optional[Dict]:
         """Get lead by phone number"""
         try:
@@ -0,0 +1,270 @@
+"""Conversation history loading - paged Green API chat history merged with the stored lead profile"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+# Green API message types that carry text the bot answers
+TEXT_MESSAGE_TYPES = ("textMessage", "extendedTextMessage", "quotedMessage")
+
+# Placeholders for media messages, so they still count as turns (caption appended when there is one)
+MEDIA_PLACEHOLDERS = {
+    "imageMessage": "[image]",
+    "videoMessage": "[video]",
+    "documentMessage": "[document]",
+    "audioMessage": "[voice message]",
+    "locationMessage": "[location]",
+    "contactMessage": "[contact]",
+    "contactsArrayMessage": "[contact]",
+    "stickerMessage": "[sticker]",
+    "pollMessage": "[poll]",
+}
+
+# First line of the stored-profile context put in front of a loaded history
+PROFILE_CONTEXT_HEADER = "[המשך שיחה קודמת - נתונים מגוגל שיטס]"
+
+
+def extract_text(message: Dict) -> str:
+    """Text of a Green API message in any of its shapes, "" if it has none.
+
+    Handles webhook ``messageData`` (textMessageData / extendedTextMessageData),
+    journal records (lastIncomingMessages) and getChatHistory records
+    (textMessage at the top level). Non-text types (images, stickers, ...)
+    have no text.
+    """
+    type_message = message.get("typeMessage")
+    if type_message and type_message not in TEXT_MESSAGE_TYPES:
+        return ""
+
+    text = message.get("textMessage", "")
+    if not text:
+        ext_data = message.get("extendedTextMessageData", {})
+        if isinstance(ext_data, dict):
+            text = ext_data.get("text", "")
+    if not text:
+        text_data = message.get("textMessageData", {})
+        if isinstance(text_data, dict):
+            text = text_data.get("textMessage", "")
+    return text if isinstance(text, str) else ""
+
+
+def message_content(message: Dict) -> str:
+    """Text of a message, a placeholder such as "[image] <caption>" for media, "" for anything else.
+
+    Accepts the same shapes as extract_text; the caption is read from
+    webhook ``fileMessageData`` or the top-level ``caption`` of journal
+    and getChatHistory records. Used for loaded history only - live
+    messages go through extract_text, so media alone doesn't trigger a reply.
+    """
+    placeholder = MEDIA_PLACEHOLDERS.get(message.get("typeMessage"))
+    if not placeholder:
+        return extract_text(message)
+
+    file_data = message.get("fileMessageData", {})
+    caption = message.get("caption") or (file_data.get("caption") if isinstance(file_data, dict) else "")
+    return f"{placeholder} {caption.strip()}" if isinstance(caption, str) and caption.strip() else placeholder
+
+
+def message_role(record: Dict, chat_id: str) -> str:
+    """"user" for messages from the lead, "assistant" for ours"""
+    direction = record.get("type", "")
+    if direction in ("incoming", "outgoing"):
+        return "user" if direction == "incoming" else "assistant"
+    # Fallback: check chatId vs senderId
+    sender = record.get("senderId", "")
+    return "user" if sender and sender == chat_id else "assistant"
+
+
+def parse_chat_history(messages: List[Dict], chat_id: str) -> List[Dict[str, str]]:
+    """Convert Green API getChatHistory records to [{"role", "content"}], oldest first"""
+    history = []
+    for record in reversed(messages):  # API returns newest first
+        text = message_content(record)
+        if text:
+            history.append({"role": message_role(record, chat_id), "content": text})
+    return history
+
+
+def profile_context(lead: Optional[Dict]) -> Optional[str]:
+    """Summary of a lead's stored Sheets profile as context text (None for leads without messages)"""
+    if not lead or int(lead.get("message_count", 0) or 0) <= 0:
+        return None
+
+    fields = [
+        ("name", "שם"),
+        ("age", "גיל"),
+        ("location", "מיקום"),
+        ("experience", "ניסיון"),
+        ("match_score", "ציון התאמה"),
+        ("status", "סטטוס"),
+        ("message_count", "הודעות קודמות"),
+        ("conversation_summary", "סיכום שיחה קודמת"),
+        ("rejects", "התנגדויות"),
+        ("meeting", "פגישה שנקבעה"),
+    ]
+    parts = [PROFILE_CONTEXT_HEADER]
+    parts.extend(f"{label}: {lead[key]}" for key, label in fields if lead.get(key))
+    return "\n".join(parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token)"""
+    return len(text) // 4
+
+
+class HistoryLoader:
+    """Loads a chat's past conversation when the bot has none in memory.
+
+    Chat history is fetched in growing pages until it covers
+    ``token_budget`` tokens, ``max_messages`` messages or the start of the
+    chat. When it doesn't reach the start (or there is none), the lead's
+    stored Sheets profile is put in front of it as context. Results -
+    including "no history" - are cached for ``cache_ttl`` seconds, and
+    ``remember`` puts a conversation back into the cache (e.g. when it is
+    evicted from memory) so reloading it needs no fetch.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, int], List[Dict]],
+        get_lead: Optional[Callable[[str], Optional[Dict]]] = None,
+        token_budget: int = 3000,
+        page_size: int = 30,
+        max_messages: int = 240,
+        cache_ttl: float = 3600,
+        cache_size: int = 1000,
+    ):
+        """
+        Initialize the loader
+
+        Args:
+            fetch: Callable(chat_id, count) returning the last count chat records, newest first
+            get_lead: Callable(phone) returning the stored lead profile (None = no profile merge)
+            token_budget: Approximate tokens of history to load
+            page_size: Records in the first fetch (doubled per page)
+            max_messages: Max records fetched for one chat
+            cache_ttl: Seconds a loaded result is reused
+            cache_size: Max cached chats
+        """
+        self.fetch = fetch
+        self.get_lead = get_lead
+        self.token_budget = token_budget
+        self.page_size = page_size
+        self.max_messages = max_messages
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, Tuple[float, Optional[List[Dict[str, str]]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {"loads": 0, "cache_hits": 0, "fetches": 0, "pages": 0, "fetch_errors": 0, "profile_merges": 0}
+
+    def load(self, chat_id: str, phone: str, leads: Optional[Dict[str, Dict]] = None) -> Optional[List[Dict[str, str]]]:
+        """
+        Past conversation of a chat
+
+        Args:
+            chat_id: WhatsApp chat ID
+            phone: Lead phone (cache key, Sheets lookup)
+            leads: {phone: lead} to look the profile up in instead of get_lead
+
+        Returns:
+            History messages oldest first, or None if there is no past conversation
+        """
+        with self._lock:
+            self.stats["loads"] += 1
+            cached = self._cache.get(phone)
+            if cached and time.time() - cached[0] < self.cache_ttl:
+                self._cache.move_to_end(phone)
+                self.stats["cache_hits"] += 1
+                return list(cached[1]) if cached[1] else None
+
+        records, complete, failed = self._fetch_pages(chat_id, phone)
+        history = parse_chat_history(records, chat_id)
+        kept = self._fit(history, self.token_budget)
+
+        profile = None
+        if not complete or len(kept) < len(history) or not kept:
+            lead = leads.get(phone) if leads is not None else self._lookup(phone)
+            profile = profile_context(lead)
+
+        if profile:
+            self.stats["profile_merges"] += 1
+            kept = self._fit(history, self.token_budget - estimate_tokens(profile))
+            result = [{"role": "user", "content": "היי"}, {"role": "assistant", "content": profile}] + kept
+            logger.info(f"[HISTORY] Loaded {len(kept)} messages + Sheets profile for {phone}")
+        elif kept:
+            result = kept
+            logger.info(f"[HISTORY] Loaded {len(kept)} messages from Green API for {phone}")
+        else:
+            result = None
+            logger.info(f"[HISTORY] No past context found for {phone} - treating as new lead")
+
+        if not failed:
+            self.remember(phone, result)
+        return result
+
+    def remember(self, phone: str, history: Optional[List[Dict[str, str]]]):
+        """Cache a chat's conversation (None = known to have none)"""
+        with self._lock:
+            self._cache[phone] = (time.time(), list(history) if history else None)
+            self._cache.move_to_end(phone)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, phone: str):
+        """Drop a chat from the cache"""
+        with self._lock:
+            self._cache.pop(phone, None)
+
+    def _fetch_pages(self, chat_id: str, phone: str) -> Tuple[List[Dict], bool, bool]:
+        """Fetch growing pages until the token budget is covered.
+
+        Returns (records newest first, reached the start of the chat, a fetch failed).
+        """
+        count = self.page_size
+        records: List[Dict] = []
+        while True:
+            try:
+                page = self.fetch(chat_id, count)
+            except Exception as e:
+                self.stats["fetch_errors"] += 1
+                logger.warning(f"[HISTORY] getChatHistory failed for {phone}: {e}")
+                return records, False, True
+            self.stats["pages"] += 1
+            records = page if isinstance(page, list) else []
+
+            complete = len(records) < count
+            tokens = sum(estimate_tokens(message_content(record)) for record in records)
+            if complete or tokens >= self.token_budget or count >= self.max_messages:
+                self.stats["fetches"] += 1
+                return records, complete, False
+            count = min(count * 2, self.max_messages)
+
+    def _lookup(self, phone: str) -> Optional[Dict]:
+        """Stored lead profile (None if unavailable)"""
+        if not self.get_lead:
+            return None
+        try:
+            return self.get_lead(phone)
+        except Exception as e:
+            logger.warning(f"[HISTORY] Google Sheets lookup failed for {phone}: {e}")
+            return None
+
+    @staticmethod
+    def _fit(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+        """Newest messages that fit the token budget, starting with a lead message"""
+        kept = []
+        tokens = 0
+        for message in reversed(history):
+            tokens += estimate_tokens(message["content"])
+            if tokens > budget and kept:
+                break
+            kept.append(message)
+        kept.reverse()
+        while kept and kept[0]["role"] != "user":
+            kept.pop(0)
+        return kept
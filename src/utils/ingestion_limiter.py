@@ -0,0 +1,254 @@
+"""Ingestion rate limiting - per-chat token buckets, global admission and quarantine"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+from loguru import logger
+
+
+# admit() results
+ADMITTED = "admitted"
+THROTTLED = "throttled"      # Chat is over its own rate - message dropped
+OVERLOADED = "overloaded"    # Over the global rate - message left for later
+QUARANTINED = "quarantined"  # Chat is quarantined - message dropped
+
+
+class TokenBucket:
+    """Classic token bucket: ``burst`` tokens, refilled at ``rate`` per second"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        """Take one token if available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class IngestionLimiter:
+    """Decides whether an incoming message may enter the reply pipeline.
+
+    Each chat has its own token bucket, and all chats share a global one.
+    A chat that keeps hitting its limit (``quarantine_strikes`` throttled
+    messages within ``strike_window``) is quarantined for
+    ``quarantine_seconds``. Allowed chats bypass every limit. Manual
+    quarantines and the allow list are kept in ``overrides_path``, so they
+    survive restarts.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        global_rate: float,
+        global_burst: int,
+        quarantine_strikes: int = 20,
+        strike_window: float = 600,
+        quarantine_seconds: float = 86400,
+        max_chats: int = 5000,
+        overrides_path: Optional[Union[str, Path]] = None,
+        on_quarantine: Optional[Callable[[str, str], None]] = None,
+    ):
+        """
+        Initialize the limiter
+
+        Args:
+            rate: Messages per second a single chat may sustain
+            burst: Messages a single chat may send at once
+            global_rate: Messages per second over all chats
+            global_burst: Messages over all chats at once
+            quarantine_strikes: Throttled messages that get a chat quarantined (0 = never)
+            strike_window: Seconds over which strikes are counted
+            quarantine_seconds: How long an automatic quarantine lasts
+            max_chats: Chat buckets kept (least recently seen dropped)
+            overrides_path: JSON file for the allow list and manual quarantines
+            on_quarantine: Called with (chat_id, reason) when a chat is quarantined automatically
+        """
+        self.rate = rate
+        self.burst = burst
+        self.quarantine_strikes = quarantine_strikes
+        self.strike_window = strike_window
+        self.quarantine_seconds = quarantine_seconds
+        self.max_chats = max_chats
+        self.overrides_path = Path(overrides_path) if overrides_path else None
+        self.on_quarantine = on_quarantine
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._strikes: Dict[str, List[float]] = {}
+        self._quarantine: Dict[str, Optional[float]] = {}  # {chat_id: until (None = until released)}
+        self._allowed = set()
+        self._lock = threading.Lock()
+
+        self.stats = {ADMITTED: 0, THROTTLED: 0, OVERLOADED: 0, QUARANTINED: 0, "quarantines": 0}
+        self.dropped_by_chat: Dict[str, int] = {}
+
+        self._load_overrides()
+
+    def admit(self, chat_id: str) -> str:
+        """
+        Check one incoming message
+
+        Returns:
+            ADMITTED, THROTTLED, OVERLOADED or QUARANTINED
+        """
+        quarantined = None
+        with self._lock:
+            if chat_id in self._allowed:
+                result = ADMITTED
+            elif self._is_quarantined(chat_id):
+                result = QUARANTINED
+            else:
+                bucket = self._bucket(chat_id)
+                if not bucket.take():
+                    result = THROTTLED
+                    quarantined = self._strike(chat_id)
+                elif not self._global.take():
+                    bucket.tokens += 1  # Not the chat's fault - it keeps its token for the retry
+                    result = OVERLOADED
+                else:
+                    result = ADMITTED
+
+            self.stats[result] += 1
+            if result in (THROTTLED, QUARANTINED):
+                self.dropped_by_chat[chat_id] = self.dropped_by_chat.get(chat_id, 0) + 1
+
+        if quarantined and self.on_quarantine:
+            self.on_quarantine(chat_id, quarantined)
+        return result
+
+    def quarantine(self, chat_id: str, seconds: Optional[float] = None):
+        """Quarantine a chat manually (seconds=None: until released)"""
+        with self._lock:
+            self._allowed.discard(chat_id)
+            self._quarantine[chat_id] = time.time() + seconds if seconds else None
+            self.stats["quarantines"] += 1
+            self._save_overrides()
+        logger.warning(f"[INGEST] {chat_id} quarantined manually")
+
+    def release(self, chat_id: str) -> bool:
+        """Lift a quarantine and reset the chat's limits. Returns False if it wasn't quarantined."""
+        with self._lock:
+            was_quarantined = self._quarantine.pop(chat_id, False) is not False
+            self._strikes.pop(chat_id, None)
+            self._buckets.pop(chat_id, None)
+            self._save_overrides()
+        if was_quarantined:
+            logger.info(f"[INGEST] {chat_id} released from quarantine")
+        return was_quarantined
+
+    def allow(self, chat_id: str):
+        """Exempt a chat from all limits (also lifts a quarantine)"""
+        with self._lock:
+            self._allowed.add(chat_id)
+            self._quarantine.pop(chat_id, None)
+            self._strikes.pop(chat_id, None)
+            self._save_overrides()
+        logger.info(f"[INGEST] {chat_id} allowed - no rate limits")
+
+    def disallow(self, chat_id: str) -> bool:
+        """Put an allowed chat back under the limits. Returns False if it wasn't allowed."""
+        with self._lock:
+            was_allowed = chat_id in self._allowed
+            self._allowed.discard(chat_id)
+            self._save_overrides()
+        return was_allowed
+
+    def quarantined(self) -> Dict[str, Optional[float]]:
+        """Current quarantines {chat_id: until timestamp or None}"""
+        with self._lock:
+            return {
+                chat_id: until for chat_id, until in list(self._quarantine.items())
+                if self._is_quarantined(chat_id)
+            }
+
+    def snapshot(self, top: int = 10) -> Dict:
+        """Counters and current state for status endpoints"""
+        with self._lock:
+            offenders = sorted(self.dropped_by_chat.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                **self.stats,
+                "quarantined_chats": sorted(chat for chat in list(self._quarantine) if self._is_quarantined(chat)),
+                "allowed_chats": sorted(self._allowed),
+                "top_dropped": dict(offenders),
+                "tracked_chats": len(self._buckets),
+            }
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        """The chat's bucket, created full (caller holds the lock)"""
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_chats:
+                old_chat, _ = self._buckets.popitem(last=False)
+                self._strikes.pop(old_chat, None)
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def _strike(self, chat_id: str) -> Optional[str]:
+        """Count a throttled message; quarantine the chat if it has too many (caller holds the lock)"""
+        if not self.quarantine_strikes:
+            return None
+        now = time.time()
+        strikes = [t for t in self._strikes.get(chat_id, []) if now - t < self.strike_window]
+        strikes.append(now)
+        if len(strikes) < self.quarantine_strikes:
+            self._strikes[chat_id] = strikes
+            return None
+
+        self._strikes.pop(chat_id, None)
+        self._quarantine[chat_id] = now + self.quarantine_seconds
+        self.stats["quarantines"] += 1
+        self._save_overrides()
+        reason = f"{len(strikes)} throttled messages in {self.strike_window / 60:.0f} min"
+        logger.warning(f"[INGEST] {chat_id} quarantined for {self.quarantine_seconds / 3600:.1f}h ({reason})")
+        return reason
+
+    def _is_quarantined(self, chat_id: str) -> bool:
+        """Whether a chat is quarantined; expired quarantines are removed (caller holds the lock)"""
+        if chat_id not in self._quarantine:
+            return False
+        until = self._quarantine[chat_id]
+        if until is not None and until <= time.time():
+            del self._quarantine[chat_id]
+            logger.info(f"[INGEST] Quarantine of {chat_id} expired")
+            return False
+        return True
+
+    def _load_overrides(self):
+        """Load the allow list and quarantines from the overrides file"""
+        if not self.overrides_path or not self.overrides_path.exists():
+            return
+        try:
+            with open(self.overrides_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._allowed = set(data.get("allowed", []))
+            self._quarantine = dict(data.get("quarantined", {}))
+            logger.info(
+                f"[INGEST] Loaded {len(self._allowed)} allowed and {len(self._quarantine)} quarantined chats"
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"[INGEST] Failed to load {self.overrides_path}: {e}")
+
+    def _save_overrides(self):
+        """Write the allow list and quarantines (caller holds the lock)"""
+        if not self.overrides_path:
+            return
+        try:
+            self.overrides_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.overrides_path, "w", encoding="utf-8") as f:
+                json.dump({"allowed": sorted(self._allowed), "quarantined": self._quarantine}, f, indent=2)
+        except OSError as e:
+            logger.error(f"[INGEST] Failed to save {self.overrides_path}: {e}")
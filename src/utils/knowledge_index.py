@@ -0,0 +1,286 @@
+"""Lexical retrieval over the knowledge base (BM25 with Hebrew-aware tokenization)"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+
+# Hebrew niqqud / cantillation marks
+_NIQQUD = re.compile(r"[֑-ׇ]")
+_TOKEN = re.compile(r"[א-תa-z0-9]+")
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+
+# One-letter prefixes (ו/ה/ב/ל/מ/ש/כ) and their common combinations
+_HEBREW_PREFIXES = sorted(
+    ["ו", "ה", "ב", "ל", "מ", "ש", "כ", "וה", "וב", "ול", "ומ", "וש", "שה", "שב", "של", "מה", "כש", "לכ", "בה", "וכש"],
+    key=len,
+    reverse=True,
+)
+
+_STOPWORDS = {
+    "את", "של", "על", "עם", "זה", "זו", "גם", "אני", "אתה", "הוא", "היא", "יש", "אין",
+    "מה", "לא", "כן", "אם", "או", "כל", "רק", "אבל", "כמו", "עוד", "the", "a", "an", "and",
+    "or", "to", "of", "in", "is", "are", "for", "on", "with", "it", "you", "be",
+}
+
+# Most of the knowledge base is written in English while leads write in
+# Hebrew - common question words are expanded to the terms the KB uses
+QUERY_EXPANSIONS = {
+    "עולה": "price pricing cost",
+    "מחיר": "price pricing cost",
+    "מחירים": "price pricing cost",
+    "כסף": "price pricing payment",
+    "יקר": "price expensive",
+    "תשלומים": "installments price",
+    "מתי": "dates seasons departures",
+    "תאריך": "dates seasons departures",
+    "תאריכים": "dates seasons departures",
+    "חודש": "seasons march june november",
+    "טיול": "trip details",
+    "ימים": "duration days",
+    "מלון": "hotel accommodation location",
+    "לינה": "hotel accommodation",
+    "איפה": "location rawai phuket",
+    "פוקט": "phuket rawai",
+    "אימון": "training",
+    "אימונים": "training",
+    "ניסיון": "experience beginners level",
+    "מתחיל": "beginners experience level",
+    "כושר": "fitness experience",
+    "לבד": "solo alone",
+    "חברים": "friend group",
+    "קבוצה": "group size",
+    "טיסה": "flights",
+    "טיסות": "flights",
+    "כלול": "included",
+    "כולל": "included",
+    "גיל": "age",
+    "זקן": "age objections",
+    "מבוגר": "age objections",
+    "old": "age objections",
+    "להביא": "need passport",
+    "לארוז": "need passport",
+    "דרכון": "passport need",
+    "פעילויות": "activities attractions",
+    "אטרקציות": "activities attractions",
+    "עדן": "eden guide",
+    "מדריך": "guide eden",
+    "שיחה": "scheduling call",
+    "זום": "scheduling call zoom",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize Hebrew/English text for BM25.
+
+    Strips niqqud, folds final letters, and for Hebrew words also emits
+    the form without a leading prefix letter (so "בתאילנד" also matches
+    "תאילנד").
+    """
+    text = _NIQQUD.sub("", text.lower())
+    tokens = []
+    for word in _TOKEN.findall(text):
+        word = word.translate(_FINAL_LETTERS)
+        if word in _STOPWORDS:
+            continue
+        tokens.append(word)
+        if "א" <= word[0] <= "ת":
+            for prefix in _HEBREW_PREFIXES:
+                if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+                    tokens.append(word[len(prefix):])
+                    break
+    return tokens
+
+
+def split_sections(text: str, source: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict]:
+    """Split a markdown-ish knowledge text into chunks on ##/### headings.
+
+    ### sections keep their parent ## heading in the title. Sections longer
+    than chunk_size characters are split on line boundaries with
+    chunk_overlap characters of overlap.
+
+    Returns:
+        [{"id", "source", "title", "text"}] in document order
+    """
+    sections = []
+    parent = ""
+    title = ""
+    lines: List[str] = []
+
+    def close():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append((title, body))
+
+    for line in text.strip().splitlines():
+        if line.startswith("## ") or line.startswith("### "):
+            close()
+            lines = [line]
+            if line.startswith("## "):
+                parent = line[3:].strip()
+                title = parent
+            else:
+                title = f"{parent} > {line[4:].strip()}" if parent else line[4:].strip()
+        else:
+            lines.append(line)
+    close()
+
+    chunks = []
+    for title, body in sections:
+        for part in _split_long(body, chunk_size, chunk_overlap):
+            chunks.append({
+                "id": f"{source}:{len(chunks)}",
+                "source": source,
+                "title": title,
+                "text": part,
+            })
+    return chunks
+
+
+def _split_long(body: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split a section body into <= chunk_size pieces on line boundaries"""
+    if len(body) <= chunk_size:
+        return [body]
+
+    parts = []
+    current: List[str] = []
+    length = 0
+    for line in body.splitlines():
+        if current and length + len(line) > chunk_size:
+            parts.append("\n".join(current))
+            # Carry the tail of the previous piece over as overlap
+            overlap: List[str] = []
+            carried = 0
+            for prev in reversed(current):
+                if carried + len(prev) > chunk_overlap:
+                    break
+                overlap.insert(0, prev)
+                carried += len(prev) + 1
+            current, length = overlap, carried
+        current.append(line)
+        length += len(line) + 1
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of chunks"""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index
+
+        Args:
+            chunks: Chunks from split_sections (title + text are indexed)
+            k1: Term-frequency saturation
+            b: Length normalization
+        """
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        self._tfs = [Counter(tokenize(f"{c['title']}\n{c['text']}")) for c in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._tfs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if chunks else 0
+
+        df: Counter = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[float, Dict]]:
+        """Return the top_k (score, chunk) pairs for a query, best first (zero scores dropped)"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores = []
+        for idx, tf in enumerate(self._tfs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[idx] / (self._avg_length or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, idx))
+
+        scores.sort(reverse=True)
+        return [(score, self.chunks[idx]) for score, idx in scores[:top_k]]
+
+
+class KnowledgeRetriever:
+    """Picks the knowledge-base sections relevant to the current turn"""
+
+    def __init__(
+        self,
+        documents: Dict[str, str],
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        pinned: Iterable[str] = (),
+        first_contact: Iterable[str] = (),
+    ):
+        """
+        Chunk the documents and build the index
+
+        Args:
+            documents: {source name: text}
+            chunk_size: Max characters per chunk (Settings.chunk_size)
+            chunk_overlap: Overlap between split chunks (Settings.chunk_overlap)
+            pinned: Title substrings of sections always included
+            first_contact: Title substrings of sections included on the first turn only
+        """
+        self.chunks: List[Dict] = []
+        for source, text in documents.items():
+            self.chunks.extend(split_sections(text, source, chunk_size, chunk_overlap))
+
+        self.index = BM25Index(self.chunks)
+        self.pinned = [c for c in self.chunks if _title_matches(c, pinned)]
+        self.first_contact = [c for c in self.chunks if _title_matches(c, first_contact)]
+
+        logger.info(f"[KNOWLEDGE] Indexed {len(self.chunks)} chunks ({len(self.pinned)} pinned)")
+
+    def retrieve(self, query: str, top_k: int = 4, first_turn: bool = False) -> List[Dict]:
+        """Pinned + top_k matching chunks, in document order"""
+        selected = {c["id"]: c for c in self.pinned}
+        if first_turn:
+            selected.update((c["id"], c) for c in self.first_contact)
+        for _, chunk in self.index.search(expand_query(query), top_k):
+            selected[chunk["id"]] = chunk
+
+        order = {c["id"]: i for i, c in enumerate(self.chunks)}
+        return sorted(selected.values(), key=lambda c: order[c["id"]])
+
+    def render(self, query: str, top_k: int = 4, first_turn: bool = False) -> str:
+        """Retrieved chunks as prompt text"""
+        return "\n\n".join(c["text"] for c in self.retrieve(query, top_k, first_turn))
+
+
+_EXPANSIONS = {word.translate(_FINAL_LETTERS): terms for word, terms in QUERY_EXPANSIONS.items()}
+
+
+def _title_matches(chunk: Dict, needles: Iterable[str]) -> bool:
+    """True if any needle appears in the chunk title (case-insensitive)"""
+    title = chunk["title"].lower()
+    return any(needle.lower() in title for needle in needles)
+
+
+def expand_query(query: str) -> str:
+    """Append the English KB terms for Hebrew question words found in the query"""
+    tokens = set(tokenize(query))
+    extra = [terms for word, terms in _EXPANSIONS.items() if word in tokens]
+    return " ".join([query] + extra)
+
+
+def build_query(history: List[Dict[str, str]], turns: int = 3) -> str:
+    """Retrieval query from the last few messages (latest user message weighted double)"""
+    recent = history[-turns:]
+    last_user: Optional[str] = next((m["content"] for m in reversed(recent) if m["role"] == "user"), None)
+    parts = [m["content"] for m in recent]
+    if last_user:
+        parts.append(last_user)
+    return "\n".join(parts)
@@ -0,0 +1,124 @@
+"""Lead analysis prompts and helpers shared by the bot and the offline tools"""
+
+import json
+from typing import Dict, List, Optional
+
+
+# ============================================================
+# PROMPTS
+# ============================================================
+ANALYSIS_PROMPT = """You are analyzing a WhatsApp sales conversation for Skiba Arts (Muay Thai vacations in Thailand).
+Extract data from the conversation. Return ONLY valid JSON, nothing else.
+
+Required JSON format:
+{
+    "summary": "Concise analytical Hebrew summary (2-3 sentences). What the lead wants, readiness, concerns.",
+    "experience": "one of: מתחיל/בינוני/מתקדם, or null if unknown",
+    "age": "number or age range like '25-30'. null if unknown",
+    "location": "City/area in Israel in Hebrew. null if unknown",
+    "travel_readiness": "Hebrew short answer. Have they traveled abroad before? null if unknown",
+    "goals": "Hebrew. What they want from the trip (fitness/boxing skills/healing/extreme experience). null if unknown",
+    "match_score": "number 0-100. Criteria: engagement level (+25), expressed interest in trip (+25), good fit for product (+25), close to booking/call (+25)",
+    "rejects": "Hebrew. Objections the customer raised + suspected hidden objections. null if none detected",
+    "meeting": "If call/meeting was scheduled with specific details: 'יום [day], [date], שעה [time]'. null if not scheduled yet",
+    "status": "one of: חדש/בשיחה/נקבעה שיחה/נסגר/לא מתאים"
+}
+
+IMPORTANT: Return ONLY the JSON object. No markdown, no explanation."""
+
+INCREMENTAL_ANALYSIS_PROMPT = """You are updating the CRM profile of a lead in a WhatsApp sales conversation for Skiba Arts (Muay Thai vacations in Thailand).
+You get the PREVIOUS ANALYSIS (JSON) and only the NEW MESSAGES since it was made.
+Return the full updated profile in the same JSON format as the previous analysis. Return ONLY valid JSON, nothing else.
+
+Rules:
+- Keep every previous field unless the new messages add to it or contradict it
+- "summary": rewrite it so it covers the whole conversation (2-3 Hebrew sentences), not only the new messages
+- "match_score": number 0-100. Criteria: engagement level (+25), expressed interest in trip (+25), good fit for product (+25), close to booking/call (+25)
+- "meeting": 'יום [day], [date], שעה [time]' only if a call was scheduled with specific details, else keep the previous value
+- "status": one of: חדש/בשיחה/נקבעה שיחה/נסגר/לא מתאים
+
+IMPORTANT: Return ONLY the JSON object. No markdown, no explanation."""
+
+# Pipeline order of statuses - moving backwards in a delta analysis counts as drift
+STATUS_ORDER = {"חדש": 0, "בשיחה": 1, "נקבעה שיחה": 2, "נסגר": 3}
+
+LEAD_ANALYSIS_TOOL = {
+    "name": "record_lead_analysis",
+    "description": (
+        "Record structured data about the lead for the CRM. Call this once, AFTER writing "
+        "your WhatsApp reply to the customer. The customer never sees it."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string", "description": "Concise analytical Hebrew summary (2-3 sentences). What the lead wants, readiness, concerns."},
+            "experience": {"type": ["string", "null"], "description": "one of: מתחיל/בינוני/מתקדם, or null if unknown"},
+            "age": {"type": ["string", "null"], "description": "number or age range like '25-30'. null if unknown"},
+            "location": {"type": ["string", "null"], "description": "City/area in Israel in Hebrew. null if unknown"},
+            "travel_readiness": {"type": ["string", "null"], "description": "Hebrew short answer. Have they traveled abroad before? null if unknown"},
+            "goals": {"type": ["string", "null"], "description": "Hebrew. What they want from the trip (fitness/boxing skills/healing/extreme experience). null if unknown"},
+            "match_score": {"type": "integer", "description": "0-100. Criteria: engagement level (+25), expressed interest in trip (+25), good fit for product (+25), close to booking/call (+25)"},
+            "rejects": {"type": ["string", "null"], "description": "Hebrew. Objections the customer raised + suspected hidden objections. null if none detected"},
+            "meeting": {"type": ["string", "null"], "description": "If call/meeting was scheduled with specific details: 'יום [day], [date], שעה [time]'. null if not scheduled yet"},
+            "status": {"type": "string", "enum": ["חדש", "בשיחה", "נקבעה שיחה", "נסגר", "לא מתאים"]},
+        },
+        "required": ["summary", "match_score", "status"],
+    },
+}
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+def parse_json_reply(result_text: str) -> Optional[Dict]:
+    """Parse a JSON object out of a model reply (tolerates code fences / extra text)"""
+    result_text = result_text.strip()
+    # Clean if wrapped in code block
+    if result_text.startswith("```"):
+        result_text = result_text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
+    if result_text.startswith("{") and result_text.endswith("}"):
+        return json.loads(result_text)
+
+    # Try to find JSON in the response
+    start = result_text.find("{")
+    end = result_text.rfind("}") + 1
+    if start >= 0 and end > start:
+        return json.loads(result_text[start:end])
+    return None
+
+
+def format_transcript(messages: List[Dict[str, str]]) -> str:
+    """Render messages as 'Customer:/Bot:' lines"""
+    convo_lines = []
+    for msg in messages:
+        role = "Customer" if msg["role"] == "user" else "Bot"
+        convo_lines.append(f"{role}: {msg['content']}")
+    return "\n".join(convo_lines)
+
+
+def analysis_to_sheet_updates(analysis: Dict) -> Dict:
+    """Map an analysis result to Google Sheets column updates (empty values skipped)"""
+    sheet_updates = {}
+
+    if analysis.get("summary"):
+        sheet_updates["conversation_summary"] = analysis["summary"]
+    if analysis.get("experience"):
+        sheet_updates["experience"] = analysis["experience"]
+    if analysis.get("age"):
+        sheet_updates["age"] = str(analysis["age"])
+    if analysis.get("location"):
+        sheet_updates["location"] = analysis["location"]
+    if analysis.get("travel_readiness"):
+        sheet_updates["travel_readiness"] = analysis["travel_readiness"]
+    if analysis.get("goals"):
+        sheet_updates["goals"] = analysis["goals"]
+    if analysis.get("match_score") is not None:
+        sheet_updates["match_score"] = analysis["match_score"]
+    if analysis.get("rejects"):
+        sheet_updates["rejects"] = analysis["rejects"]
+    if analysis.get("status"):
+        sheet_updates["status"] = analysis["status"]
+    if analysis.get("meeting"):
+        sheet_updates["meeting"] = analysis["meeting"]
+
+    return sheet_updates
@@ -0,0 +1,110 @@
+"""Tools the reply model can call to look up lead and trip data on demand"""
+
+import json
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List
+from loguru import logger
+
+from ..agents.tools import Tool
+
+
+# Lead fields the model may see (internal columns like whatsapp_id stay out)
+PROFILE_FIELDS = [
+    "name", "status", "age", "experience", "location", "travel_readiness", "goals",
+    "destination", "conversation_summary", "rejects", "meeting", "message_count",
+]
+
+# Used when no schedule file exists - matches "Trip Seasons" in the knowledge base
+DEFAULT_TRIP_SEASONS = {
+    "group_departures": ["March", "June", "November"],
+    "durations_days": [10, 13],
+    "custom_dates": "Soul Rider packages can be arranged year-round for any dates",
+}
+
+
+def lead_profile_tool(lead_manager, cache_ttl: float = 60) -> Tool:
+    """
+    Lookup of the current lead's CRM profile in Google Sheets
+
+    Args:
+        lead_manager: GoogleSheetsManager
+        cache_ttl: Seconds a profile is reused within and across turns
+
+    Returns:
+        Tool bound to the session's phone number
+    """
+    def lookup(phone: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        lead = lead_manager.get_lead(phone)
+        if not lead:
+            return {"found": False}
+        profile = {field: lead.get(field) for field in PROFILE_FIELDS if lead.get(field)}
+        return {"found": True, **profile}
+
+    return Tool(
+        name="get_lead_profile",
+        description=(
+            "Look up what the CRM already knows about the customer you are talking to: "
+            "name, age, city, experience, goals, objections, previous conversation summary "
+            "and any scheduled call. Use it when the customer refers to an earlier "
+            "conversation or before asking something they may have already told us."
+        ),
+        handler=lookup,
+        cache_ttl=cache_ttl,
+    )
+
+
+def trip_dates_tool(schedule_path: Path, cache_ttl: float = 600) -> Tool:
+    """
+    Lookup of upcoming trip departures
+
+    Reads a JSON schedule kept by Eden - {"departures": [{"start": "YYYY-MM-DD",
+    "days": 10, "spots_left": 4, "notes": "..."}]} - and falls back to the
+    general seasons when the file is missing.
+
+    Args:
+        schedule_path: Path of the schedule JSON file
+        cache_ttl: Seconds the schedule is reused before re-reading the file
+
+    Returns:
+        Tool shared by all sessions
+    """
+    def lookup(_session: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        if not schedule_path.exists():
+            return {
+                **DEFAULT_TRIP_SEASONS,
+                "exact_dates": "Not published - offer to check the latest schedule with Eden",
+            }
+
+        with open(schedule_path, encoding="utf-8") as f:
+            schedule = json.load(f)
+
+        today = date.today().isoformat()
+        upcoming: List[Dict[str, Any]] = sorted(
+            (d for d in schedule.get("departures", []) if str(d.get("start", "")) >= today),
+            key=lambda d: d["start"],
+        )
+        month = tool_input.get("month")
+        if month:
+            upcoming = [d for d in upcoming if date.fromisoformat(d["start"]).strftime("%B").lower() == month.lower()]
+
+        logger.debug(f"[TOOLS] Trip schedule: {len(upcoming)} upcoming departures")
+        return {"upcoming_departures": upcoming, **DEFAULT_TRIP_SEASONS}
+
+    return Tool(
+        name="get_trip_dates",
+        description=(
+            "Get the upcoming group trip departures (start date, length, spots left). "
+            "Use it when the customer asks when the next trip is or about specific dates. "
+            "Never state dates that this tool did not return."
+        ),
+        handler=lookup,
+        input_schema={
+            "type": "object",
+            "properties": {
+                "month": {"type": "string", "description": "Only departures in this month (English name), optional"},
+            },
+        },
+        cache_ttl=cache_ttl,
+        per_session=False,
+    )
@@ -0,0 +1,224 @@
+"""In-process metrics registry (counters, gauges, histograms) with Prometheus text exposition"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds - from a Sheets cache hit to a slow model call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Metric:
+    """Base of all metric types: name, help text and label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _series(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None, suffix: str = "") -> str:
+        """Sample name with its label set, e.g. name_bucket{stage="send",le="0.5"}"""
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return self.name + suffix
+        rendered = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return f"{self.name}{suffix}{{{rendered}}}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> List[str]:
+        """Exposition lines of this metric"""
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Add amount (>= 0) to the series of the given labels"""
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self._series(key, suffix='_total')} {_number(value)}" for key, value in values]
+
+    def expose(self) -> List[str]:
+        name = f"{self.name}_total"
+        return [f"# HELP {name} {self.help}", f"# TYPE {name} counter"] + self.samples()
+
+
+class Gauge(_Metric):
+    """Value that goes up and down - set directly, or read from a function at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        if function and self.labels:
+            raise ValueError("Function gauges take no labels")
+        self.function = function
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        if self.function:
+            try:
+                return [f"{self.name} {_number(self.function())}"]
+            except Exception:
+                return []  # A failing source leaves a gap instead of breaking the scrape
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self._series(key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        if "le" in self.labels:
+            raise ValueError('"le" is reserved for histogram buckets')
+        self.buckets = tuple(sorted(buckets))
+        self._series_data: Dict[Tuple[str, ...], Dict] = {}  # {key: {"counts", "sum", "count"}}
+
+    def observe(self, value: float, **labels):
+        """Record one value"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series_data.get(key)
+            if series is None:
+                series = self._series_data[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds (also when it raises)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series_data.get(self._key(labels))
+            return series["count"] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            data = sorted((key, dict(series, counts=list(series["counts"]))) for key, series in self._series_data.items())
+        lines = []
+        for key, series in data:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self._series(key, {'le': le}, '_bucket')} {cumulative}")
+            lines.append(f"{self._series(key, suffix='_sum')} {_number(series['sum'])}")
+            lines.append(f"{self._series(key, suffix='_count')} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of the process.
+
+    Registering a name again returns the existing metric, so modules can
+    declare the metrics they use at import time without coordinating.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labels=labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), function: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._register(Gauge, name, help, labels=labels, function=function)
+        if function:
+            gauge.function = function  # Re-registration rebinds the source
+        return gauge
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labels=labels, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, cls, name: str, help: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(kwargs.get("labels", ())):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labels}")
+            return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """Sample value as Prometheus expects it (integers without a trailing .0)"""
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+# Process-wide registry the bot's modules record into
+registry = MetricsRegistry()
@@ -0,0 +1,73 @@
+"""First-contact opening message rendered from the sales methodology (no model call)"""
+
+import itertools
+import re
+import threading
+from typing import List, Optional
+from loguru import logger
+
+
+# Greeting lines rotated between new leads - "{name}" is " <first name>" or ""
+OPENING_GREETINGS = [
+    "היי{name},",
+    "היי{name}!",
+    "שלום{name},",
+    "אהלן{name},",
+]
+
+_SECTION = re.compile(r"## OPENING MESSAGE[^\n]*\n(.*?)(?=\n## |\Z)", re.DOTALL)
+_QUOTED = re.compile(r'"(.+)"', re.DOTALL)
+_LEADING_GREETING = re.compile(r"^(היי|הי|שלום|אהלן)[,!]?\s*")
+_NAME = re.compile(r"^[A-Za-zא-ת][A-Za-zא-ת'\-]{1,14}$")
+
+
+def extract_opening(methodology: str) -> Optional[str]:
+    """The quoted opening text from the "OPENING MESSAGE" section (None if missing)"""
+    section = _SECTION.search(methodology)
+    if not section:
+        return None
+    quoted = _QUOTED.search(section.group(1))
+    return quoted.group(1).strip() if quoted else None
+
+
+def first_name(sender_name: Optional[str]) -> str:
+    """First name from a WhatsApp senderName, or "" if it doesn't look like one"""
+    if not sender_name:
+        return ""
+    parts = sender_name.strip().split()
+    if not parts or not _NAME.match(parts[0]) or parts[0].lower() == "unknown":
+        return ""
+    return parts[0]
+
+
+class OpeningTemplates:
+    """Renders the fixed opening for new leads with the lead's name and a rotating greeting"""
+
+    def __init__(self, methodology: str, greetings: Optional[List[str]] = None):
+        """
+        Build the templates
+
+        Args:
+            methodology: SALES_METHODOLOGY text containing the "OPENING MESSAGE" section
+            greetings: Greeting variants (OPENING_GREETINGS if None)
+
+        Raises:
+            ValueError: The section or its quoted message was not found
+        """
+        opening = extract_opening(methodology)
+        if not opening:
+            raise ValueError("OPENING MESSAGE section not found in the sales methodology")
+
+        self.body = _LEADING_GREETING.sub("", opening, count=1)
+        self.greetings = greetings or OPENING_GREETINGS
+        self._rotation = itertools.cycle(range(len(self.greetings)))
+        self._lock = threading.Lock()
+
+        logger.info(f"[OPENING] {len(self.greetings)} opening variants ready")
+
+    def render(self, sender_name: Optional[str] = None) -> str:
+        """Opening message for a new lead (next greeting variant, first name if usable)"""
+        with self._lock:
+            greeting = self.greetings[next(self._rotation)]
+        name = first_name(sender_name)
+        return f"{greeting.format(name=f' {name}' if name else '')} {self.body}"
@@ -0,0 +1,351 @@
+"""Persistent outbox / dispatcher for all outbound WhatsApp messages (SQLite) - pacing, priorities, retries"""
+
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+from loguru import logger
+
+from .ingestion_limiter import TokenBucket
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL,
+    not_before REAL NOT NULL,
+    expires REAL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, id);
+"""
+
+# enqueue() priorities - lower is sent first when the send rate is the bottleneck
+PRIORITY_REPLY = 0         # Replies to leads
+PRIORITY_NOTIFICATION = 1  # Notifications to Eden
+PRIORITY_BULK = 2          # Follow-ups and other non-urgent traffic
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+EXPIRED = "expired"
+
+
+
+def reply_key(phone: str, msg_id: str) -> str:
+    """Outbox key of the reply to a batch of lead messages.
+
+    Built from the Green API ID of the batch's last incoming message, which
+    - unlike the lead's history position - survives history eviction and
+    restarts, so a later batch can never collide with a kept key. The same
+    batch answered twice (e.g. a deferred retry racing the regular flow)
+    gets the same key. Without a message ID the key is random.
+    """
+    return f"reply:{phone}:{msg_id or uuid.uuid4().hex}"
+
+class Outbox:
+    """Owns all outbound traffic: messages are written to SQLite first and sent by one worker.
+
+    ``enqueue`` returns at once. The worker sends due messages by
+    priority, in order per chat, paced globally (``rate`` per second with
+    bursts of ``burst``) and per recipient (``recipient_interval`` seconds
+    between messages to one chat), and retries failures with exponential
+    backoff until ``max_attempts``. A message enqueued with a key that is
+    already in the outbox is dropped, so retried producers don't send
+    twice. Pending messages survive restarts.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        send: Callable[[str, str], Any],
+        rate: float = 2.0,
+        burst: int = 5,
+        recipient_interval: float = 2.0,
+        max_attempts: int = 8,
+        base_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        retention_days: float = 7,
+        on_give_up: Optional[Callable[[Dict], None]] = None,
+        on_sent: Optional[Callable[[Dict], None]] = None,
+    ):
+        """
+        Open (or create) the outbox and start the sender
+
+        Args:
+            path: SQLite file
+            send: Callable(chat_id, text) - raises on failure
+            rate: Max messages sent per second, sustained
+            burst: Messages that may go out at once after a quiet period
+            recipient_interval: Min seconds between two messages to the same chat
+            max_attempts: Attempts before a message is marked failed
+            base_backoff: Seconds before the first retry (doubles per attempt)
+            max_backoff: Max seconds between retries
+            retention_days: Sent/failed messages (and their keys) are kept this long
+            on_give_up: Called with the message row when it is marked failed
+            on_sent: Called with the message's key, kind, chat_id, attempts, due, send_seconds and sent_at after it is sent
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.send = send
+        self.rate = rate
+        self.recipient_interval = recipient_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention_days = retention_days
+        self.on_give_up = on_give_up
+        self.on_sent = on_sent
+
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "priority" not in columns:  # Outbox created before priorities
+                conn.execute("ALTER TABLE outbox ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            pending = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+        finally:
+            conn.close()
+
+        self._wake = threading.Event()
+        self._bucket = TokenBucket(rate, burst) if rate else None
+        self._last_sent_to: Dict[str, float] = {}
+        self._lag: Dict[str, deque] = {}  # {kind: recent seconds from due to sent}
+        self._send_times: Dict[str, deque] = {}  # {kind: recent seconds the send call took}
+        self.stats = {"enqueued": 0, "duplicates": 0, "sent": 0, "retries": 0, "failed": 0, "expired": 0}
+
+        threading.Thread(target=self._send_loop, name="outbox", daemon=True).start()
+        logger.info(f"[OUTBOX] Outbox at {self.path} ({pending} pending)")
+
+    def enqueue(
+        self,
+        chat_id: str,
+        text: str,
+        key: Optional[str] = None,
+        kind: str = "reply",
+        delay: float = 0,
+        ttl: Optional[float] = None,
+        priority: int = PRIORITY_REPLY,
+    ) -> bool:
+        """
+        Queue a message
+
+        Args:
+            chat_id: WhatsApp chat ID
+            text: Message text
+            key: Idempotency key (random if None)
+            kind: Message type for logs and stats ("reply", "eden", ...)
+            delay: Seconds before the message may be sent (e.g. typing delay)
+            ttl: Seconds after which an unsent message is dropped (None = never)
+            priority: PRIORITY_REPLY, PRIORITY_NOTIFICATION or PRIORITY_BULK
+
+        Returns:
+            False if a message with this key was already queued
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO outbox (key, kind, chat_id, text, created, not_before, expires, priority) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key or uuid.uuid4().hex, kind, chat_id, text, now, now + delay, now + ttl if ttl else None, priority),
+                )
+        finally:
+            conn.close()
+
+        if not cursor.rowcount:
+            self.stats["duplicates"] += 1
+            logger.info(f"[OUTBOX] Duplicate {kind} to {chat_id} dropped (key {key})")
+            return False
+
+        self.stats["enqueued"] += 1
+        self._wake.set()
+        return True
+
+    def pending(self) -> int:
+        """Messages not sent yet"""
+        return self._query("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,))[0][0]
+
+    def snapshot(self) -> Dict:
+        """Counters, queue depth and send latency for status endpoints"""
+        rows = self._query(
+            "SELECT status, COUNT(*), MIN(created) FROM outbox GROUP BY status", ()
+        )
+        by_status = {status: count for status, count, _ in rows}
+        oldest = next((created for status, _, created in rows if status == PENDING), None)
+        depth = dict(self._query(
+            "SELECT kind, COUNT(*) FROM outbox WHERE status = ? GROUP BY kind", (PENDING,)
+        ))
+        return {
+            **self.stats,
+            "by_status": by_status,
+            "pending_by_kind": depth,
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest else 0.0,
+            "lag": {kind: _summary(samples) for kind, samples in list(self._lag.items())},
+            "send_time": {kind: _summary(samples) for kind, samples in list(self._send_times.items())},
+        }
+
+    def _send_loop(self):
+        """Sender thread - send due messages by priority, one chat at a time in order"""
+        last_prune = 0.0
+        while True:
+            self._wake.clear()
+            try:
+                next_due = self._send_due()
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except sqlite3.Error as e:
+                logger.error(f"[OUTBOX] Database error: {e}")
+                next_due = time.time() + 5
+
+            timeout = max(next_due - time.time(), 0.05) if next_due else None
+            self._wake.wait(timeout)
+
+    def _send_due(self) -> Optional[float]:
+        """Send every due message. Returns when the next pending message is due (None if none)."""
+        rows = self._query(
+            "SELECT id, key, kind, chat_id, text, not_before, expires, attempts, priority FROM outbox "
+            "WHERE status = ? ORDER BY id", (PENDING,)
+        )
+        # Only a chat's oldest pending message may go - priorities never reorder one chat
+        oldest = {}
+        for row in rows:
+            oldest.setdefault(row[3], row[0])
+
+        next_due = None
+        for id_, key, kind, chat_id, text, not_before, expires, attempts, _ in sorted(rows, key=lambda r: (r[8], r[0])):
+            now = time.time()
+            if expires and expires <= now:
+                self._update(id_, status=EXPIRED)
+                self.stats["expired"] += 1
+                logger.warning(f"[OUTBOX] {kind} to {chat_id} expired unsent after {attempts} attempts")
+                continue
+            if oldest.get(chat_id) != id_:
+                continue
+            due = max(not_before, self._last_sent_to.get(chat_id, 0) + self.recipient_interval)
+            if due > now:
+                next_due = min(next_due or due, due)
+                continue
+
+            self._pace()
+            start = time.time()
+            try:
+                self.send(chat_id, text)
+            except Exception as e:
+                retry_at = self._fail(id_, key, kind, chat_id, text, attempts + 1, e)
+                if retry_at:
+                    next_due = min(next_due or retry_at, retry_at)
+                continue
+            finally:
+                self._last_sent_to[chat_id] = time.time()
+
+            sent_at = time.time()
+            self._update(id_, status=SENT, attempts=attempts + 1, sent_at=sent_at)
+            self.stats["sent"] += 1
+            self._lag.setdefault(kind, deque(maxlen=500)).append(sent_at - not_before)
+            self._send_times.setdefault(kind, deque(maxlen=500)).append(sent_at - start)
+            logger.info(f"[OUTBOX] ✅ Sent {kind} to {chat_id}" + (f" (attempt {attempts + 1})" if attempts else ""))
+            if self.on_sent:
+                try:
+                    self.on_sent({
+                        "key": key, "kind": kind, "chat_id": chat_id, "attempts": attempts + 1,
+                        "due": not_before, "send_seconds": sent_at - start, "sent_at": sent_at,
+                    })
+                except Exception as e:
+                    logger.error(f"[OUTBOX] Sent handler failed: {e}")
+
+        # Recipients not written to for a while need no pacing state
+        cutoff = time.time() - self.recipient_interval
+        for chat_id in [chat for chat, sent in self._last_sent_to.items() if sent < cutoff]:
+            del self._last_sent_to[chat_id]
+        return next_due
+
+    def _pace(self):
+        """Block the sender until the global rate allows another message"""
+        if not self._bucket:
+            return
+        while not self._bucket.take():
+            time.sleep(1.0 / self.rate)
+
+    def _fail(self, id_, key, kind, chat_id, text, attempts, error) -> Optional[float]:
+        """Record a failed send - schedule a retry or give up. Returns the retry time."""
+        if attempts >= self.max_attempts:
+            self._update(id_, status=FAILED, attempts=attempts, last_error=str(error))
+            self.stats["failed"] += 1
+            logger.error(f"[OUTBOX] Giving up on {kind} to {chat_id} after {attempts} attempts: {error}")
+            if self.on_give_up:
+                try:
+                    self.on_give_up({"key": key, "kind": kind, "chat_id": chat_id, "text": text})
+                except Exception as e:
+                    logger.error(f"[OUTBOX] Give-up handler failed: {e}")
+            return None
+
+        backoff = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        retry_at = time.time() + backoff * random.uniform(0.8, 1.2)
+        self._update(id_, attempts=attempts, not_before=retry_at, last_error=str(error))
+        self.stats["retries"] += 1
+        logger.warning(f"[OUTBOX] Send of {kind} to {chat_id} failed (attempt {attempts}): {error} - retry in {backoff:.0f}s")
+        return retry_at
+
+    def _prune(self):
+        """Drop sent/failed messages past the retention period"""
+        cutoff = time.time() - self.retention_days * 86400
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM outbox WHERE status != ? AND created < ?", (PENDING, cutoff))
+        finally:
+            conn.close()
+
+    def _update(self, id_: int, **fields):
+        """Update columns of one message"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE outbox SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                    (*fields.values(), id_),
+                )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """New connection (one per thread/query - SQLite connections aren't shared)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _query(self, sql: str, args: tuple) -> list:
+        """Run a read query on a short-lived connection"""
+        conn = self._connect()
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+
+def _summary(samples) -> Dict:
+    """avg / p95 / max of recent samples, in seconds"""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0, "avg": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "avg": round(sum(values) / len(values), 3),
+        "p95": round(values[int((len(values) - 1) * 0.95)], 3),
+        "max": round(values[-1], 3),
+    }
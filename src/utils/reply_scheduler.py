@@ -0,0 +1,160 @@
+"""Bounded reply worker pool that serves chats by priority, with aging"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from loguru import logger
+
+
+class ReplyScheduler:
+    """Runs chat jobs on a fixed pool of workers, most urgent first.
+
+    Every job has a priority class (0 = most urgent). While a job waits,
+    it ages: each ``aging_seconds`` of waiting counts as one class more
+    urgent, so cold chats are delayed during a spike but never starve.
+    Jobs of one chat run in order and never on two workers at once. Queue
+    wait times are recorded per class.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Any],
+        workers: int = 8,
+        aging_seconds: float = 20,
+        class_names: Optional[Sequence[str]] = None,
+        wait_samples: int = 500,
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            handler: Callable(*args) run for each job
+            workers: Number of worker threads
+            aging_seconds: Waiting time that promotes a job by one class
+            class_names: Names of the priority classes, most urgent first (for stats)
+            wait_samples: Recent wait times kept per class for percentiles
+        """
+        self.handler = handler
+        self.aging_seconds = aging_seconds
+        self.class_names = list(class_names or [])
+
+        self._jobs: List[Dict] = []  # [{"key", "priority", "queued", "seq", "args"}]
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        self._waits: Dict[int, deque] = {}
+        self._wait_samples = wait_samples
+        self.stats = {"submitted": 0, "processed": 0, "failed": 0, "aged": 0}
+        self._class_stats: Dict[int, Dict] = {}
+
+        for i in range(workers):
+            threading.Thread(target=self._worker_loop, name=f"reply-{i}", daemon=True).start()
+
+    def submit(self, key: str, priority: int, *args):
+        """
+        Queue a job
+
+        Args:
+            key: Chat the job belongs to (jobs of one key run one at a time, in order)
+            priority: Priority class, 0 = most urgent
+            *args: Handler arguments
+        """
+        with self._cond:
+            self._jobs.append({
+                "key": key,
+                "priority": priority,
+                "queued": time.monotonic(),
+                "seq": next(self._seq),
+                "args": args,
+            })
+            self.stats["submitted"] += 1
+            self._class(priority)["submitted"] += 1
+            depth = len(self._jobs)
+            self._cond.notify()
+
+        logger.debug(f"[SCHED] Queued {key} as {self._name(priority)} ({depth} waiting)")
+
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        with self._cond:
+            return len(self._jobs)
+
+    def snapshot(self) -> Dict:
+        """Counters and per-class queue wait times for status endpoints"""
+        with self._cond:
+            classes = {}
+            for priority, stats in sorted(self._class_stats.items()):
+                waits = sorted(self._waits.get(priority, ()))
+                classes[self._name(priority)] = {
+                    "submitted": stats["submitted"],
+                    "served": stats["served"],
+                    "waiting": sum(1 for job in self._jobs if job["priority"] == priority),
+                    "avg_wait": round(stats["total_wait"] / stats["served"], 3) if stats["served"] else 0.0,
+                    "p95_wait": round(waits[int((len(waits) - 1) * 0.95)], 3) if waits else 0.0,
+                    "max_wait": round(stats["max_wait"], 3),
+                }
+            return {**self.stats, "waiting": len(self._jobs), "running": len(self._running), "classes": classes}
+
+    def _worker_loop(self):
+        """Take the most urgent runnable job and run the handler"""
+        while True:
+            with self._cond:
+                while True:
+                    job = self._pop_next()
+                    if job:
+                        break
+                    self._cond.wait()
+                self._running.add(job["key"])
+
+            try:
+                self.handler(*job["args"])
+                outcome = "processed"
+            except Exception as e:
+                outcome = "failed"
+                logger.error(f"[SCHED] Handler error for {job['key']}: {e}")
+            finally:
+                with self._cond:
+                    self.stats[outcome] += 1
+                    self._running.discard(job["key"])
+                    self._cond.notify_all()
+
+    def _pop_next(self) -> Optional[Dict]:
+        """Remove and return the most urgent runnable job (caller holds the lock)"""
+        now = time.monotonic()
+        best, best_rank = None, None
+        blocked = set(self._running)
+        for job in self._jobs:
+            if job["key"] in blocked:
+                continue
+            blocked.add(job["key"])  # Only a chat's oldest job is runnable
+            rank = (job["priority"] - (now - job["queued"]) / self.aging_seconds, job["seq"])
+            if best_rank is None or rank < best_rank:
+                best, best_rank = job, rank
+        if best is None:
+            return None
+
+        self._jobs.remove(best)
+        wait = now - best["queued"]
+        if any(job["priority"] < best["priority"] for job in self._jobs if job["key"] not in self._running):
+            self.stats["aged"] += 1  # Served ahead of a more urgent class thanks to aging
+
+        stats = self._class(best["priority"])
+        stats["served"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        self._waits.setdefault(best["priority"], deque(maxlen=self._wait_samples)).append(wait)
+        if wait > self.aging_seconds:
+            logger.info(f"[SCHED] {best['key']} ({self._name(best['priority'])}) waited {wait:.1f}s for a worker")
+        return best
+
+    def _class(self, priority: int) -> Dict:
+        """Stats of one priority class (caller holds the lock)"""
+        if priority not in self._class_stats:
+            self._class_stats[priority] = {"submitted": 0, "served": 0, "total_wait": 0.0, "max_wait": 0.0}
+        return self._class_stats[priority]
+
+    def _name(self, priority: int) -> str:
+        return self.class_names[priority] if 0 <= priority < len(self.class_names) else str(priority)
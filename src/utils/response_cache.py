@@ -0,0 +1,158 @@
+"""Exact-answer cache for the first turns of a conversation (repeated FAQ openers)"""
+
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from loguru import logger
+
+
+_NIQQUD = re.compile(r"[֑-ׇ]")
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATS = re.compile(r"([^\W\d_])\1+")
+
+
+def normalize_message(text: str) -> str:
+    """Normalize a message for cache keys.
+
+    Lowercase, no niqqud, punctuation or emoji, and letter runs collapsed -
+    "כמה זה עולה??" and "כמה זה עולה" or "היייי" and "היי" map to the same key.
+    """
+    text = _NIQQUD.sub("", text.lower())
+    text = _NON_WORD.sub(" ", text)
+    text = _REPEATS.sub(r"\1", text)
+    return " ".join(text.split())
+
+
+def knowledge_version(*texts: str) -> str:
+    """Short hash of the knowledge the answers were generated from"""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+class ResponseCache:
+    """Reuses generated replies for identical early conversation states.
+
+    Only conversations of at most ``max_messages`` messages (the first
+    one or two turns) qualify. Each key collects up to ``variants``
+    different generated replies before it starts serving hits; a lead is
+    always served the same variant (chosen by its phone), so repeated
+    openers don't all look canned. Entries expire ``ttl`` seconds after
+    they were created and the least recently used entries are evicted
+    past ``max_entries``. Keys include the knowledge version, so answers
+    generated from an older knowledge base are never served.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 500,
+        max_messages: int = 1,
+        variants: int = 3,
+        version: str = "",
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            ttl: Seconds an entry is served (Settings.cache_ttl)
+            max_entries: Max cached conversation states
+            max_messages: Max history length (incl. the new message) that is cached
+            variants: Replies collected per state before it is served from cache
+            version: Knowledge version (see knowledge_version)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_messages = max_messages
+        self.variants = variants
+        self.version = version
+        self.enabled = True
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()  # {key: {"created": ts, "replies": []}}
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def cacheable(self, history: List[Dict[str, str]]) -> bool:
+        """True if this conversation state may be answered from / stored in the cache"""
+        return (
+            self.enabled
+            and 0 < len(history) <= self.max_messages
+            and history[-1]["role"] == "user"
+        )
+
+    def get(self, history: List[Dict[str, str]], lead: str) -> Optional[str]:
+        """
+        Cached reply for the conversation state
+
+        Args:
+            history: Conversation so far, ending with the new user message
+            lead: Lead identifier - picks the lead's variant
+
+        Returns:
+            Reply text, or None on a miss (including keys still collecting variants)
+        """
+        if not self.cacheable(history):
+            return None
+
+        key = self._key(history)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if not entry or len(entry["replies"]) < self.variants:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            replies = entry["replies"]
+            return replies[zlib.crc32(lead.encode("utf-8")) % len(replies)]
+
+    def put(self, history: List[Dict[str, str]], reply: str):
+        """Store a freshly generated reply for the conversation state"""
+        if not self.cacheable(history) or not reply:
+            return
+
+        key = self._key(history)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or time.time() - entry["created"] > self.ttl:
+                entry = self._entries[key] = {"created": time.time(), "replies": []}
+            if len(entry["replies"]) < self.variants and reply not in entry["replies"]:
+                entry["replies"].append(reply)
+                self.stats["stores"] += 1
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, version: Optional[str] = None):
+        """Drop every entry (optionally switching to a new knowledge version)"""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            if version is not None:
+                self.version = version
+            self.stats["invalidations"] += 1
+        logger.info(f"[CACHE] Response cache invalidated ({dropped} entries dropped)")
+
+    def hit_rate(self) -> float:
+        """Share of cacheable lookups answered from the cache"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _key(self, history: Iterable[Dict[str, str]]) -> str:
+        """Cache key: knowledge version + normalized conversation"""
+        turns = "|".join(f"{m['role'][0]}:{normalize_message(m['content'])}" for m in history)
+        return f"{self.version}|{turns}"
@@ -0,0 +1,150 @@
+"""Startup orchestration - independent subsystems initialize concurrently, with per-subsystem timing"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+
+# Subsystem states
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupOrchestrator:
+    """Initializes the bot's subsystems and records how long each took.
+
+    ``background`` starts a subsystem on its own thread, so independent
+    ones (Green API, Google Sheets, ...) initialize at the same time.
+    ``step`` times one that runs on the caller's thread. Code that needs a
+    subsystem either blocks on ``wait`` or registers ``on_ready`` to be
+    called whenever it becomes available - immediately if it already is.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._subsystems: Dict[str, Dict] = {}  # {name: {"state", "seconds", "error", "result", "event"}}
+        self._callbacks: Dict[str, List[Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+
+    def background(self, name: str, init: Callable[[], Any]):
+        """
+        Initialize a subsystem on a background thread
+
+        Args:
+            name: Subsystem name
+            init: Callable() returning the initialized subsystem (raises on failure)
+        """
+        self._register(name)
+        threading.Thread(target=self._run, args=(name, init), name=f"startup-{name}", daemon=True).start()
+
+    @contextmanager
+    def step(self, name: str):
+        """Time a subsystem initialized on the caller's thread (exceptions propagate)"""
+        self._register(name)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._finish(name, start, error=e)
+            raise
+        self._finish(name, start)
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Block until a subsystem has initialized
+
+        Args:
+            name: Subsystem name
+            timeout: Max seconds to wait (None = until it finishes)
+
+        Returns:
+            The initialized subsystem, or None if it failed, timed out or was never started
+        """
+        with self._lock:
+            subsystem = self._subsystems.get(name)
+        if not subsystem or not subsystem["event"].wait(timeout):
+            return None
+        return subsystem["result"]
+
+    def on_ready(self, name: str, callback: Callable[[Any], None]):
+        """Call callback(subsystem) once it is ready - right away if it already is"""
+        with self._lock:
+            subsystem = self._subsystems.get(name)
+            if not subsystem or subsystem["state"] == PENDING:
+                self._callbacks.setdefault(name, []).append(callback)
+                return
+            ready = subsystem["state"] == READY
+        if ready:
+            self._notify(name, callback, subsystem["result"])
+
+    def state(self, name: str) -> Optional[str]:
+        """PENDING, READY or FAILED (None if never started)"""
+        with self._lock:
+            subsystem = self._subsystems.get(name)
+            return subsystem["state"] if subsystem else None
+
+    def report(self) -> Dict:
+        """Per-subsystem state and init time for status endpoints"""
+        with self._lock:
+            subsystems = {}
+            for name, subsystem in self._subsystems.items():
+                entry = {"state": subsystem["state"], "seconds": subsystem["seconds"]}
+                if subsystem["error"]:
+                    entry["error"] = subsystem["error"]
+                subsystems[name] = entry
+            return {"uptime": round(time.monotonic() - self.started, 1), "subsystems": subsystems}
+
+    def summary(self) -> str:
+        """One line per subsystem, for the startup banner"""
+        lines = []
+        for name, entry in self.report()["subsystems"].items():
+            if entry["state"] == PENDING:
+                lines.append(f"{name}: still initializing")
+            elif entry["state"] == FAILED:
+                lines.append(f"{name}: failed after {entry['seconds']:.2f}s ({entry['error']})")
+            else:
+                lines.append(f"{name}: {entry['seconds']:.2f}s")
+        return "\n".join(lines)
+
+    def _register(self, name: str):
+        with self._lock:
+            self._subsystems[name] = {
+                "state": PENDING, "seconds": None, "error": None, "result": None, "event": threading.Event(),
+            }
+
+    def _run(self, name: str, init: Callable[[], Any]):
+        """Background thread body of one subsystem"""
+        start = time.monotonic()
+        try:
+            result = init()
+        except Exception as e:
+            self._finish(name, start, error=e)
+            return
+        self._finish(name, start, result=result)
+
+    def _finish(self, name: str, start: float, result: Any = None, error: Optional[Exception] = None):
+        """Record a subsystem's outcome and run its on_ready callbacks"""
+        seconds = round(time.monotonic() - start, 2)
+        with self._lock:
+            subsystem = self._subsystems[name]
+            subsystem.update(state=FAILED if error else READY, seconds=seconds, result=result)
+            subsystem["error"] = str(error) if error else None
+            callbacks = self._callbacks.pop(name, [])
+        subsystem["event"].set()
+
+        if error:
+            logger.error(f"[STARTUP] {name} failed after {seconds:.2f}s: {error}")
+            return
+        logger.info(f"[STARTUP] {name} ready in {seconds:.2f}s")
+        for callback in callbacks:
+            self._notify(name, callback, result)
+
+    @staticmethod
+    def _notify(name: str, callback: Callable[[Any], None], result: Any):
+        try:
+            callback(result)
+        except Exception as e:
+            logger.error(f"[STARTUP] on_ready callback for {name} failed: {e}")
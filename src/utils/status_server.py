@@ -0,0 +1,83 @@
+"""Minimal HTTP server for operational endpoints (usage, metrics) on a daemon thread"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+from loguru import logger
+
+
+# Route handler: Callable(query params) -> (content type, body) or a JSON-serializable object
+RouteHandler = Callable[[Dict[str, str]], Any]
+
+
+class StatusServer:
+    """Serves registered GET routes - read-only, meant for an internal port"""
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        """
+        Initialize the server (call start() to listen)
+
+        Args:
+            port: TCP port
+            host: Interface to bind - loopback by default, since routes expose lead
+                phone numbers and there is no authentication
+        """
+        self.port = port
+        self.host = host
+        self.routes: Dict[str, RouteHandler] = {}
+
+    def route(self, path: str, handler: RouteHandler):
+        """
+        Register a GET route
+
+        Args:
+            path: URL path, e.g. "/usage"
+            handler: Callable(query params) returning (content_type, body) or an object sent as JSON
+        """
+        self.routes[path] = handler
+
+    def start(self):
+        """Start listening on a daemon thread"""
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                handler = routes.get(url.path)
+                if handler is None:
+                    self._send(404, "text/plain; charset=utf-8", f"Not found. Routes: {', '.join(sorted(routes))}\n")
+                    return
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    content_type, body = _response(handler(params))
+                    self._send(200, content_type, body)
+                except ValueError as e:
+                    self._send(400, "text/plain; charset=utf-8", f"{e}\n")
+                except Exception as e:
+                    logger.error(f"[HTTP] {url.path} failed: {e}")
+                    self._send(500, "text/plain; charset=utf-8", "Internal error\n")
+
+            def _send(self, status: int, content_type: str, body):
+                data = body.encode("utf-8") if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the log
+
+        server = ThreadingHTTPServer((self.host, self.port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="status-http", daemon=True).start()
+        logger.info(f"[HTTP] Status server on {self.host}:{self.port}: {', '.join(sorted(routes))}")
+
+
+def _response(result: Any) -> Tuple[str, Any]:
+    """Normalize a handler result to (content type, body)"""
+    if isinstance(result, tuple) and len(result) == 2:
+        return result
+    return "application/json; charset=utf-8", json.dumps(result, ensure_ascii=False, indent=2)
@@ -0,0 +1,279 @@
+"""Per-message tracing - sampled spans across the reply pipeline, exported to JSONL or an OTLP/HTTP collector"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+from loguru import logger
+
+
+class Span:
+    """One timed stage of a trace. Spans without a trace (parent None) record nothing."""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "start", "end_time", "status", "attributes", "sampled")
+
+    def __init__(
+        self,
+        tracer: Optional["Tracer"],
+        trace_id: Optional[str],
+        name: str,
+        parent_id: Optional[str] = None,
+        sampled: bool = False,
+        start: Optional[float] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start if start is not None else time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self.attributes = dict(attributes or {})
+        self.sampled = sampled
+
+    @property
+    def short_id(self) -> str:
+        """Trace ID prefix for log lines ("-" without a trace)"""
+        return self.trace_id[:8] if self.trace_id else "-"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, status: Optional[str] = None, end: Optional[float] = None, **attributes):
+        """Finish the span and hand it to the exporter (only the first call counts)"""
+        if self.end_time is not None:
+            return
+        self.end_time = end if end is not None else time.time()
+        if status:
+            self.status = status
+        self.attributes.update(attributes)
+        if self.tracer and self.sampled:
+            self.tracer._export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "end": round(self.end_time, 6),
+            "duration": round(self.end_time - self.start, 6),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Creates traces and their spans.
+
+    A trace is sampled (kept with probability ``sample_rate``) when it
+    starts; all its spans follow that decision. Parents are passed
+    explicitly, so a span can be started on one thread and its children
+    on others. Passing parent=None gives a span that records nothing,
+    so callers don't need to check whether they have a trace.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        """
+        Initialize the tracer
+
+        Args:
+            exporter: JsonlExporter / OtlpExporter finished spans go to (None = tracing off)
+            sample_rate: Fraction of traces kept (0..1)
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.stats = {"traces": 0, "sampled": 0, "spans": 0}
+
+    def start_trace(self, name: str, **attributes) -> Span:
+        """Start a new trace; returns its root span"""
+        sampled = bool(self.exporter) and random.random() < self.sample_rate
+        self.stats["traces"] += 1
+        self.stats["sampled"] += sampled
+        return Span(self, os.urandom(16).hex(), name, sampled=sampled, attributes=attributes)
+
+    def start_span(self, name: str, parent: Optional[Span], **attributes) -> Span:
+        """Start a child span of parent (call .end() on it)"""
+        if parent is None or parent.trace_id is None:
+            return Span(None, None, name)
+        return Span(self, parent.trace_id, name, parent_id=parent.span_id, sampled=parent.sampled, attributes=attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span], **attributes) -> Iterator[Span]:
+        """Child span covering the with-block; an exception marks it as an error"""
+        span = self.start_span(name, parent, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.end(status="error", error=str(e)[:200])
+            raise
+        span.end()
+
+    def record(
+        self, name: str, parent: Optional[Span], start: float, end: Optional[float] = None,
+        status: Optional[str] = None, **attributes,
+    ) -> Span:
+        """Add a child span measured after the fact (e.g. time spent waiting in a queue)"""
+        span = self.start_span(name, parent, **attributes)
+        span.start = start
+        span.end(status=status, end=end)
+        return span
+
+    def _export(self, span: Span):
+        self.stats["spans"] += 1
+        self.exporter.export(span.to_dict())
+
+
+class _BatchExporter:
+    """Queues finished spans and exports them in batches on a background thread"""
+
+    name = "exporter"
+
+    def __init__(self, flush_interval: float = 2.0, max_queue: int = 10000):
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self.stats = {"exported": 0, "dropped": 0, "errors": 0}
+        threading.Thread(target=self._export_loop, name=f"trace-{self.name}", daemon=True).start()
+
+    def export(self, span: Dict):
+        """Queue a finished span (dropped if the exporter is falling behind)"""
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _export_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while time.time() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                self.stats["exported"] += len(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"[TRACE] Failed to export {len(batch)} spans: {e}")
+
+    def _write(self, batch: List[Dict]):
+        raise NotImplementedError
+
+
+class JsonlExporter(_BatchExporter):
+    """Appends spans to a JSONL file, one span per line (rotated to <name>.1 past max_bytes)"""
+
+    name = "jsonl"
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = 50_000_000, **kwargs):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        super().__init__(**kwargs)
+
+    def _write(self, batch: List[Dict]):
+        if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+            self.path.replace(self.path.with_name(self.path.name + ".1"))
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in batch:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+
+class OtlpExporter(_BatchExporter):
+    """Posts spans to an OTLP/HTTP collector (JSON encoding, e.g. http://localhost:4318/v1/traces)"""
+
+    name = "otlp"
+
+    def __init__(self, endpoint: str, service_name: str = "whatsapp-bot", timeout: float = 5.0, **kwargs):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def _write(self, batch: List[Dict]):
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "bot"}, "spans": [_otlp_span(span) for span in batch]}],
+            }]
+        }).encode("utf-8")
+        request = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def _otlp_span(span: Dict) -> Dict:
+    otlp = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(int(span["start"] * 1e9)),
+        "endTimeUnixNano": str(int(span["end"] * 1e9)),
+        "attributes": [_otlp_attribute(key, value) for key, value in span["attributes"].items()],
+        "status": {"code": 2 if span["status"] == "error" else 1},
+    }
+    if span["parent_id"]:
+        otlp["parentSpanId"] = span["parent_id"]
+    return otlp
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def load_traces(path: Union[str, Path]) -> Dict[str, List[Dict]]:
+    """Spans of a JSONL trace file grouped by trace ID (rotated <name>.1 included)"""
+    path = Path(path)
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    for file in (path.with_name(path.name + ".1"), path):
+        if not file.exists():
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue  # Partially written last line
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def slowest_traces(traces: Dict[str, List[Dict]], limit: int = 10, since: Optional[float] = None) -> List[Dict]:
+    """
+    Traces ordered by their root span's duration, slowest first
+
+    Args:
+        traces: {trace_id: spans} as from load_traces
+        limit: Max traces returned
+        since: Only traces whose root started at or after this timestamp
+
+    Returns:
+        [{"trace_id", "root", "spans"}] with spans ordered by start time
+    """
+    result = []
+    for trace_id, spans in traces.items():
+        roots = [span for span in spans if not span["parent_id"]]
+        if not roots or (since and roots[0]["start"] < since):
+            continue  # Root not exported yet (still in flight) or too old
+        result.append({"trace_id": trace_id, "root": roots[0], "spans": sorted(spans, key=lambda span: span["start"])})
+    result.sort(key=lambda trace: trace["root"]["duration"], reverse=True)
+    return result[:limit]
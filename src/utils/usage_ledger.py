@@ -0,0 +1,259 @@
+"""Append-only usage ledger of model calls (SQLite) with per-lead/day/task/model rollups"""
+
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from loguru import logger
+
+
+ROLLUP_DIMENSIONS = ("day", "lead", "task", "model")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    lead TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_write_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_lead ON calls (lead, ts);
+
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    lead TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_write_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, lead, task, model)
+);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO daily VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, lead, task, model) DO UPDATE SET
+    calls = calls + 1,
+    errors = errors + excluded.errors,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    cache_write_tokens = cache_write_tokens + excluded.cache_write_tokens,
+    cache_read_tokens = cache_read_tokens + excluded.cache_read_tokens,
+    latency = latency + excluded.latency,
+    cost = cost + excluded.cost
+"""
+
+
+class UsageLedger:
+    """Records every model call to a local SQLite file.
+
+    ``record`` only enqueues - a writer thread appends the calls in
+    batches and keeps a per-day aggregate table up to date, so rollups
+    read a few rows per day instead of scanning every call.
+    """
+
+    def __init__(self, path: Union[str, Path], flush_interval: float = 1.0):
+        """
+        Open (or create) the ledger
+
+        Args:
+            path: SQLite file
+            flush_interval: Max seconds a recorded call waits before it is written
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="usage-ledger", daemon=True)
+        self._writer.start()
+
+        logger.info(f"[USAGE] Ledger at {self.path}")
+
+    def record(
+        self,
+        task: str,
+        model: str,
+        lead: Optional[str] = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        latency: float = 0.0,
+        cost: float = 0.0,
+        status: str = "ok",
+    ):
+        """
+        Record one model call (non-blocking)
+
+        Args:
+            task: Call type ("reply", "analysis", "compaction", ...)
+            model: Model name
+            lead: Lead phone (None for calls not tied to a lead)
+            input_tokens: Uncached input tokens
+            output_tokens: Output tokens
+            cache_write_tokens: Prompt-cache write tokens
+            cache_read_tokens: Prompt-cache read tokens
+            latency: Seconds the call took
+            cost: USD
+            status: "ok" or the error type of a failed call
+        """
+        ts = time.time()
+        self._queue.put((
+            ts, datetime.fromtimestamp(ts).strftime("%Y-%m-%d"), task, model, lead or "-", status,
+            int(input_tokens), int(output_tokens), int(cache_write_tokens), int(cache_read_tokens),
+            float(latency), float(cost),
+        ))
+
+    def rollup(
+        self,
+        by: str = "day",
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        lead: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Aggregate usage by one dimension
+
+        Args:
+            by: "day", "lead", "task" or "model"
+            since: First day (YYYY-MM-DD), inclusive
+            until: Last day (YYYY-MM-DD), inclusive
+            lead: Only this lead
+            limit: Max rows (highest cost first; days are listed newest first)
+
+        Returns:
+            [{by, calls, errors, input_tokens, output_tokens, cache_write_tokens,
+              cache_read_tokens, avg_latency, cost}]
+        """
+        if by not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"Unknown rollup dimension: {by} (use one of {', '.join(ROLLUP_DIMENSIONS)})")
+
+        where, args = self._filters(since, until, lead)
+        order = "day DESC" if by == "day" else "total_cost DESC"
+        sql = (
+            f"SELECT {by}, SUM(calls), SUM(errors), SUM(input_tokens), SUM(output_tokens), "
+            f"SUM(cache_write_tokens), SUM(cache_read_tokens), SUM(latency), SUM(cost) AS total_cost "
+            f"FROM daily {where} GROUP BY {by} ORDER BY {order}"
+        )
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        return [self._row(by, row) for row in self._query(sql, args)]
+
+    def totals(self, since: Optional[str] = None, until: Optional[str] = None, lead: Optional[str] = None) -> Dict:
+        """Totals over the period (same fields as a rollup row)"""
+        where, args = self._filters(since, until, lead)
+        sql = (
+            "SELECT 'total', SUM(calls), SUM(errors), SUM(input_tokens), SUM(output_tokens), "
+            "SUM(cache_write_tokens), SUM(cache_read_tokens), SUM(latency), SUM(cost) "
+            f"FROM daily {where}"
+        )
+        return self._row("period", self._query(sql, args)[0])
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything recorded so far is written"""
+        deadline = time.time() + timeout
+        while not self._queue.empty() or self._queue.unfinished_tasks:
+            if time.time() > deadline:
+                break
+            time.sleep(0.05)
+
+    def _connect(self) -> sqlite3.Connection:
+        """New connection (one per thread/query - SQLite connections aren't shared)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _query(self, sql: str, args: List) -> List[tuple]:
+        """Run a read query on a short-lived connection"""
+        conn = self._connect()
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def _write_loop(self):
+        """Writer thread - append queued calls in batches"""
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while time.time() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO calls (ts, day, task, model, lead, status, input_tokens, output_tokens, "
+                        "cache_write_tokens, cache_read_tokens, latency, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                    conn.executemany(_UPSERT_DAILY, [
+                        (day, lead, task, model, 0 if status == "ok" else 1, *tokens, latency, cost)
+                        for _, day, task, model, lead, status, *tokens, latency, cost in batch
+                    ])
+            except sqlite3.Error as e:
+                logger.error(f"[USAGE] Failed to write {len(batch)} calls: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _filters(since: Optional[str], until: Optional[str], lead: Optional[str]):
+        """WHERE clause for the daily table"""
+        clauses, args = [], []
+        if since:
+            clauses.append("day >= ?")
+            args.append(since)
+        if until:
+            clauses.append("day <= ?")
+            args.append(until)
+        if lead:
+            clauses.append("lead = ?")
+            args.append(lead)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    @staticmethod
+    def _row(key: str, row: tuple) -> Dict:
+        """Rollup row as a dict"""
+        name, calls, errors, tokens_in, tokens_out, cache_write, cache_read, latency, cost = row
+        calls = calls or 0
+        return {
+            key: name,
+            "calls": calls,
+            "errors": errors or 0,
+            "input_tokens": tokens_in or 0,
+            "output_tokens": tokens_out or 0,
+            "cache_write_tokens": cache_write or 0,
+            "cache_read_tokens": cache_read or 0,
+            "avg_latency": round((latency or 0) / calls, 3) if calls else 0.0,
+            "cost": round(cost or 0, 6),
+        }
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_anthropic import FakeAnthropic
+
+
+@pytest.fixture
+def fake_api():
+    """Fake Anthropic API on a free local port"""
+    fake = FakeAnthropic().start()
+    yield fake
+    fake.stop()
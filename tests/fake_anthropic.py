@@ -0,0 +1,202 @@
+"""Local fake of the Anthropic Messages and Message Batches API, with injectable latency and errors
+
+Used by the tests, and by hand to see how the bot behaves when the API is
+slow or failing:
+
+    python tests/fake_anthropic.py --port 8090 --latency 2 --error-rate 0.3
+    ANTHROPIC_BASE_URL=http://localhost:8090 python run_bot.py
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+class FakeAnthropic:
+    """Serves /v1/messages and /v1/messages/batches from a local thread.
+
+    Faults are scripted per call with ``fail`` and ``delay`` (consumed in
+    order), or drawn at random with ``error_rate`` / ``latency`` once the
+    script is empty. Batches end after ``polls_until_ended`` retrieves.
+    """
+
+    def __init__(self, port: int = 0, reply_text: str = "ok", error_rate: float = 0.0, latency: float = 0.0):
+        """
+        Initialize the fake API
+
+        Args:
+            port: Port to listen on (0 = any free port)
+            reply_text: Text of every reply (see batch_reply for batch results)
+            error_rate: Fraction of unscripted /v1/messages calls answered with 529
+            latency: Seconds every unscripted /v1/messages call takes
+        """
+        self.reply_text = reply_text
+        self.error_rate = error_rate
+        self.latency = latency
+        self.batch_reply: Callable[[str, Dict], str] = lambda custom_id, params: self.reply_text
+        self.polls_until_ended = 0
+
+        self.requests: List[Dict] = []  # {"method", "path", "body"} of every request received
+        self.batches: Dict[str, Dict] = {}
+        self._faults: deque = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeAnthropic":
+        threading.Thread(target=self._server.serve_forever, name="fake-anthropic", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail(self, status: int = 529, times: int = 1, retry_after: Optional[float] = None):
+        """Answer the next `times` message calls with an error status"""
+        for _ in range(times):
+            self._faults.append({"status": status, "delay": 0.0, "retry_after": retry_after})
+
+    def delay(self, seconds: float, times: int = 1):
+        """Answer the next `times` message calls successfully after `seconds`"""
+        for _ in range(times):
+            self._faults.append({"status": 200, "delay": seconds, "retry_after": None})
+
+    def message_calls(self) -> int:
+        """Number of POST /v1/messages requests received"""
+        return sum(1 for r in self.requests if r["method"] == "POST" and r["path"] == "/v1/messages")
+
+    def _next_fault(self) -> Dict:
+        with self._lock:
+            if self._faults:
+                return self._faults.popleft()
+        status = 529 if random.random() < self.error_rate else 200
+        return {"status": status, "delay": self.latency, "retry_after": None}
+
+    def _message(self, text: str, model: str) -> Dict:
+        return {
+            "id": f"msg_{next(self._ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 5},
+        }
+
+    def _batch_object(self, batch: Dict) -> Dict:
+        ended = batch["polls"] >= self.polls_until_ended
+        count = len(batch["requests"])
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": "2025-01-01T00:00:00Z",
+            "expires_at": "2025-01-02T00:00:00Z",
+            "ended_at": "2025-01-01T00:05:00Z" if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body, headers: Optional[Dict] = None):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _record(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with fake._lock:
+                    fake.requests.append({"method": self.command, "path": self.path, "body": body})
+                return body
+
+            def do_POST(self):
+                body = self._record()
+                if self.path == "/v1/messages":
+                    fault = fake._next_fault()
+                    time.sleep(fault["delay"])
+                    if fault["status"] != 200:
+                        headers = {"retry-after": str(fault["retry_after"])} if fault["retry_after"] is not None else {}
+                        error = {"type": "error", "error": {"type": "overloaded_error", "message": "Injected fault"}}
+                        return self._send_json(fault["status"], error, headers)
+                    return self._send_json(200, fake._message(fake.reply_text, body.get("model", "")))
+
+                if self.path == "/v1/messages/batches":
+                    batch = {"id": f"msgbatch_{next(fake._ids)}", "requests": body["requests"], "polls": 0}
+                    fake.batches[batch["id"]] = batch
+                    return self._send_json(200, fake._batch_object(batch))
+
+                self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+            def do_GET(self):
+                self._record()
+                match = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", self.path)
+                batch = fake.batches.get(match.group(1)) if match else None
+                if not batch:
+                    return self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+                if not match.group(2):
+                    batch["polls"] += 1
+                    return self._send_json(200, fake._batch_object(batch))
+
+                lines = []
+                for request in batch["requests"]:
+                    text = fake.batch_reply(request["custom_id"], request["params"])
+                    message = fake._message(text, request["params"].get("model", ""))
+                    lines.append(json.dumps({"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": message}}))
+                self._send_json(200, "\n".join(lines).encode("utf-8"))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Anthropic API with injected latency and errors")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each message call takes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of message calls answered with 529")
+    parser.add_argument("--reply", default="ok", help="Text of every reply")
+    args = parser.parse_args()
+
+    fake = FakeAnthropic(args.port, reply_text=args.reply, error_rate=args.error_rate, latency=args.latency)
+    print(f"Fake Anthropic API on {fake.url} (latency={args.latency}s, error rate={args.error_rate:.0%})")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
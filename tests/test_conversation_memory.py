@@ -0,0 +1,65 @@
+from src.utils.conversation_memory import ConversationMemory
+
+
+def turns(*texts):
+    return [{"role": "user", "content": text} for text in texts]
+
+
+def test_compaction_folds_turns_into_memory():
+    memory = ConversationMemory(lambda phone, current, dropped: {"summary": f"{len(dropped)} turns", "facts": {"age": "30"}})
+
+    memory.compact_async("+9721", turns("a", "b"))
+    memory._jobs.join()
+
+    assert memory.get("+9721") == {"summary": "2 turns", "facts": {"age": "30"}}
+    assert "הודעות מוקדמות" not in memory.render("+9721")
+
+
+def test_failing_summarizer_keeps_a_bounded_number_of_raw_turns():
+    memory = ConversationMemory(lambda phone, current, dropped: None, max_pending=3)
+
+    for text in ("a", "b", "c", "d", "e"):
+        memory.compact_async("+9721", turns(text))
+    memory._jobs.join()
+
+    rendered = memory.render("+9721")
+    assert "ליד: a" not in rendered and "ליד: b" not in rendered
+    assert all(f"ליד: {text}" in rendered for text in ("c", "d", "e"))
+
+
+def test_failed_compaction_backs_off():
+    calls = []
+
+    def summarizer(phone, current, dropped):
+        calls.append(len(dropped))
+        return None
+
+    memory = ConversationMemory(summarizer, retry_delay=60)
+    memory.compact_async("+9721", turns("a"))
+    memory._jobs.join()
+    memory.compact_async("+9721", turns("b"))
+    memory._jobs.join()
+
+    assert calls == [1]
+
+    memory._failures["+9721"]["retry_at"] = 0  # Back-off over
+    memory.compact_async("+9721", turns("c"))
+    memory._jobs.join()
+
+    assert calls == [1, 3]
+    assert memory._failures["+9721"]["count"] == 2
+
+
+def test_least_recently_used_leads_are_forgotten():
+    memory = ConversationMemory(lambda phone, current, dropped: {"summary": phone, "facts": {}}, max_leads=2)
+
+    for phone in ("+9721", "+9722"):
+        memory.compact_async(phone, turns("a"))
+        memory._jobs.join()
+    memory.render("+9721")
+    memory.compact_async("+9723", turns("a"))
+    memory._jobs.join()
+
+    assert memory.get("+9721")["summary"] == "+9721"
+    assert memory.get("+9722")["summary"] == ""
+    assert memory.get("+9723")["summary"] == "+9723"
@@ -0,0 +1,30 @@
+from src.utils.history_loader import message_content, parse_chat_history
+
+
+CHAT = "972501234567@c.us"
+
+
+def test_media_records_become_placeholder_turns():
+    records = [  # getChatHistory order: newest first
+        {"type": "outgoing", "typeMessage": "textMessage", "textMessage": "מה דעתך?"},
+        {"type": "incoming", "typeMessage": "imageMessage", "caption": "זה אני באימון"},
+        {"type": "outgoing", "typeMessage": "extendedTextMessage", "textMessage": "שלח תמונה"},
+        {"type": "incoming", "typeMessage": "audioMessage"},
+    ]
+
+    assert parse_chat_history(records, CHAT) == [
+        {"role": "user", "content": "[voice message]"},
+        {"role": "assistant", "content": "שלח תמונה"},
+        {"role": "user", "content": "[image] זה אני באימון"},
+        {"role": "assistant", "content": "מה דעתך?"},
+    ]
+
+
+def test_message_content_reads_webhook_shapes():
+    assert message_content({"typeMessage": "textMessage", "textMessageData": {"textMessage": "היי"}}) == "היי"
+    assert message_content({"typeMessage": "documentMessage", "fileMessageData": {"caption": " "}}) == "[document]"
+    assert message_content({"typeMessage": "locationMessage", "locationMessageData": {"latitude": 32.1}}) == "[location]"
+
+
+def test_unknown_types_have_no_content():
+    assert message_content({"typeMessage": "reactionMessage", "extendedTextMessageData": {"text": "👍"}}) == ""
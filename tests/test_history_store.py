@@ -0,0 +1,45 @@
+import threading
+
+from src.agents.history_store import InMemoryHistoryStore
+
+
+def msgs(*texts, role="user"):
+    return [{"role": role, "content": text} for text in texts]
+
+
+def test_prepend_puts_context_first_and_counts_only_it():
+    store = InMemoryHistoryStore()
+    store.append("+9721", "user", "new question")
+    store.append("+9721", "assistant", "answer")
+
+    store.prepend("+9721", msgs("old 1", "old 2"))
+
+    assert [m["content"] for m in store.get("+9721")] == ["old 1", "old 2", "new question", "answer"]
+    assert store.seq("+9721") == 4
+
+
+def test_prepend_keeps_concurrent_appends():
+    store = InMemoryHistoryStore(max_messages=10_000)
+    store.append("+9721", "user", "first")
+
+    appender = threading.Thread(target=lambda: [store.append("+9721", "user", f"m{n}") for n in range(500)])
+    appender.start()
+    for n in range(50):
+        store.prepend("+9721", msgs(f"old {n}"))
+    appender.join()
+
+    contents = [m["content"] for m in store.get("+9721")]
+    assert len(contents) == 551
+    assert store.seq("+9721") == 551
+    assert all(f"m{n}" in contents for n in range(500))
+
+
+def test_prepend_overflow_goes_to_on_trim():
+    trimmed = []
+    store = InMemoryHistoryStore(max_messages=4, on_trim=lambda session, dropped: trimmed.extend(dropped))
+    store.append("+9721", "user", "now")
+
+    store.prepend("+9721", msgs("a", "b", "c", "d", "e"))
+
+    assert [m["content"] for m in store.get("+9721")] == ["c", "d", "e", "now"]
+    assert [m["content"] for m in trimmed] == ["a", "b"]
@@ -0,0 +1,121 @@
+import pytest
+
+from src.utils.metrics import MetricsRegistry
+
+
+def test_counter_exposes_total_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("bot_errors", "Errors by subsystem", labels=("subsystem",))
+
+    counter.inc(subsystem="sheets")
+    counter.inc(2, subsystem="sheets")
+    counter.inc(subsystem="claude")
+
+    text = registry.exposition()
+    assert "# HELP bot_errors_total Errors by subsystem\n# TYPE bot_errors_total counter\n" in text
+    assert 'bot_errors_total{subsystem="claude"} 1\n' in text
+    assert 'bot_errors_total{subsystem="sheets"} 3\n' in text
+
+
+def test_counter_rejects_decrease_and_wrong_labels():
+    counter = MetricsRegistry().counter("bot_incoming", "Incoming", labels=("source",))
+
+    with pytest.raises(ValueError):
+        counter.inc(-1, source="webhook")
+    with pytest.raises(ValueError):
+        counter.inc(chat="x")
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("bot_events", "Events", labels=("name",)).inc(name='say "hi"\\\nbye')
+
+    assert 'bot_events_total{name="say \\"hi\\"\\\\\\nbye"} 1' in registry.exposition()
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bot_stage_seconds", "Stage latency", labels=("stage",), buckets=(0.1, 1, 10))
+
+    for value in (0.05, 0.1, 0.5, 3, 30):
+        histogram.observe(value, stage="send")
+
+    lines = registry.exposition().splitlines()
+    assert lines[:2] == ["# HELP bot_stage_seconds Stage latency", "# TYPE bot_stage_seconds histogram"]
+    assert lines[2:] == [
+        'bot_stage_seconds_bucket{stage="send",le="0.1"} 2',
+        'bot_stage_seconds_bucket{stage="send",le="1"} 3',
+        'bot_stage_seconds_bucket{stage="send",le="10"} 4',
+        'bot_stage_seconds_bucket{stage="send",le="+Inf"} 5',
+        'bot_stage_seconds_sum{stage="send"} 33.65',
+        'bot_stage_seconds_count{stage="send"} 5',
+    ]
+    assert histogram.count(stage="send") == 5
+
+
+def test_histogram_time_observes_when_block_raises():
+    histogram = MetricsRegistry().histogram("bot_call_seconds", "Calls")
+
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("boom")
+
+    assert histogram.count() == 1
+
+
+def test_histogram_reserves_le_label():
+    with pytest.raises(ValueError):
+        MetricsRegistry().histogram("bot_bad_seconds", "Bad", labels=("le",))
+
+
+def test_gauge_set_and_function():
+    registry = MetricsRegistry()
+    registry.gauge("bot_queue", "Queue depth", labels=("queue",)).set(4, queue="reply")
+    depth = [7]
+    registry.gauge("bot_buffer", "Buffered chats", function=lambda: depth[0])
+
+    text = registry.exposition()
+    assert "bot_buffer 7\n" in text
+    assert 'bot_queue{queue="reply"} 4\n' in text
+
+
+def test_failing_gauge_function_leaves_a_gap():
+    registry = MetricsRegistry()
+    registry.gauge("bot_outbox", "Outbox depth", function=lambda: 1 / 0)
+
+    assert registry.exposition() == "# HELP bot_outbox Outbox depth\n# TYPE bot_outbox gauge\n"
+
+
+def test_registering_again_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("bot_sends", "Sends", labels=("kind",))
+    second = registry.counter("bot_sends", "Sends", labels=("kind",))
+
+    assert first is second
+
+
+def test_registering_again_rebinds_gauge_function():
+    registry = MetricsRegistry()
+    registry.gauge("bot_buffer", "Buffered chats", function=lambda: 1)
+    registry.gauge("bot_buffer", "Buffered chats", function=lambda: 2)
+
+    assert "bot_buffer 2\n" in registry.exposition()
+
+
+def test_registering_with_other_type_or_labels_fails():
+    registry = MetricsRegistry()
+    registry.counter("bot_sends", "Sends", labels=("kind",))
+
+    with pytest.raises(ValueError):
+        registry.gauge("bot_sends", "Sends")
+    with pytest.raises(ValueError):
+        registry.counter("bot_sends", "Sends", labels=("kind", "lead"))
+
+
+def test_exposition_is_sorted_by_name():
+    registry = MetricsRegistry()
+    registry.counter("bot_b", "B").inc()
+    registry.counter("bot_a", "A").inc()
+
+    names = [line.split()[2] for line in registry.exposition().splitlines() if line.startswith("# TYPE")]
+    assert names == ["bot_a_total", "bot_b_total"]
@@ -0,0 +1,39 @@
+from src.agents.history_store import InMemoryHistoryStore
+from src.utils.outbox import Outbox, reply_key
+
+
+def make_outbox(tmp_path):
+    # Sending is never due within the test - only the idempotency keys matter
+    return Outbox(tmp_path / "outbox.db", send=lambda chat_id, text: None, rate=0)
+
+
+def test_reply_keys_survive_history_eviction_and_reload(tmp_path):
+    outbox = make_outbox(tmp_path)
+    store = InMemoryHistoryStore(max_sessions=1)
+    phone = "+972501234567"
+
+    for turn in range(10):
+        store.append(phone, "user" if turn % 2 == 0 else "assistant", f"msg {turn}")
+    seq_before = store.seq(phone)
+    assert outbox.enqueue("chat", "reply 1", key=reply_key(phone, "MSG-A"), delay=3600)
+
+    # Evicted by another lead, then reloaded with a shorter history
+    store.append("+972509999999", "user", "hi")
+    store.replace(phone, [{"role": "user", "content": f"msg {n}"} for n in range(6)])
+    store.append(phone, "user", "new question")
+    assert store.seq(phone) < seq_before  # A history-position key would repeat here
+
+    assert outbox.enqueue("chat", "reply 2", key=reply_key(phone, "MSG-B"), delay=3600)
+
+
+def test_same_batch_is_answered_once(tmp_path):
+    outbox = make_outbox(tmp_path)
+    key = reply_key("+972501234567", "MSG-A")
+
+    assert outbox.enqueue("chat", "reply", key=key, delay=3600)
+    assert not outbox.enqueue("chat", "reply again", key=key, delay=3600)
+    assert outbox.stats["duplicates"] == 1
+
+
+def test_reply_key_without_message_id_is_unique():
+    assert reply_key("+972501234567", "") != reply_key("+972501234567", "")
@@ -0,0 +1,92 @@
+import json
+
+import anthropic
+import pytest
+
+import reanalyze_leads
+from reanalyze_leads import build_diff, collect_results, custom_id_for, load_state, save_state, submit_batches, wait_for_batches
+
+
+def conversations(*phones):
+    return [({"phone": phone}, f"user: שלום מ-{phone}") for phone in phones]
+
+
+@pytest.fixture
+def client(fake_api):
+    return anthropic.Anthropic(api_key="test", base_url=fake_api.url)
+
+
+def test_submit_batches_splits_and_records_leads(fake_api, client, monkeypatch):
+    monkeypatch.setattr(reanalyze_leads, "MAX_REQUESTS_PER_BATCH", 2)
+
+    batches = submit_batches(client, "claude-test", conversations("+9721", "+9722", "+9723"))
+
+    assert [len(entry["leads"]) for entry in batches] == [2, 1]
+    assert batches[0]["leads"] == {custom_id_for("+9721"): "+9721", custom_id_for("+9722"): "+9722"}
+    request = fake_api.batches[batches[0]["id"]]["requests"][0]
+    assert request["params"]["model"] == "claude-test"
+    assert request["params"]["messages"][0]["content"] == "user: שלום מ-+9721"
+
+
+def test_submit_batches_skips_duplicate_phones(fake_api, client):
+    batches = submit_batches(client, "claude-test", conversations("+9721", "+9722", "+9721"))
+
+    requests = fake_api.batches[batches[0]["id"]]["requests"]
+    assert [r["custom_id"] for r in requests] == [custom_id_for("+9721"), custom_id_for("+9722")]
+
+
+def test_state_is_saved_after_every_batch(fake_api, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(reanalyze_leads, "MAX_REQUESTS_PER_BATCH", 1)
+    state_file = tmp_path / "state.json"
+    state = {"created_at": "now", "model": "claude-test", "batches": [], "submitted": False, "written": False}
+
+    def interrupted():
+        yield from conversations("+9721", "+9722")
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        submit_batches(client, "claude-test", interrupted(), batches=state["batches"], save=lambda: save_state(state_file, state))
+
+    saved = load_state(state_file)
+    assert len(saved["batches"]) == 2
+    assert not saved["submitted"]
+
+
+def test_resume_submits_only_remaining_leads(fake_api, client):
+    batches = submit_batches(client, "claude-test", conversations("+9721", "+9722"))
+
+    submit_batches(client, "claude-test", conversations("+9721", "+9722", "+9723"), batches=batches)
+
+    assert len(batches) == 2
+    assert list(batches[1]["leads"].values()) == ["+9723"]
+    assert len(fake_api.batches) == 2
+
+
+def test_wait_and_collect_results(fake_api, client):
+    fake_api.polls_until_ended = 2
+    fake_api.batch_reply = lambda custom_id, params: (
+        "not json" if custom_id == custom_id_for("+9722")
+        else json.dumps({"match_score": 8, "status": "בשיחה", "summary": custom_id})
+    )
+    batches = submit_batches(client, "claude-test", conversations("+9721", "+9722"))
+
+    wait_for_batches(client, batches, poll_interval=0)
+    analyses = collect_results(client, batches)
+
+    assert fake_api.batches[batches[0]["id"]]["polls"] >= 2  # Polled until ended
+    assert analyses == {"+9721": {"match_score": 8, "status": "בשיחה", "summary": custom_id_for("+9721")}}
+
+
+def test_build_diff_reports_changed_fields_only():
+    leads = {
+        "+9721": {"phone": "+9721", "match_score": "5", "status": "חדש", "location": "תל אביב"},
+        "+9722": {"phone": "+9722", "match_score": "7", "status": "בשיחה"},
+    }
+    analyses = {
+        "+9721": {"match_score": 8, "status": "בשיחה", "location": "תל אביב", "summary": "..."},
+        "+9722": {"match_score": 7, "status": "בשיחה"},
+    }
+
+    diff = build_diff(leads, analyses)
+
+    assert diff == {"+9721": {"match_score": ("5", "8"), "status": ("חדש", "בשיחה")}}
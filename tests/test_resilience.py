@@ -0,0 +1,181 @@
+import time
+
+import anthropic
+import pytest
+
+from src.agents.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceededError, ResilientClient
+
+
+PARAMS = {"model": "claude-test", "max_tokens": 16, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def make_client(fake_api, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    client = anthropic.Anthropic(api_key="test", base_url=fake_api.url)
+    return ResilientClient(client, **kwargs)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_retries_overloaded_then_succeeds(fake_api):
+    fake_api.fail(529, times=2)
+    resilient = make_client(fake_api)
+
+    response = resilient.create(**PARAMS)
+
+    assert response.content[0].text == "ok"
+    assert fake_api.message_calls() == 3
+    assert resilient.stats["retries"] == 2
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_gives_up_after_max_retries(fake_api):
+    fake_api.fail(500, times=5)
+    resilient = make_client(fake_api, max_retries=2)
+
+    with pytest.raises(anthropic.InternalServerError):
+        resilient.create(**PARAMS)
+
+    assert fake_api.message_calls() == 3
+    assert resilient.stats["failures"] == 1
+
+
+def test_honors_retry_after(fake_api):
+    fake_api.fail(429, retry_after=0.3)
+    resilient = make_client(fake_api)
+
+    start = time.monotonic()
+    resilient.create(**PARAMS)
+
+    assert time.monotonic() - start >= 0.3
+
+
+def test_client_error_is_not_retried_and_keeps_circuit_closed(fake_api):
+    fake_api.fail(400, times=10)
+    resilient = make_client(fake_api, breaker=CircuitBreaker(failure_threshold=2))
+
+    for _ in range(3):
+        with pytest.raises(anthropic.BadRequestError):
+            resilient.create(**PARAMS)
+
+    assert fake_api.message_calls() == 3
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_covers_slow_responses(fake_api):
+    fake_api.delay(2, times=3)
+    resilient = make_client(fake_api, max_retries=0)
+
+    start = time.monotonic()
+    with pytest.raises((anthropic.APITimeoutError, DeadlineExceededError)):
+        resilient.create(deadline=0.5, **PARAMS)
+
+    assert time.monotonic() - start < 1.5
+
+
+def test_circuit_opens_after_consecutive_failures(fake_api):
+    fake_api.fail(529, times=10)
+    resilient = make_client(fake_api, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, cooldown=60))
+
+    for _ in range(2):
+        with pytest.raises(anthropic.APIStatusError):
+            resilient.create(**PARAMS)
+    with pytest.raises(CircuitOpenError):
+        resilient.create(**PARAMS)
+
+    assert resilient.breaker.state == CircuitBreaker.OPEN
+    assert fake_api.message_calls() == 2
+    assert resilient.stats["rejected"] == 1
+
+
+def test_half_open_probe_closes_circuit(fake_api):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    resilient = make_client(fake_api, breaker=breaker)
+    open_breaker(breaker)
+
+    time.sleep(0.15)
+    resilient.create(**PARAMS)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_circuit(fake_api):
+    fake_api.fail(529)
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    resilient = make_client(fake_api, max_retries=0, breaker=breaker)
+    open_breaker(breaker)
+
+    time.sleep(0.15)
+    with pytest.raises(anthropic.APIStatusError):
+        resilient.create(**PARAMS)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_unexpected_error_in_probe_does_not_leave_circuit_half_open(fake_api, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    resilient = make_client(fake_api, breaker=breaker)
+    open_breaker(breaker)
+    time.sleep(0.15)
+
+    def broken_send(params, timeout):
+        raise TypeError("unexpected keyword argument")
+
+    monkeypatch.setattr(resilient, "_send", broken_send)
+    with pytest.raises(TypeError):
+        resilient.create(**PARAMS)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # The next probe after the cooldown is let through again and closes the circuit
+    monkeypatch.undo()
+    time.sleep(0.15)
+    resilient.create(**PARAMS)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hedged_request_wins_over_slow_primary(fake_api):
+    resilient = make_client(fake_api, hedge=True, hedge_min_samples=5)
+    for _ in range(5):
+        resilient._record_latency(0.05)
+    fake_api.delay(2)
+
+    start = time.monotonic()
+    response = resilient.create(**PARAMS)
+
+    assert response.content[0].text == "ok"
+    assert time.monotonic() - start < 1
+    assert resilient.stats["hedges"] == 1
+    assert resilient.stats["hedge_wins"] == 1
+    assert fake_api.message_calls() == 2
+
+
+def test_no_hedging_before_enough_samples(fake_api):
+    resilient = make_client(fake_api, hedge=True, hedge_min_samples=5)
+    fake_api.delay(0.3)
+
+    resilient.create(**PARAMS)
+
+    assert resilient.stats["hedges"] == 0
+    assert fake_api.message_calls() == 1
+
+
+def test_losing_hedge_is_handed_to_on_discarded(fake_api):
+    resilient = make_client(fake_api, hedge=True, hedge_min_samples=5)
+    for _ in range(5):
+        resilient._record_latency(0.05)
+    fake_api.delay(0.5)
+    discarded = []
+
+    response = resilient.create(on_discarded=discarded.append, **PARAMS)
+
+    deadline = time.monotonic() + 2
+    while not discarded and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(discarded) == 1
+    assert discarded[0].id != response.id
+    assert discarded[0].usage.output_tokens == 5
@@ -0,0 +1,90 @@
+"""Slowest reply traces from the bot's trace file
+
+Every batch of lead messages is traced from the first buffered message
+to the sent reply (plus the analysis that follows). This prints the
+slowest traces with the time spent in each stage, to answer "why did
+this reply take so long".
+
+Usage:
+    python trace_report.py                        # 10 slowest traces of the last 24 hours
+    python trace_report.py --limit 20 --hours 2
+    python trace_report.py --phone +972501234567  # one lead's traces
+    python trace_report.py --trace 3f2a9c1d       # one trace (ID prefix from the log)
+"""
+
+import sys
+import json
+import argparse
+import time
+from pathlib import Path
+from datetime import datetime
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.tracing import load_traces, slowest_traces
+
+
+DEFAULT_FILE = project_root / "data" / "traces.jsonl"
+
+
+def print_trace(trace):
+    """Print one trace as a stage breakdown, children indented under their parent"""
+    root = trace["root"]
+    attrs = root["attributes"]
+    started = datetime.fromtimestamp(root["start"]).strftime("%Y-%m-%d %H:%M:%S")
+    print(
+        f"{trace['trace_id'][:8]}  {root['duration']:7.2f}s  {started}  {attrs.get('phone', '-')}  "
+        f"{attrs.get('priority', '-')}  {root['status']}"
+    )
+
+    children = {}
+    for span in trace["spans"]:
+        children.setdefault(span["parent_id"], []).append(span)
+
+    def walk(parent_id, depth):
+        for span in children.get(parent_id, []):
+            offset = span["start"] - root["start"]
+            details = " ".join(f"{key}={value}" for key, value in span["attributes"].items())
+            status = "" if span["status"] == "ok" else f" [{span['status']}]"
+            print(f"    {'  ' * depth}{span['name']:<{22 - 2 * depth}} +{offset:6.2f}s {span['duration']:7.2f}s{status}  {details}")
+            walk(span["span_id"], depth + 1)
+
+    walk(root["span_id"], 0)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slowest reply traces")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--hours", type=float, default=24, help="Only traces started in the last N hours")
+    parser.add_argument("--phone", help="Only this lead (phone as stored, e.g. +972501234567)")
+    parser.add_argument("--trace", help="Only the trace with this ID (or ID prefix)")
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a breakdown")
+    args = parser.parse_args()
+
+    if not args.file.exists():
+        print(f"No trace file at {args.file} yet - it is created when the bot traces its first reply.")
+        return
+
+    traces = load_traces(args.file)
+    if args.trace:
+        traces = {trace_id: spans for trace_id, spans in traces.items() if trace_id.startswith(args.trace)}
+    result = slowest_traces(traces, limit=len(traces), since=None if args.trace else time.time() - args.hours * 3600)
+    if args.phone:
+        result = [trace for trace in result if trace["root"]["attributes"].get("phone") == args.phone]
+    result = result[:args.limit]
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"\n{len(result)} slowest traces" + ("" if args.trace else f" of the last {args.hours:g}h") + "\n")
+    for trace in result:
+        print_trace(trace)
+
+
+if __name__ == "__main__":
+    main()
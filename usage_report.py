@@ -0,0 +1,75 @@
+"""Model usage and cost report from the usage ledger
+
+Every Claude call the bot makes (replies, analysis, compaction, ...) is
+recorded to the ledger with its tokens, latency and cost. This prints
+rollups of it.
+
+Usage:
+    python usage_report.py                      # last 7 days, per day
+    python usage_report.py --by lead --limit 20 # most expensive leads
+    python usage_report.py --by task --days 30
+    python usage_report.py --by model --since 2026-10-01 --json
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.usage_ledger import ROLLUP_DIMENSIONS, UsageLedger
+
+
+DEFAULT_DB = project_root / "data" / "usage.db"
+
+
+def print_table(by, rows, totals):
+    """Print rollup rows as a fixed-width table"""
+    header = f"{by:<20} {'calls':>7} {'errors':>6} {'in':>11} {'out':>9} {'cache rd':>10} {'avg s':>6} {'cost $':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows + [dict(totals, **{by: "TOTAL"})]:
+        if row[by] == "TOTAL":
+            print("-" * len(header))
+        print(
+            f"{str(row[by])[:20]:<20} {row['calls']:>7,} {row['errors']:>6,} {row['input_tokens']:>11,} "
+            f"{row['output_tokens']:>9,} {row['cache_read_tokens']:>10,} {row['avg_latency']:>6.2f} {row['cost']:>10.4f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Usage / cost rollups from the usage ledger")
+    parser.add_argument("--by", choices=ROLLUP_DIMENSIONS, default="day")
+    parser.add_argument("--days", type=int, default=7, help="Last N days (ignored with --since)")
+    parser.add_argument("--since", help="First day, YYYY-MM-DD")
+    parser.add_argument("--until", help="Last day, YYYY-MM-DD")
+    parser.add_argument("--lead", help="Only this lead (phone as stored, e.g. +972501234567)")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"No usage ledger at {args.db} yet - it is created when the bot makes its first call.")
+        return
+
+    since = args.since or (datetime.now() - timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+    ledger = UsageLedger(args.db)
+    rows = ledger.rollup(args.by, since=since, until=args.until, lead=args.lead, limit=args.limit)
+    totals = ledger.totals(since=since, until=args.until, lead=args.lead)
+
+    if args.json:
+        print(json.dumps({"by": args.by, "since": since, "rows": rows, "totals": totals}, ensure_ascii=False, indent=2))
+        return
+
+    print(f"\nUsage by {args.by} since {since}" + (f" until {args.until}" if args.until else "") + "\n")
+    print_table(args.by, rows, totals)
+    print()
+
+
+if __name__ == "__main__":
+    main()